@@ -14,7 +14,12 @@ import face_utils
 import numpy as np
 # from surveillance_system import VideoCamera # Deprecated
 from core.plugin_manager import PluginManager
-from core.surveillance_engine import SurveillanceEngine
+from core.surveillance_engine import SurveillanceEngine, TARGETS_FILE, ARCFACE_MATCH_THRESHOLD, DLIB_MATCH_THRESHOLD
+from core.watchlist import WatchlistFeed
+from core.embedding_store import EmbeddingStore, EMBEDDINGS_DIR, MAX_TEMPLATES
+from core.gallery import PersonGallery
+from core.broadcast import StreamSet, MAX_CLIENT_FPS
+from core.engine_service import EngineClient
 import yaml
 import random
 from io import BytesIO
@@ -346,6 +351,7 @@ if os.path.exists(config_path):
         except Exception as e:
             print(f"Modular Init Error: {e}")
 else:
+    sys_config = {}
     print("Config file missing!")
 
 # Configuration
@@ -353,6 +359,11 @@ UPLOAD_FOLDER = 'data/images'
 PERSONS_FOLDER = 'data/persons'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+# find_best_match thresholds - lowered to reduce false positives
+DLIB_THRESHOLD = 0.45
+ARCFACE_THRESHOLD = 0.4  # Cosine distance (1 - sim). If sim > 0.6, dist < 0.4
+MAX_TOP_K = 50  # upper bound for ranked candidate lists (top_k search mode)
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['PERSONS_FOLDER'] = PERSONS_FOLDER
 app.config['MISSING_FOLDER'] = 'data/missing_persons'
@@ -369,6 +380,65 @@ os.makedirs(app.config['MISSING_FOLDER'], exist_ok=True)
 os.makedirs(app.config['ALERTS_FOLDER'], exist_ok=True)
 os.makedirs(os.path.dirname(app.config['SYSTEM_ALERTS_FILE']), exist_ok=True)
 
+# engine_service.enabled: the engine runs as its own process (python -m core.engine_service) and
+# every web worker reads its frames/events from shared memory. The service is then the only writer
+# of the person gallery, the watchlist and the embedding store: workers call it for those (see below).
+engine_client = None
+if sys_config.get('engine_service', {}).get('enabled'):
+    engine_client = EngineClient(sys_config)
+
+# Binary embedding sidecar - person JSON keeps metadata only.
+# Records written before the store existed are migrated on startup (by the engine service, if enabled).
+embedding_store = EmbeddingStore(
+    sys_config.get('embedding_store', {}).get('path', EMBEDDINGS_DIR),
+    sys_config.get('embedding_store', {}).get('dtype', 'float32'),
+    sys_config.get('embedding_store', {}).get('max_templates', MAX_TEMPLATES)
+)
+
+if engine_client is not None:
+    # Writes and searches run in the service; store reads stay local (the manifest is re-read on change)
+    embedding_store = engine_client.proxy('store', local=embedding_store)
+    person_gallery = engine_client.proxy('gallery')
+    watchlist = engine_client.proxy('watchlist')
+else:
+    embedding_store.migrate_folder(app.config['PERSONS_FOLDER'])
+    embedding_store.migrate_folder(app.config['MISSING_FOLDER'])
+
+    # Process-wide face gallery used by find_best_match (loaded on first search,
+    # kept in sync by the add/update/delete routes)
+    person_gallery = PersonGallery({
+        'criminal': app.config['PERSONS_FOLDER'],
+        'missing': app.config['MISSING_FOLDER']
+    }, store=embedding_store,
+        precision=sys_config.get('surveillance', {}).get('gallery', {}).get('precision', 'float32'),
+        thresholds={'arcface': 1.0 - ARCFACE_THRESHOLD, 'dlib': DLIB_THRESHOLD})
+
+    # Active surveillance targets + change feed. Routes call activate()/deactivate();
+    # a running SurveillanceEngine subscribes and applies the deltas live.
+    watchlist = WatchlistFeed({
+        'criminal': app.config['PERSONS_FOLDER'],
+        'missing': app.config['MISSING_FOLDER']
+    }, TARGETS_FILE, store=embedding_store,
+        index_params=sys_config.get('surveillance', {}).get('ann_index', {}),
+        thresholds={'arcface': ARCFACE_MATCH_THRESHOLD, 'dlib': DLIB_MATCH_THRESHOLD})
+
+def save_person_json(json_path, person_data):
+    """Write a person record: embeddings go to the binary store, JSON keeps metadata only"""
+    if person_data.get('embeddings'):
+        embedding_store.put(person_data['id'], person_data['embeddings'])
+    record = {k: v for k, v in person_data.items() if k != 'embeddings'}
+    with open(json_path, 'w') as f:
+        json.dump(record, f, indent=2)
+
+def add_person_template(person_id, embeddings, source):
+    """Give an enrolled person one more face template (merged duplicate, officer capture, confirmed alert)"""
+    if not embeddings or (embeddings.get('dlib') is None and embeddings.get('arcface') is None):
+        return None
+    counts = person_gallery.add_template(person_id, embeddings)
+    watchlist.refresh_templates(person_id)
+    log_activity('TEMPLATE_ADD', person_id, details={'person_id': person_id, 'source': source, 'templates': counts})
+    return counts
+
 # Force reload check
 print("Server reloading...")
 
@@ -484,46 +554,9 @@ def create_officer_alert(person_id, name, image_filename, db_type, priority=3, i
     return alert_data
 
 def update_surveillance_list():
-    active_list = []
-    
-    # Helper to process folder
-    def process_folder(folder, db_type):
-        if os.path.exists(folder):
-            for filename in os.listdir(folder):
-                if filename.endswith('.json'):
-                    try:
-                        path = os.path.join(folder, filename)
-                        with open(path, 'r') as f:
-                            data = json.load(f)
-                            if data.get('surveillance'):
-                                active_list.append({
-                                    'id': data['id'],
-                                    'name': data['name'],
-                                    'db_type': db_type,
-                                    'priority': data.get('priority', 3),  # Default priority 3 (Medium)
-                                    'embeddings': data['embeddings'],
-                                    'image_filename': data['image_filename'],
-                                    'phone': data.get('phone'),
-                                    'aadhaar': data.get('aadhaar'),
-                                    'guardian_phone': data.get('guardian_phone'),
-                                    'missing_aadhaar': data.get('missing_aadhaar'),
-                                    'submitted_gender': data.get('submitted_gender'),
-                                    'predicted_gender': data.get('predicted_gender'),
-                                    'predicted_age': data.get('predicted_age')
-                                })
-                    except: pass
-
-    process_folder(app.config['PERSONS_FOLDER'], 'criminal')
-    process_folder(app.config['MISSING_FOLDER'], 'missing')
-    
-    # Sort by priority (1=Critical first, 5=Minimal last)
-    active_list.sort(key=lambda x: x.get('priority', 3))
-    
-    # Save to a consolidated JSON file for the recognition algorithm
-    with open('data/active_surveillance_targets.json', 'w') as f:
-        json.dump(active_list, f, indent=2)
-        
-    print(f"Updated surveillance list with {len(active_list)} targets (sorted by priority).")
+    """Full resync of the watchlist from the person folders (routes emit incremental deltas instead)"""
+    watchlist.rebuild()
+    print(f"Updated surveillance list with {sum(watchlist.counts().values())} targets (sorted by priority).")
 
 def allowed_file(filename):
     return '.' in filename and \
@@ -1003,8 +1036,10 @@ def _convert_new_person_request(req_data):
 
     os.makedirs(folder, exist_ok=True)
     json_path = os.path.join(folder, f"{final_person_id}.json")
-    with open(json_path, 'w') as f:
-        json.dump(record, f, indent=2)
+    save_person_json(json_path, record)
+    person_gallery.upsert(record, db_type)
+    if record.get('surveillance'):
+        watchlist.activate(record, db_type)
 
     # Clean up pending asset now that it is promoted
     try:
@@ -1096,28 +1131,10 @@ def review_surveillance_request():
                 
                 with open(person_file, 'w') as f:
                     json.dump(person_data, f, indent=2)
-            
-            # Add to active surveillance targets
-            targets_file = 'data/active_surveillance_targets.json'
-            if os.path.exists(targets_file):
-                with open(targets_file, 'r') as f:
-                    targets = json.load(f)
-            else:
-                targets = []
-            
-            # Add if not already in active targets
-            if not any(t.get('person_id') == person_id for t in targets):
-                targets.append({
-                    'person_id': person_id,
-                    'db_type': db_type,
-                    'priority': priority,
-                    'activated_at': datetime.now().isoformat(),
-                    'activated_by': current_user.id,
-                    'reason': req_data.get('reason', '')
-                })
+                person_gallery.upsert(person_data, 'criminal' if db_type == 'criminal' else 'missing')
                 
-                with open(targets_file, 'w') as f:
-                    json.dump(targets, f, indent=2)
+                # Add to active surveillance targets
+                watchlist.activate(person_data, 'criminal' if db_type == 'criminal' else 'missing')
             
             log_activity('SURVEILLANCE_APPROVED', person_id, details={
                 'approved_by': current_user.id,
@@ -1436,11 +1453,24 @@ def officer_photo_search():
                             details={'status': 'no_face', 'camera': camera_type, 'db': search_db}, status='failed')
                 return jsonify({'error': 'No face detected in image'}), 400
             
-            # Find match based on selected database
-            match, distance = find_best_match({
+            query = {
                 "dlib": analysis_results.get('dlib'),
                 "arcface": analysis_results.get('arcface')
-            }, db_type=search_db)
+            }
+            
+            top_k, priorities = parse_top_k_args(request.form)
+            if top_k:
+                candidates = search_top_k(query, top_k, db_type=search_db, priorities=priorities)
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                log_activity('OFFICER_SEARCH', 'Photo Search', user=current_user.username,
+                            details={'mode': 'top_k', 'k': top_k, 'camera': camera_type, 'db_searched': search_db,
+                                     'priorities': priorities, 'candidates': len(candidates)})
+                return jsonify({'mode': 'top_k', 'match': any(c['is_match'] for c in candidates),
+                                'candidates': candidates})
+            
+            # Find match based on selected database
+            match, distance = find_best_match(query, db_type=search_db)
             
             # Log the search activity
             log_activity('OFFICER_SEARCH', match['name'] if match else 'No Match', user=current_user.username,
@@ -1593,6 +1623,17 @@ def officer_submit_report():
     with open(alerts_file, 'w') as f:
         json.dump(alerts, f, indent=2)
     
+    # A reported photo match is officer-confirmed: keep the capture as a face template
+    captured_image = secure_filename(data.get('captured_image') or '')
+    if not is_alert_sighting and data.get('person_id') and captured_image:
+        captured_path = os.path.join(app.config['UPLOAD_FOLDER'], captured_image)
+        if os.path.exists(captured_path):
+            try:
+                add_person_template(secure_filename(data['person_id']), face_utils.get_embeddings(captured_path),
+                                    'officer_capture')
+            except Exception as e:
+                print(f"Error adding officer capture template: {e}")
+    
     # Log the activity
     log_activity('OFFICER_REPORT', data.get('person_name', 'Unknown'), user=current_user.username,
                 details={
@@ -1692,10 +1733,10 @@ def missing_dashboard():
 @app.route('/surveillance')
 @login_required
 def surveillance_dashboard():
-    global surveillance_engine, weapon_detection_active
+    global weapon_detection_active
     
     # Check if any surveillance is active
-    surveillance_active = surveillance_engine is not None
+    surveillance_active = active_engine() is not None
     weapon_active = weapon_detection_active
     camera_active = surveillance_active or weapon_active or (pm.active_camera is not None)
     
@@ -1733,90 +1774,100 @@ def crowd_detection():
     # Use the surveillance stream view with crowd mode
     return render_template('stream_view.html', mode='crowd')
 
+# MJPEG streams: per-viewer send cap, shared 'Initializing Camera...' frame
+STREAM_MAX_FPS = sys_config.get('streaming', {}).get('max_client_fps', MAX_CLIENT_FPS)
+STREAM_PROFILES = sys_config.get('streaming', {}).get('profiles')  # full / half / thumb by default
+placeholder_image = None
+placeholder_jpeg = None
+
 # Crowd Detection Global Variables
 crowd_detection_active = False
+crowd_frames = None  # hub subscription while the crowd stream has viewers
+crowd_state = {'count': random.randint(5, 15), 'density': "Normal", 'updated': 0}
 
 @app.route('/crowd_video_feed')
 @login_required
 def crowd_video_feed():
     """Video feed with crowd counting overlay (simulated)"""
-    return Response(gen_crowd_detection(),
+    return Response(gen_crowd_detection(request.args.get('profile', 'full')),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-def gen_crowd_detection():
-    """Generate frames with crowd detection overlay"""
-    global crowd_detection_active
-    crowd_detection_active = True
-    
-    import random
-    last_count_update = 0
-    current_count = random.randint(5, 15)
-    density_level = "Normal"
-    
-    while crowd_detection_active:
-        if pm.active_camera is None:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + get_placeholder_frame() + b'\r\n\r\n')
-            time.sleep(0.5)
-            continue
-        
-        # Get frame from camera
-        ret, frame = pm.active_camera.get_frame()
-        
-        if not ret or frame is None:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + get_placeholder_frame() + b'\r\n\r\n')
-            time.sleep(0.1)
-            continue
-        
-        # Update crowd count periodically (every 3 seconds)
-        current_time = time.time()
-        if current_time - last_count_update > 3:
-            # Simulate crowd count changes
-            change = random.randint(-2, 3)
-            current_count = max(1, min(50, current_count + change))
-            
-            # Determine density level
-            if current_count > 30:
-                density_level = "HIGH"
-                add_detection_log('threat', f'⚠️ High crowd density: {current_count} people', 'exclamation-triangle')
-            elif current_count > 20:
-                density_level = "Moderate"
-            else:
-                density_level = "Normal"
-            
-            last_count_update = current_time
-        
-        # Draw crowd overlay
-        h, w = frame.shape[:2]
-        
-        # Status bar at top
-        color = (0, 0, 255) if density_level == "HIGH" else ((0, 165, 255) if density_level == "Moderate" else (0, 255, 0))
-        cv2.rectangle(frame, (10, 10), (300, 90), (0, 0, 0), -1)
-        cv2.rectangle(frame, (10, 10), (300, 90), color, 2)
-        
-        cv2.putText(frame, f"CROWD COUNT: {current_count}", (20, 40),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.putText(frame, f"Density: {density_level}", (20, 70),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+def produce_crowd_frame():
+    """One crowd-overlay frame for crowd_streams, produced once for all viewers and resolutions"""
+    global crowd_frames
+    if not crowd_detection_active or pm.active_camera is None:
+        time.sleep(0.5)
+        return get_placeholder_image()
+    if crowd_frames is None:
+        crowd_frames = pm.frame_hub.subscribe('crowd')
+    
+    # Shared camera frame from the hub (copied: the overlay is drawn onto it)
+    captured = crowd_frames.read()
+    if captured is None:
+        time.sleep(0.1)
+        return get_placeholder_image()
+    frame = captured.frame.copy()
+    
+    # Update crowd count periodically (every 3 seconds)
+    current_time = time.time()
+    if current_time - crowd_state['updated'] > 3:
+        # Simulate crowd count changes
+        change = random.randint(-2, 3)
+        current_count = max(1, min(50, crowd_state['count'] + change))
         
-        # Corner indicator
-        cv2.putText(frame, "CROWD MONITORING", (w - 200, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        # Encode frame
-        ret, jpeg = cv2.imencode('.jpg', frame)
-        if ret:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n\r\n')
+        # Determine density level
+        if current_count > 30:
+            density_level = "HIGH"
+            add_detection_log('threat', f'⚠️ High crowd density: {current_count} people', 'exclamation-triangle')
+        elif current_count > 20:
+            density_level = "Moderate"
+        else:
+            density_level = "Normal"
         
-        time.sleep(0.033)  # ~30 FPS
-    
-    crowd_detection_active = False
+        crowd_state.update(count=current_count, density=density_level, updated=current_time)
+    current_count, density_level = crowd_state['count'], crowd_state['density']
+    
+    # Draw crowd overlay
+    h, w = frame.shape[:2]
+    
+    # Status bar at top
+    color = (0, 0, 255) if density_level == "HIGH" else ((0, 165, 255) if density_level == "Moderate" else (0, 255, 0))
+    cv2.rectangle(frame, (10, 10), (300, 90), (0, 0, 0), -1)
+    cv2.rectangle(frame, (10, 10), (300, 90), color, 2)
+    
+    cv2.putText(frame, f"CROWD COUNT: {current_count}", (20, 40),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(frame, f"Density: {density_level}", (20, 70),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    
+    # Corner indicator
+    cv2.putText(frame, "CROWD MONITORING", (w - 200, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return frame
+
+def release_crowd_frames():
+    """Crowd stream has no viewers left: drop its hub subscription"""
+    global crowd_frames
+    if crowd_frames is not None:
+        crowd_frames.close()
+        crowd_frames = None
+
+crowd_streams = StreamSet('crowd', STREAM_PROFILES, STREAM_MAX_FPS, producer=produce_crowd_frame,
+                          on_idle=release_crowd_frames)
+
+def gen_crowd_detection(profile='full'):
+    """Crowd detection stream for one client"""
+    global crowd_detection_active
+    crowd_detection_active = True
+    return crowd_streams.stream(profile, placeholder=get_placeholder_frame(),
+                                stop=lambda: not crowd_detection_active)
 
 # Weapon Detection Global Variables
 weapon_detection_active = False
 weapon_detector = None  # Plugin instance
+weapon_frames = None  # hub subscription while the weapon stream has viewers
+last_weapon_log_time = 0
+WEAPON_LOG_COOLDOWN = 2  # Seconds between log entries for same detection
 detection_log = []  # Live detection log for UI
 MAX_DETECTION_LOG = 50  # Max items in log
 
@@ -1840,6 +1891,8 @@ def add_detection_log(log_type, message, icon="info"):
 @login_required
 def get_detection_log():
     """API endpoint for detection log"""
+    if engine_client is not None:
+        engine_client.poll_events(surveillance_detection_callback)
     return jsonify(detection_log)
 
 @app.route('/api/clear_detection_log', methods=['POST'])
@@ -1890,57 +1943,57 @@ def weapon_detection():
 @login_required
 def weapon_video_feed():
     """Video feed with YOLOv8 weapon detection overlay"""
-    return Response(gen_weapon_detection(),
+    return Response(gen_weapon_detection(request.args.get('profile', 'full')),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-def gen_weapon_detection():
-    """Generate frames with weapon detection using plugin"""
-    global weapon_detector, weapon_detection_active
-    
-    last_detection_time = 0
-    detection_cooldown = 2  # Seconds between log entries for same detection
-    
+def produce_weapon_frame():
+    """One weapon-detection frame for weapon_streams, produced once for all viewers and resolutions"""
+    global weapon_frames, last_weapon_log_time
+    if not weapon_detection_active or pm.active_camera is None:
+        time.sleep(0.5)
+        return get_placeholder_image()
+    if weapon_frames is None:
+        weapon_frames = pm.frame_hub.subscribe('weapon')
+    
+    # Shared camera frame from the hub (detect_and_draw annotates its own copy)
+    captured = weapon_frames.read()
+    if captured is None:
+        time.sleep(0.1)
+        return get_placeholder_image()
+    frame = captured.frame
+    
+    # Run weapon detection using plugin
+    if weapon_detector is not None:
+        try:
+            frame, detections = weapon_detector.detect_and_draw(frame)
+            
+            # Log detections for monitoring (with cooldown to avoid spam)
+            current_time = time.time()
+            if detections and (current_time - last_weapon_log_time) > WEAPON_LOG_COOLDOWN:
+                for det in detections:
+                    add_detection_log('threat', f"⚠️ {det['class_name']} detected ({det['confidence']:.0%})", 'exclamation-triangle')
+                logger.warning(f"Weapon detected: {len(detections)} object(s)")
+                last_weapon_log_time = current_time
+        except Exception as e:
+            logger.error(f"Weapon detection error: {e}")
+    return frame
+
+def release_weapon_frames():
+    """Weapon stream has no viewers left: drop its hub subscription"""
+    global weapon_frames
+    if weapon_frames is not None:
+        weapon_frames.close()
+        weapon_frames = None
+
+weapon_streams = StreamSet('weapon', STREAM_PROFILES, STREAM_MAX_FPS, producer=produce_weapon_frame,
+                           on_idle=release_weapon_frames)
+
+def gen_weapon_detection(profile='full'):
+    """Weapon detection stream for one client (YOLO runs once per frame, whatever the viewer count)"""
     # Add initial log entry
     add_detection_log('system', 'Weapon detection system armed', 'shield-alt')
-    
-    while weapon_detection_active:
-        if pm.active_camera is None:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + get_placeholder_frame() + b'\r\n\r\n')
-            time.sleep(0.5)
-            continue
-        
-        # Get frame from camera - returns (ret, frame) tuple
-        ret, frame = pm.active_camera.get_frame()
-        
-        if not ret or frame is None:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + get_placeholder_frame() + b'\r\n\r\n')
-            time.sleep(0.1)
-            continue
-        
-        # Run weapon detection using plugin
-        if weapon_detector is not None:
-            try:
-                frame, detections = weapon_detector.detect_and_draw(frame)
-                
-                # Log detections for monitoring (with cooldown to avoid spam)
-                current_time = time.time()
-                if detections and (current_time - last_detection_time) > detection_cooldown:
-                    for det in detections:
-                        add_detection_log('threat', f"⚠️ {det['class_name']} detected ({det['confidence']:.0%})", 'exclamation-triangle')
-                    logger.warning(f"Weapon detected: {len(detections)} object(s)")
-                    last_detection_time = current_time
-            except Exception as e:
-                logger.error(f"Weapon detection error: {e}")
-        
-        # Encode frame
-        ret, jpeg = cv2.imencode('.jpg', frame)
-        if ret:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n\r\n')
-        
-        time.sleep(0.033)  # ~30 FPS
+    return weapon_streams.stream(profile, placeholder=get_placeholder_frame(),
+                                 stop=lambda: not weapon_detection_active)
 
 @app.route('/stop_weapon_detection')
 @login_required
@@ -2019,7 +2072,7 @@ def surveillance_start(db_type, person_id):
             with open(json_path, 'w') as f:
                 json.dump(data, f, indent=2)
             
-            update_surveillance_list()
+            watchlist.activate(data, 'criminal' if db_type == 'criminal' else 'missing')
         except Exception as e:
             pass
     
@@ -2042,7 +2095,7 @@ def surveillance_stop(db_type, person_id):
             with open(json_path, 'w') as f:
                 json.dump(data, f, indent=2)
             
-            update_surveillance_list()
+            watchlist.deactivate(person_id)
         except Exception as e:
             pass
     
@@ -2084,7 +2137,7 @@ def surveillance_activate(person_id):
             with open(json_path, 'w') as f:
                 json.dump(data, f, indent=2)
             
-            update_surveillance_list()
+            watchlist.activate(data, 'criminal' if db_type == 'criminal' else 'missing')
             
             # Log successful activation (tamper-proof)
             log_activity('SURVEILLANCE_ACTIVATE', person_name, details={
@@ -2157,7 +2210,7 @@ def surveillance_deactivate(person_id):
             with open(json_path, 'w') as f:
                 json.dump(data, f, indent=2)
             
-            update_surveillance_list()
+            watchlist.deactivate(person_id)
             
             # Log successful deactivation (tamper-proof)
             log_activity('SURVEILLANCE_DEACTIVATE', person_name, details={
@@ -2212,6 +2265,9 @@ def delete_person(person_id):
                     os.remove(image_path)
             
             os.remove(json_path)
+            embedding_store.delete(person_id)
+            person_gallery.remove(person_id)
+            watchlist.deactivate(person_id)
             
             # Log activity
             log_activity('PERSON_DELETE', person_name, details={
@@ -2257,51 +2313,47 @@ def find_best_match(new_embeddings, db_type='all'):
     """Find best match in specified database(s)
     db_type can be: 'criminal', 'missing', or 'all' (searches both)
     """
-    best_match = None
-    min_distance = float('inf')
-    
-    # Thresholds
-    # Lowered thresholds to reduce false positives
-    DLIB_THRESHOLD = 0.45 
-    ARCFACE_THRESHOLD = 0.4 # Cosine distance (1 - sim). If sim > 0.6, dist < 0.4
-    
-    folders_to_search = []
-    if db_type in ['criminal', 'all']:
-        folders_to_search.append((app.config['PERSONS_FOLDER'], 'criminal'))
-    if db_type in ['missing', 'all']:
-        folders_to_search.append((app.config['MISSING_FOLDER'], 'missing'))
-    
-    for folder, folder_type in folders_to_search:
-        if os.path.exists(folder):
-            for filename in os.listdir(folder):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(folder, filename)
-                    try:
-                        with open(filepath, 'r') as f:
-                            person = json.load(f)
-                        
-                        # Add db_type to person data
-                        person['db_type'] = folder_type
-                            
-                        # Check Dlib first (usually faster/standard)
-                        dist = float('inf')
-                        if new_embeddings.get('dlib') and person.get('embeddings', {}).get('dlib'):
-                            dist = calculate_distance(new_embeddings['dlib'], person['embeddings']['dlib'], 'euclidean')
-                            if dist < DLIB_THRESHOLD and dist < min_distance:
-                                min_distance = dist
-                                best_match = person
-                        
-                        # Fallback to ArcFace if Dlib not available or to confirm
-                        elif new_embeddings.get('arcface') and person.get('embeddings', {}).get('arcface'):
-                            dist = calculate_distance(new_embeddings['arcface'], person['embeddings']['arcface'], 'cosine')
-                            if dist < ARCFACE_THRESHOLD and dist < min_distance:
-                                min_distance = dist
-                                best_match = person
-                                
-                    except Exception as e:
-                        print(f"Error comparing {filename}: {e}")
-                    
-    return best_match, min_distance
+    return person_gallery.find_best_match(new_embeddings, db_type=db_type,
+                                          dlib_threshold=DLIB_THRESHOLD,
+                                          arcface_threshold=ARCFACE_THRESHOLD)
+
+def search_top_k(new_embeddings, k, db_type='all', priorities=None):
+    """Ranked candidates (best first) from the person gallery, for investigator searches"""
+    candidates = person_gallery.search_top_k(new_embeddings, k=min(k, MAX_TOP_K), db_type=db_type,
+                                             priorities=priorities, dlib_threshold=DLIB_THRESHOLD,
+                                             arcface_threshold=ARCFACE_THRESHOLD)
+    results = []
+    for c in candidates:
+        distance = c['distance']
+        confidence = max(0, min(100, (1 - distance) * 100)) if distance < 1 else 0
+        if distance < 0.4: confidence = 90 + (0.4 - distance) * 25
+        results.append({
+            'id': c['id'],
+            'name': c.get('name'),
+            'db_type': c.get('db_type', 'criminal'),
+            'priority': c.get('priority', 3),
+            'is_wanted': c.get('is_wanted', False),
+            'image_filename': c.get('image_filename'),
+            'distance': round(distance, 4),
+            'confidence': round(confidence, 1),
+            'metric': c['metric'],
+            'is_match': c['is_match']
+        })
+    return results
+
+def parse_top_k_args(form):
+    """top_k / priority form fields -> (k or None, priority list or None)"""
+    try:
+        k = int(form.get('top_k', 0))
+    except (TypeError, ValueError):
+        k = 0
+    priorities = None
+    if form.get('priority'):
+        try:
+            priorities = [int(p) for p in str(form.get('priority')).split(',') if p.strip()]
+        except ValueError:
+            priorities = None
+    return (k if k > 0 else None), priorities
 
 @app.route('/merge_person', methods=['POST'])
 @login_required
@@ -2314,7 +2366,8 @@ def merge_person():
         if os.path.exists(json_path):
             # User requested to keep the old info ("complete info of old one")
             # So we do NOT update the existing record with new_data.
-            # We simply discard the new entry and redirect to the existing one.
+            # The new photo's face becomes an extra template of the existing person.
+            add_person_template(existing_id, new_data.get('embeddings'), 'merge')
             
             # Clean up the temp image from new_data since we are not using it
             new_image_path = os.path.join(app.config['UPLOAD_FOLDER'], new_data['image_filename'])
@@ -2333,8 +2386,8 @@ def confirm_add_person():
         
         # Save JSON
         json_path = os.path.join(app.config['PERSONS_FOLDER'], f"{person_data['id']}.json")
-        with open(json_path, 'w') as f:
-            json.dump(person_data, f, indent=2)
+        save_person_json(json_path, person_data)
+        person_gallery.upsert(person_data, 'criminal')
 
         return redirect(url_for('criminal_dashboard'))
     except Exception as e:
@@ -2474,8 +2527,8 @@ def add_person():
 
                 # Save JSON
                 json_path = os.path.join(app.config['PERSONS_FOLDER'], f"{person_id}.json")
-                with open(json_path, 'w') as f:
-                    json.dump(person_data, f, indent=2)
+                save_person_json(json_path, person_data)
+                person_gallery.upsert(person_data, 'criminal')
 
                 # Create officer alert for this person
                 create_officer_alert(
@@ -2530,6 +2583,7 @@ def view_person(person_id):
         with open(json_path, 'r') as f:
             person_data = json.load(f)
         person_data['db_type'] = 'criminal'
+        person_data['embeddings'] = embedding_store.get_lists(person_id)
         return render_template('view_person.html', person=person_data)
     
     # Check missing folder
@@ -2538,6 +2592,7 @@ def view_person(person_id):
         with open(json_path, 'r') as f:
             person_data = json.load(f)
         person_data['db_type'] = 'missing'
+        person_data['embeddings'] = embedding_store.get_lists(person_id)
         return render_template('view_person.html', person=person_data)
         
     return redirect(url_for('criminal_dashboard'))
@@ -2586,6 +2641,9 @@ def update_person(person_id):
 
             with open(json_path, 'w') as f:
                 json.dump(person_data, f, indent=2)
+            person_gallery.upsert(person_data, db_type)
+            if person_data.get('surveillance'):
+                watchlist.activate(person_data, db_type)  # refresh name/fields on the live target
                 
             return redirect(url_for('view_person', person_id=person_id))
         except Exception as e:
@@ -2704,8 +2762,8 @@ def add_missing_person():
                 }
 
                 json_path = os.path.join(app.config['MISSING_FOLDER'], f"{person_id}.json")
-                with open(json_path, 'w') as f:
-                    json.dump(person_data, f, indent=2)
+                save_person_json(json_path, person_data)
+                person_gallery.upsert(person_data, 'missing')
 
                 # Create officer alert for missing person
                 create_officer_alert(
@@ -2829,11 +2887,11 @@ def add_wanted_criminal():
 
                 # Save JSON to persons folder (criminal database)
                 json_path = os.path.join(app.config['PERSONS_FOLDER'], f"{person_id}.json")
-                with open(json_path, 'w') as f:
-                    json.dump(person_data, f, indent=2)
+                save_person_json(json_path, person_data)
+                person_gallery.upsert(person_data, 'criminal')
 
                 # Update surveillance list immediately
-                update_surveillance_list()
+                watchlist.activate(person_data, 'criminal')
                 
                 # Create officer alert for WANTED criminal (HIGH PRIORITY)
                 create_officer_alert(
@@ -2987,6 +3045,42 @@ def view_alert(person_id):
     else:
         return redirect(url_for('alerts_dashboard'))
 
+@app.route('/alerts/confirm/<person_id>', methods=['POST'])
+@login_required
+def confirm_alert_detection(person_id):
+    """Confirm a surveillance detection; its frame becomes an extra template of the person"""
+    person_id = secure_filename(person_id)
+    capture_frame = secure_filename(request.form.get('capture_frame', ''))
+    json_path = os.path.join(app.config['ALERTS_FOLDER'], f"{person_id}.json")
+    image_path = os.path.join(app.config['ALERTS_FOLDER'], 'images', capture_frame)
+    
+    if not capture_frame or not os.path.exists(json_path) or not os.path.exists(image_path):
+        flash('Detection not found.', 'danger')
+        return redirect(url_for('view_alert', person_id=person_id))
+    
+    try:
+        with open(json_path, 'r') as f:
+            alert_data = json.load(f)
+        
+        for detection in alert_data.get('detections', []):
+            if detection.get('capture_frame') == capture_frame:
+                detection['confirmed'] = True
+                detection['confirmed_by'] = current_user.username
+                detection['confirmed_at'] = datetime.utcnow().isoformat() + 'Z'
+        
+        with open(json_path, 'w') as f:
+            json.dump(alert_data, f, indent=2)
+        
+        counts = add_person_template(person_id, face_utils.get_embeddings(image_path), 'confirmed_alert')
+        if counts:
+            flash('Detection confirmed and added to the face templates.', 'success')
+        else:
+            flash('Detection confirmed (no usable face found for a template).', 'warning')
+    except Exception as e:
+        flash('Could not confirm detection.', 'danger')
+    
+    return redirect(url_for('view_alert', person_id=person_id))
+
 @app.route('/alerts/delete/<person_id>', methods=['POST'])
 @login_required
 def delete_alert(person_id):
@@ -3387,22 +3481,18 @@ def format_datetime(dt_str):
 # Surveillance Stream Logic
 surveillance_engine = None
 
+def active_engine():
+    """The running surveillance engine: in this process, or the engine service (engine_service.enabled)"""
+    if engine_client is not None:
+        return None if engine_client.stopped else engine_client
+    return surveillance_engine
+
 @app.route('/api/surveillance/check_targets/<mode>')
 @login_required
 def check_targets(mode):
-    update_surveillance_list()
-    
-    json_path = 'data/active_surveillance_targets.json'
-    criminal_count = 0
-    missing_count = 0
-    
-    if os.path.exists(json_path):
-        try:
-            with open(json_path, 'r') as f:
-                targets = json.load(f)
-                criminal_count = len([t for t in targets if t['db_type'] == 'criminal'])
-                missing_count = len([t for t in targets if t['db_type'] == 'missing'])
-        except: pass
+    counts = watchlist.counts()
+    criminal_count = counts.get('criminal', 0)
+    missing_count = counts.get('missing', 0)
         
     total_count = 0
     if mode == 'both':
@@ -3422,17 +3512,20 @@ def check_targets(mode):
 @login_required
 def start_surveillance_background(mode):
     global surveillance_engine
-    update_surveillance_list()
+    
+    if engine_client is not None:
+        engine_client.start()
+        return redirect(url_for('surveillance_dashboard'))
     
     # Initialize camera if not active
     if pm.active_camera is None:
         pm.initialize_camera(sys_config)
     
     if surveillance_engine is None:
-        surveillance_engine = SurveillanceEngine(pm, sys_config, detection_callback=surveillance_detection_callback)
+        surveillance_engine = SurveillanceEngine(pm, sys_config, detection_callback=surveillance_detection_callback,
+                                                 watchlist=watchlist)
     else:
-        # Reload targets if needed
-        surveillance_engine.load_targets()
+        # Targets stay current through watchlist deltas; no reload needed
         surveillance_engine.detection_callback = surveillance_detection_callback
         
     return redirect(url_for('surveillance_dashboard'))
@@ -3456,11 +3549,8 @@ def start_surveillance_stream(mode):
     # Clear detection log for new session
     detection_log = []
     
-    # Ensure surveillance list is up to date
-    update_surveillance_list()
-    
-    # Initialize camera if not active
-    if pm.active_camera is None:
+    # Initialize camera if not active (the engine service owns its own camera)
+    if engine_client is None and pm.active_camera is None:
         pm.initialize_camera(sys_config)
     
     # Add initialization logs
@@ -3469,13 +3559,17 @@ def start_surveillance_stream(mode):
     mode_labels = {'criminal': 'Criminal DB', 'missing': 'Missing Persons', 'both': 'All Databases'}
     add_detection_log('system', f'Scanning: {mode_labels.get(mode, mode)}', 'eye')
     
-    if surveillance_engine is None:
-        surveillance_engine = SurveillanceEngine(pm, sys_config, detection_callback=surveillance_detection_callback)
+    if engine_client is not None:
+        status = engine_client.start()
+        engine_client.skip_events()
+        add_detection_log('system', f"Engine service active ({status.get('targets', 0)} targets)", 'microchip')
+    elif surveillance_engine is None:
+        surveillance_engine = SurveillanceEngine(pm, sys_config, detection_callback=surveillance_detection_callback,
+                                                 watchlist=watchlist)
         add_detection_log('system', 'Face recognition model active', 'microchip')
     else:
-        surveillance_engine.load_targets()
         surveillance_engine.detection_callback = surveillance_detection_callback
-        add_detection_log('system', 'Targets reloaded', 'sync')
+        add_detection_log('system', f'Watchlist live ({len(surveillance_engine.targets_by_id)} targets)', 'sync')
         
     return render_template('stream_view.html', mode=mode)
 
@@ -3488,6 +3582,8 @@ def stop_surveillance_stream():
     if surveillance_engine:
         surveillance_engine.stop()
         surveillance_engine = None
+    if engine_client is not None:
+        engine_client.stop()
     
     # Stop weapon detection if active
     weapon_detection_active = False
@@ -3502,34 +3598,36 @@ def stop_surveillance_stream():
         
     return redirect(url_for('surveillance_dashboard'))
 
+def get_placeholder_image():
+    """'Initializing Camera...' frame, rendered once (read-only)"""
+    global placeholder_image
+    if placeholder_image is None:
+        img = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.putText(img, "Initializing Camera...", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        img.setflags(write=False)
+        placeholder_image = img
+    return placeholder_image
+
 def get_placeholder_frame():
-    img = np.zeros((480, 640, 3), dtype=np.uint8)
-    cv2.putText(img, "Initializing Camera...", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-    ret, jpeg = cv2.imencode('.jpg', img)
-    return jpeg.tobytes()
-
-def gen(engine):
-    while True:
-        if engine.stopped:
-            break
-            
-        frame = engine.get_frame()
-        if frame:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n\r\n')
-        else:
-            # Yield placeholder
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + get_placeholder_frame() + b'\r\n\r\n')
-            time.sleep(0.5)
+    """Placeholder as JPEG, encoded once"""
+    global placeholder_jpeg
+    if placeholder_jpeg is None:
+        ret, jpeg = cv2.imencode('.jpg', get_placeholder_image())
+        placeholder_jpeg = jpeg.tobytes()
+    return placeholder_jpeg
+
+def gen(engine, profile='full'):
+    """Surveillance stream for one client: frames the engine already encoded, each sent once"""
+    return engine.streams.stream(profile, placeholder=get_placeholder_frame(), stop=lambda: engine.stopped)
 
 @app.route('/video_feed')
 @login_required
 def video_feed():
-    global surveillance_engine
-    if surveillance_engine is None:
+    """Annotated surveillance preview; ?profile=full|half|thumb picks the resolution"""
+    engine = active_engine()
+    if engine is None:
         return "Surveillance not started", 404
-    return Response(gen(surveillance_engine),
+    return Response(gen(engine, request.args.get('profile', 'full')),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/system_alerts')
@@ -3640,11 +3738,26 @@ def api_face_search():
                 log_activity('FACE_SEARCH', 'Dashboard', details={'error': 'No face detected'}, status='failed')
                 return jsonify({'error': 'No face detected'}), 400
                 
-            # Find match in specified database(s)
-            match, distance = find_best_match({
+            query = {
                 "dlib": analysis_results.get('dlib'),
                 "arcface": analysis_results.get('arcface')
-            }, db_type=db_type)
+            }
+            
+            # Ranked candidate list mode (no alert is raised for an investigative search)
+            top_k, priorities = parse_top_k_args(request.form)
+            if top_k:
+                candidates = search_top_k(query, top_k, db_type=db_type, priorities=priorities)
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                log_activity('FACE_SEARCH', 'Dashboard', details={
+                    'mode': 'top_k', 'k': top_k, 'db_type': db_type,
+                    'priorities': priorities, 'candidates': len(candidates)
+                })
+                return jsonify({'mode': 'top_k', 'match': any(c['is_match'] for c in candidates),
+                                'candidates': candidates})
+            
+            # Find match in specified database(s)
+            match, distance = find_best_match(query, db_type=db_type)
             
             if match:
                 # Calculate confidence score
@@ -3928,8 +4041,15 @@ def api_surveillance_results():
 @login_required
 def api_status():
     # Mock status
+    engine = active_engine()
     return jsonify({
         'camera': 'active' if pm.active_camera else 'inactive',
+        'capture': pm.frame_hub.stats(),
+        'streams': {
+            'surveillance': engine.streams.stats() if engine else None,
+            'weapon': weapon_streams.stats(),
+            'crowd': crowd_streams.stats(),
+        },
         'model': 'active',
         'sync': 'ok'
     })
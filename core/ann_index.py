@@ -0,0 +1,380 @@
+import os
+import json
+import hashlib
+import tempfile
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from core.gallery import MODEL_METRICS
+
+logger = logging.getLogger("ANNIndex")
+
+# Below this many rows a vectorized brute-force scan is already fast enough
+DEFAULT_MIN_GALLERY_SIZE = 50000
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 15
+KMEANS_MAX_TRAIN = 65536
+ASSIGN_CHUNK = 8192
+
+
+def rows_fingerprint(keys, vectors, model_type: str) -> str:
+    """
+    Identify the rows an index was built from: every (owner key, vector bytes)
+    pair, independent of row order. A re-enrolled or rotated template changes
+    it even when the set of keys stays the same.
+    """
+    matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+    row_digests = sorted(
+        hashlib.sha1(str(k).encode() + b'\0' + matrix[i].tobytes()).digest()
+        for i, k in enumerate(keys)
+    )
+    h = hashlib.sha1(model_type.encode())
+    for digest in row_digests:
+        h.update(digest)
+    return h.hexdigest()
+
+
+def _prepare_matrix(vectors, metric: str) -> np.ndarray:
+    matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+    if metric == 'cosine' and len(matrix):
+        matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-8)
+    return matrix
+
+
+class ANNIndex:
+    """
+    Base class for watchlist search indexes.
+    Scores follow the gallery convention: similarity for 'cosine', distance for 'euclidean'.
+    """
+    kind = 'base'
+
+    def __init__(self, metric: str):
+        self.metric = metric
+        self.keys = np.empty(0, dtype=str)
+        self.fingerprint = ''
+        self.model_type = ''
+        self.report: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def build(self, keys, vectors) -> None:
+        raise NotImplementedError
+
+    def search(self, query, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (keys, scores) of the k best rows, best first."""
+        raise NotImplementedError
+
+    def _score(self, matrix: np.ndarray, sq_norms: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.metric == 'cosine':
+            return (matrix @ query) / (np.linalg.norm(query) + 1e-8)
+        sq_dist = sq_norms - 2.0 * (matrix @ query) + np.dot(query, query)
+        return np.sqrt(np.maximum(sq_dist, 0.0))
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k best scores, best first (partial sort)."""
+        k = min(k, len(scores))
+        order = -scores if self.metric == 'cosine' else scores
+        if k < len(scores):
+            part = np.argpartition(order, k - 1)[:k]
+        else:
+            part = np.arange(len(scores))
+        return part[np.argsort(order[part], kind='stable')]
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def _restore(self, data) -> None:
+        pass
+
+    def save(self, path: str) -> None:
+        meta = {'kind': self.kind, 'metric': self.metric, 'fingerprint': self.fingerprint,
+                'model_type': self.model_type, 'report': self.report}
+        # Unique temp file per writer: the engine and web workers may build the same index at once
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                        dir=os.path.dirname(path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), keys=self.keys.astype(str), **self._arrays())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class BruteForceIndex(ANNIndex):
+    """Exact search over every row. Reference for recall and fallback for small galleries."""
+    kind = 'flat'
+
+    def build(self, keys, vectors) -> None:
+        self.keys = np.asarray(keys, dtype=str)
+        self.matrix = _prepare_matrix(vectors, self.metric)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix) if len(self.matrix) else np.empty(0, np.float32)
+
+    def search(self, query, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        if not len(self.keys):
+            return self.keys, np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32).ravel()
+        scores = self._score(self.matrix, self.sq_norms, query)
+        idx = self._top_k(scores, k)
+        return self.keys[idx], scores[idx]
+
+    def _arrays(self):
+        return {'matrix': self.matrix}
+
+    def _restore(self, data):
+        self.matrix = data['matrix']
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix) if len(self.matrix) else np.empty(0, np.float32)
+
+
+class IVFFlatIndex(ANNIndex):
+    """
+    Inverted-file index with a k-means coarse quantizer.
+
+    Rows are grouped by nearest centroid and stored list-contiguous, so probing
+    the nprobe closest lists is a handful of slices followed by an exact
+    (flat) re-score of just those rows.
+    """
+    kind = 'ivf_flat'
+
+    def __init__(self, metric: str, n_lists: Optional[int] = None, nprobe: int = DEFAULT_NPROBE, seed: int = 0):
+        super().__init__(metric)
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.seed = seed
+
+    def _assign(self, matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Nearest centroid for every row, computed in chunks to bound memory."""
+        c_sq = np.einsum('ij,ij->i', centroids, centroids)
+        out = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), ASSIGN_CHUNK):
+            block = matrix[start:start + ASSIGN_CHUNK]
+            if self.metric == 'cosine':
+                out[start:start + ASSIGN_CHUNK] = np.argmax(block @ centroids.T, axis=1)
+            else:
+                out[start:start + ASSIGN_CHUNK] = np.argmin(c_sq[None, :] - 2.0 * (block @ centroids.T), axis=1)
+        return out
+
+    def _train(self, matrix: np.ndarray, n_lists: int) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        train = matrix
+        if len(matrix) > KMEANS_MAX_TRAIN:
+            train = matrix[rng.choice(len(matrix), KMEANS_MAX_TRAIN, replace=False)]
+
+        centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assign = self._assign(train, centroids)
+            counts = np.bincount(assign, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            if empty.any():
+                # Re-seed dead lists from random training rows
+                centroids[empty] = train[rng.choice(len(train), int(empty.sum()), replace=False)]
+            if self.metric == 'cosine':
+                centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-8)
+        return centroids
+
+    def build(self, keys, vectors) -> None:
+        matrix = _prepare_matrix(vectors, self.metric)
+        keys = np.asarray(keys, dtype=str)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(matrix))))
+        n_lists = max(1, min(n_lists, len(matrix)))
+
+        self.centroids = self._train(matrix, n_lists)
+        assign = self._assign(matrix, self.centroids)
+        order = np.argsort(assign, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+        self.matrix = np.ascontiguousarray(matrix[order])
+        self.keys = keys[order]
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def search(self, query, k: int = 1, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if not len(self.keys):
+            return self.keys, np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32).ravel()
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+
+        if self.metric == 'cosine':
+            centroid_order = -(self.centroids @ query)
+        else:
+            centroid_order = np.einsum('ij,ij->i', self.centroids, self.centroids) - 2.0 * (self.centroids @ query)
+        probe = np.argpartition(centroid_order, nprobe - 1)[:nprobe] if nprobe < len(centroid_order) else np.arange(len(centroid_order))
+
+        rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in probe])
+        if not len(rows):
+            return self.keys[:0], np.empty(0, dtype=np.float32)
+        scores = self._score(self.matrix[rows], self.sq_norms[rows], query)
+        idx = self._top_k(scores, k)
+        return self.keys[rows[idx]], scores[idx]
+
+    def _arrays(self):
+        return {'matrix': self.matrix, 'centroids': self.centroids, 'offsets': self.offsets,
+                'nprobe': np.array(self.nprobe)}
+
+    def _restore(self, data):
+        self.matrix = data['matrix']
+        self.centroids = data['centroids']
+        self.offsets = data['offsets']
+        self.nprobe = int(data['nprobe'])
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+
+INDEX_TYPES = {
+    BruteForceIndex.kind: BruteForceIndex,
+    IVFFlatIndex.kind: IVFFlatIndex,
+}
+
+
+def load_index(path: str) -> Optional[ANNIndex]:
+    """Load an index written by ANNIndex.save(), or None if missing/unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            index = INDEX_TYPES[meta['kind']](meta['metric'])
+            index.keys = data['keys']
+            index.fingerprint = meta['fingerprint']
+            index.model_type = meta['model_type']
+            index.report = meta.get('report', {})
+            index._restore(data)
+        return index
+    except Exception as e:
+        logger.error(f"Failed to load ANN index {path}: {e}")
+        return None
+
+
+def measure_recall(index: ANNIndex, exact: ANNIndex, queries: np.ndarray, k: int = 10,
+                   threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Compare an approximate index against exact search on the same rows.
+
+    - recall_at_1: top-1 key agrees with exact search
+    - recall_at_k: fraction of the exact top-k found in the approximate top-k
+    - decision_agreement: match/no-match decision at `threshold` agrees
+    - max_score_drift: largest top-1 score difference
+    """
+    hits_1, hits_k, agree, drift = 0, 0.0, 0, 0.0
+    for q in queries:
+        a_keys, a_scores = index.search(q, k)
+        e_keys, e_scores = exact.search(q, k)
+        if not len(e_keys):
+            continue
+        hits_1 += int(len(a_keys) > 0 and a_keys[0] == e_keys[0])
+        hits_k += len(set(a_keys.tolist()) & set(e_keys.tolist())) / len(e_keys)
+        a_top = float(a_scores[0]) if len(a_scores) else (-np.inf if exact.metric == 'cosine' else np.inf)
+        e_top = float(e_scores[0])
+        drift = max(drift, abs(a_top - e_top)) if np.isfinite(a_top) else drift
+        if threshold is not None:
+            if exact.metric == 'cosine':
+                agree += int((a_top > threshold) == (e_top > threshold))
+            else:
+                agree += int((a_top < threshold) == (e_top < threshold))
+
+    n = max(1, len(queries))
+    report = {
+        'queries': len(queries),
+        'k': k,
+        'recall_at_1': round(hits_1 / n, 4),
+        'recall_at_k': round(hits_k / n, 4),
+        'max_score_drift': round(drift, 6),
+    }
+    if threshold is not None:
+        report['decision_agreement'] = round(agree / n, 4)
+    return report
+
+
+def sample_queries(vectors: np.ndarray, n: int = 200, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    """Perturbed copies of random gallery rows, standing in for live probe faces."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    picks = rng.choice(len(vectors), min(n, len(vectors)), replace=False)
+    base = vectors[picks]
+    scale = noise * np.linalg.norm(base, axis=1, keepdims=True) / np.sqrt(base.shape[1])
+    return base + rng.normal(size=base.shape).astype(np.float32) * scale
+
+
+def index_path(targets_path: str, model_type: str) -> str:
+    """Index file stored next to the consolidated targets JSON."""
+    root, _ = os.path.splitext(targets_path)
+    return f"{root}.{model_type}.ann.npz"
+
+
+def build_watchlist_indexes(rows_by_model: Dict[str, Tuple[list, np.ndarray]], targets_path: str,
+                            params: Optional[Dict[str, Any]] = None,
+                            thresholds: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Build and persist one index per model type from the exported watchlist
+    rows ({model_type: (ids, vectors)} in targets-file order).
+
+    params (config 'surveillance.ann_index'):
+        type: 'auto' | 'ivf_flat' | 'flat'   ('auto' = ivf_flat above min_gallery_size)
+        min_gallery_size, n_lists, nprobe, recall_queries
+    Galleries below the size cutoff get no index file (the engine falls back to
+    its brute-force gallery). Unchanged rows (same keys and vectors) are not rebuilt.
+    Returns a recall report per model type that was (re)built.
+    """
+    params = params or {}
+    thresholds = thresholds or {}
+    kind = params.get('type', 'auto')
+    min_size = params.get('min_gallery_size', DEFAULT_MIN_GALLERY_SIZE)
+    reports = {}
+
+    for model_type, metric in MODEL_METRICS.items():
+        path = index_path(targets_path, model_type)
+        keys, vectors = rows_by_model.get(model_type, ([], None))
+
+        if not len(keys) or (kind == 'auto' and len(keys) < min_size):
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+
+        keys = list(keys)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        fingerprint = rows_fingerprint(keys, vectors, model_type)
+        existing = load_index(path)
+        if existing is not None and existing.fingerprint == fingerprint:
+            continue
+
+        if kind == 'flat':
+            index = BruteForceIndex(metric)
+        else:
+            index = IVFFlatIndex(metric, n_lists=params.get('n_lists'), nprobe=params.get('nprobe', DEFAULT_NPROBE))
+        index.build(keys, vectors)
+        index.fingerprint = fingerprint
+        index.model_type = model_type
+
+        exact = BruteForceIndex(metric)
+        exact.build(keys, vectors)
+        report = measure_recall(index, exact, sample_queries(vectors, params.get('recall_queries', 200)),
+                                threshold=thresholds.get(model_type))
+        report.update({'type': index.kind, 'rows': len(keys)})
+        index.report = report
+        index.save(path)
+        reports[model_type] = report
+        logger.info(f"Built {index.kind} index for {model_type} ({len(keys)} rows): "
+                    f"recall@1={report['recall_at_1']}, recall@{report['k']}={report['recall_at_k']}")
+        if report['recall_at_1'] < 0.95:
+            logger.warning(f"{model_type} index recall@1 is {report['recall_at_1']} - consider raising nprobe")
+
+    return reports
+
+
+def load_watchlist_indexes(targets_path: str,
+                           rows_by_model: Dict[str, Tuple[list, np.ndarray]]) -> Dict[str, ANNIndex]:
+    """Load persisted indexes built from exactly the given rows ({model_type: (keys, vectors)})."""
+    indexes = {}
+    for model_type, (keys, vectors) in rows_by_model.items():
+        index = load_index(index_path(targets_path, model_type))
+        if index is None:
+            continue
+        if index.fingerprint != rows_fingerprint(keys, vectors, model_type):
+            logger.warning(f"Stale {model_type} ANN index ignored (watchlist changed since build)")
+            continue
+        indexes[model_type] = index
+    return indexes
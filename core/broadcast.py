@@ -0,0 +1,257 @@
+import cv2
+import time
+import logging
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Any, Callable, Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("Broadcast")
+
+MAX_CLIENT_FPS = 25.0   # per-client send cap
+WAIT_TIMEOUT = 1.0      # client wake-up interval when no new frame arrives (to notice stop())
+PRODUCER_IDLE = 2.0     # seconds without clients before a producer thread stops
+
+# Preview encodings offered per stream: scale of the source frame (or a fixed width) and JPEG quality
+DEFAULT_PROFILES = {
+    'full': {'scale': 1.0, 'quality': 70},
+    'half': {'scale': 0.5, 'quality': 70},
+    'thumb': {'width': 160, 'quality': 60},
+}
+
+
+def mjpeg_part(jpeg: bytes) -> bytes:
+    """One multipart/x-mixed-replace chunk"""
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n\r\n'
+
+
+@dataclass
+class StreamClient:
+    client_id: int
+    max_fps: float
+    connected: float = field(default_factory=time.time)
+    sent: int = 0
+    skipped: int = 0          # frames published while this client was still sending the previous one
+    lag: float = 0.0          # frame timestamp (capture, or publish) -> send of the last frame, seconds
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.sent + self.skipped
+        return {'sent': self.sent, 'skipped': self.skipped,
+                'skip_rate': self.skipped / total if total else 0.0,
+                'lag_ms': round(self.lag * 1000, 1), 'max_fps': self.max_fps,
+                'connected_s': round(time.time() - self.connected, 1)}
+
+
+class MJPEGBroadcaster:
+    """
+    One MJPEG stream, any number of HTTP clients.
+
+    Frames are published once as encoded JPEG bytes (see StreamSet).
+    Clients block on a condition variable until
+    the sequence number moves, so they send each new frame exactly once, never
+    re-send or spin, and skip what they were too slow for. Each client is
+    rate-capped and reports its lag and skipped frames; per-viewer cost is a
+    socket write, not an encode.
+    """
+
+    def __init__(self, name: str, max_fps: float = MAX_CLIENT_FPS):
+        self.name = name
+        self.max_fps = max_fps
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._jpeg: Optional[bytes] = None
+        self._timestamp = 0.0
+        self._clients: Dict[int, StreamClient] = {}
+        self._ids = itertools.count(1)
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+    def publish(self, jpeg: bytes, timestamp: Optional[float] = None) -> int:
+        with self._cond:
+            self._seq += 1
+            self._jpeg = jpeg
+            self._timestamp = timestamp or time.time()
+            self._cond.notify_all()
+            return self._seq
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def latest(self) -> Optional[bytes]:
+        return self._jpeg
+
+    # ------------------------------------------------------------------
+    # Clients
+    # ------------------------------------------------------------------
+    def stream(self, max_fps: Optional[float] = None, placeholder: Optional[bytes] = None,
+               stop: Optional[Callable[[], bool]] = None) -> Iterator[bytes]:
+        """
+        Multipart chunks for one client. placeholder is sent until the first
+        frame is published; the generator ends when stop() turns true or the
+        client disconnects.
+        """
+        for item in self.frames(max_fps, stop):
+            if item is None:
+                if placeholder is not None:
+                    yield mjpeg_part(placeholder)
+                continue
+            yield mjpeg_part(item[0])
+
+    def frames(self, max_fps: Optional[float] = None,
+               stop: Optional[Callable[[], bool]] = None) -> Iterator[Optional[Tuple[bytes, float]]]:
+        """
+        Raw (jpeg, timestamp) pairs for one client, each new frame once, with
+        the same rate cap and stats as stream(). Yields None on wake-ups before
+        the first frame is published.
+        """
+        client = StreamClient(next(self._ids), max_fps or self.max_fps)
+        with self._cond:
+            self._clients[client.client_id] = client
+        min_interval = 1.0 / client.max_fps if client.max_fps > 0 else 0.0
+        seq, last_sent = 0, 0.0
+        try:
+            while not (stop and stop()):
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > seq, WAIT_TIMEOUT)
+                    new_seq, jpeg, timestamp = self._seq, self._jpeg, self._timestamp
+                if new_seq == seq or jpeg is None:
+                    if jpeg is None:
+                        yield None
+                    continue
+                if seq:
+                    client.skipped += new_seq - seq - 1
+                seq = new_seq
+                client.lag = time.time() - timestamp
+                client.sent += 1
+                yield jpeg, timestamp
+
+                # Per-client rate cap
+                wait = last_sent + min_interval - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                last_sent = time.time()
+        finally:
+            with self._cond:
+                self._clients.pop(client.client_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            clients = list(self._clients.values())
+        return {'frames': self._seq, 'clients': {c.client_id: c.stats() for c in clients}}
+
+
+@dataclass
+class StreamProfile:
+    name: str
+    scale: float = 1.0
+    width: Optional[int] = None  # fixed output width (keeps aspect), overrides scale
+    quality: int = 70
+
+    def encode(self, frame: np.ndarray) -> Optional[bytes]:
+        h, w = frame.shape[:2]
+        out_w = self.width or int(round(w * self.scale))
+        if out_w and out_w != w:
+            out_h = max(1, int(round(h * out_w / w)))
+            frame = cv2.resize(frame, (out_w, out_h), interpolation=cv2.INTER_AREA)
+        ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        return jpeg.tobytes() if ret else None
+
+
+class StreamSet:
+    """
+    One preview stream offered at several resolutions (full / half / thumb).
+
+    publish_frame() encodes each profile that has viewers, once per frame,
+    and skips the work entirely when nobody is watching (callers can check
+    has_clients() to skip drawing too). With a producer callable (returns
+    the next annotated frame, or None), frames are produced on a thread of
+    its own only while the stream has viewers; on_idle runs when it stops.
+    """
+
+    def __init__(self, name: str, profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 max_fps: float = MAX_CLIENT_FPS,
+                 producer: Optional[Callable[[], Optional[np.ndarray]]] = None,
+                 on_idle: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.profiles = {pname: StreamProfile(pname, **params)
+                         for pname, params in (profiles or DEFAULT_PROFILES).items()}
+        self.broadcasters = {pname: MJPEGBroadcaster(f"{name}:{pname}", max_fps) for pname in self.profiles}
+        self.producer = producer
+        self.on_idle = on_idle
+        self._lock = threading.Lock()
+        self._producer_thread = None
+        self.encodes = {pname: 0 for pname in self.profiles}
+
+    def has_clients(self) -> bool:
+        return any(b.client_count for b in self.broadcasters.values())
+
+    def publish_frame(self, frame: np.ndarray, timestamp: Optional[float] = None) -> Dict[str, bytes]:
+        """Encode the frame for every watched profile; returns {profile: jpeg} of what was encoded"""
+        encoded = {}
+        for pname, broadcaster in self.broadcasters.items():
+            if not broadcaster.client_count:
+                continue
+            jpeg = self.profiles[pname].encode(frame)
+            if jpeg:
+                broadcaster.publish(jpeg, timestamp)
+                encoded[pname] = jpeg
+                self.encodes[pname] += 1
+        return encoded
+
+    def stream(self, profile: str = 'full', max_fps: Optional[float] = None, placeholder: Optional[bytes] = None,
+               stop: Optional[Callable[[], bool]] = None) -> Iterator[bytes]:
+        """Multipart chunks for one client of one profile (unknown profile names fall back to 'full')"""
+        broadcaster = self.broadcasters.get(profile) or next(iter(self.broadcasters.values()))
+        chunks = broadcaster.stream(max_fps, placeholder, stop)
+        if self.producer is not None:
+            self._ensure_producer()
+        return chunks
+
+    def frames(self, profile: str = 'full', max_fps: Optional[float] = None,
+               stop: Optional[Callable[[], bool]] = None) -> Iterator[Optional[Tuple[bytes, float]]]:
+        """Raw (jpeg, timestamp) feed of one profile, counted as a viewer (see MJPEGBroadcaster.frames)"""
+        broadcaster = self.broadcasters.get(profile) or next(iter(self.broadcasters.values()))
+        items = broadcaster.frames(max_fps, stop)
+        if self.producer is not None:
+            self._ensure_producer()
+        return items
+
+    def _ensure_producer(self) -> None:
+        with self._lock:
+            if self._producer_thread is None:
+                self._producer_thread = threading.Thread(target=self._run_producer, daemon=True,
+                                                         name=f"Producer-{self.name}")
+                self._producer_thread.start()
+
+    def _run_producer(self) -> None:
+        idle_since = None
+        while True:
+            with self._lock:
+                if self.has_clients():
+                    idle_since = None
+                else:
+                    idle_since = idle_since or time.time()
+                    if time.time() - idle_since > PRODUCER_IDLE:
+                        if self.on_idle is not None:
+                            self.on_idle()  # under the lock: a new viewer can't start a producer meanwhile
+                        self._producer_thread = None
+                        break
+            if idle_since is not None:
+                time.sleep(0.05)
+                continue
+            try:
+                frame = self.producer()
+            except Exception as e:
+                logger.error(f"{self.name} producer error: {e}")
+                frame = None
+                time.sleep(0.1)
+            if frame is not None:
+                self.publish_frame(frame)
+        logger.info(f"{self.name} producer stopped (no viewers)")
+
+    def stats(self) -> Dict[str, Any]:
+        return {pname: dict(b.stats(), encodes=self.encodes[pname]) for pname, b in self.broadcasters.items()}
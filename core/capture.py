@@ -0,0 +1,258 @@
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from core.interfaces import IVideoSource
+from core.frame_pool import FramePool, POOL_SIZE
+
+logger = logging.getLogger("Capture")
+
+RING_SIZE = 4          # most recent frames kept per camera
+READER_IDLE = 30.0     # seconds before an unused get_frame() reader is forgotten
+READ_TIMEOUT = 1.0     # max wait for a new frame
+POLICIES = ('latest', 'queue')
+
+
+@dataclass
+class CapturedFrame:
+    """One grabbed frame. The array is read-only and shared by every reader."""
+    seq: int
+    timestamp: float   # time.time() right after the grab
+    frame: np.ndarray
+
+
+class FrameReader:
+    """
+    One consumer's feed from a capture ring, with its own drop policy:
+        'latest'  always the freshest frame; frames that went by unseen count as dropped
+        'queue'   every frame in order through a bounded FIFO (recorders); when the
+                  consumer falls maxsize behind, the oldest queued frame is dropped
+    """
+
+    def __init__(self, capture: 'ThreadedCapture', name: str, policy: str = 'latest', maxsize: int = RING_SIZE):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown frame drop policy '{policy}' (expected one of {POLICIES})")
+        self.capture = capture
+        self.name = name
+        self.policy = policy
+        self.last_seq = 0
+        self.frames = 0
+        self.dropped = 0
+        self.last_read = time.time()
+        self._queue = deque(maxlen=max(1, int(maxsize))) if policy == 'queue' else None
+
+    def _push(self, item: CapturedFrame) -> None:
+        """Capture thread hands a new frame to a 'queue' reader (caller holds the capture lock)"""
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(item)
+
+    def read(self, timeout: float = READ_TIMEOUT) -> Optional[CapturedFrame]:
+        """Next frame per the policy (blocks up to timeout), None if none arrived"""
+        if self._queue is not None:
+            item = self.capture.wait_queued(self._queue, timeout)
+        else:
+            item = self.capture.wait_newer(self.last_seq, timeout)
+        self.last_read = time.time()
+        if item is None:
+            return None
+        if self._queue is None and self.last_seq:
+            self.dropped += item.seq - self.last_seq - 1
+        self.last_seq = item.seq
+        self.frames += 1
+        return item
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.frames + self.dropped
+        return {'policy': self.policy, 'frames': self.frames, 'dropped': self.dropped,
+                'drop_rate': self.dropped / total if total else 0.0}
+
+
+class ThreadedCapture(IVideoSource):
+    """
+    Wraps any IVideoSource with a dedicated capture thread.
+
+    The thread grabs continuously into a small ring of CapturedFrames
+    (sequence number + capture timestamp), so the device/driver buffer is
+    drained at camera rate and detection time no longer throttles capture or
+    leaves stale frames queued. Consumers take the freshest frame through a
+    FrameReader (read-only, zero-copy) or through get_frame(), which keeps the
+    IVideoSource contract: a private, writable copy of the freshest frame the
+    calling thread has not seen yet. Several consumers no longer steal frames
+    from each other; each one's skipped frames are counted instead.
+
+    Sources that can decode into a given buffer (get_frame_into) are read
+    into a FramePool, so steady-state capture allocates nothing.
+    """
+
+    def __init__(self, source: IVideoSource, ring_size: int = RING_SIZE, name: str = 'camera',
+                 pool_size: int = POOL_SIZE):
+        self.source = source
+        self.name = name
+        # Pool only for sources that override get_frame_into (others allocate per frame anyway)
+        pooled = getattr(type(source), 'get_frame_into', None) not in (None, IVideoSource.get_frame_into)
+        self.pool = FramePool(pool_size) if pooled and pool_size else None
+        self._shape = None  # frame shape learned from the last frame, for pooled reads
+        self._ring = deque(maxlen=max(1, int(ring_size)))
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._readers: Dict[Any, FrameReader] = {}
+        self._queued: List[FrameReader] = []  # 'queue' policy readers, fed by the capture thread
+        self._thread = None
+        self._running = False
+        self.read_failures = 0
+        self.capture_fps = 0.0
+
+    # ------------------------------------------------------------------
+    # IVideoSource
+    # ------------------------------------------------------------------
+    def initialize(self, config: Dict[str, Any]) -> None:
+        self.source.initialize(config)
+        self.start()
+
+    def get_frame(self) -> Tuple[bool, Optional[np.ndarray]]:
+        item = self._thread_reader().read()
+        if item is None:
+            return False, None
+        return True, item.frame.copy()
+
+    def shutdown(self) -> None:
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        self.source.shutdown()
+
+    # ------------------------------------------------------------------
+    # Capture thread
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"Capture-{self.name}")
+        self._thread.start()
+        logger.info(f"Capture thread started for {self.name} (ring of {self._ring.maxlen})")
+
+    def _run(self) -> None:
+        count, last_fps_time = 0, time.time()
+        while self._running:
+            buffer = self.pool.acquire(self._shape) if self.pool is not None and self._shape else None
+            try:
+                if buffer is not None:
+                    ret, frame = self.source.get_frame_into(buffer)
+                else:
+                    ret, frame = self.source.get_frame()
+            except Exception as e:
+                logger.error(f"Capture error on {self.name}: {e}")
+                ret, frame = False, None
+            if not ret or frame is None:
+                if buffer is not None:
+                    self.pool.release(buffer)
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+
+            now = time.time()
+            if frame is buffer:
+                frame = self.pool.publish(buffer)  # readers hold a lease; the writable buffer stays with the pool
+            else:
+                if buffer is not None:
+                    self.pool.release(buffer)
+                self._shape = frame.shape  # first frame, or the source changed resolution
+            buffer = None
+            frame.setflags(write=False)  # shared by every reader
+            with self._cond:
+                self._seq += 1
+                item = CapturedFrame(self._seq, now, frame)
+                self._ring.append(item)
+                for reader in self._queued:
+                    reader._push(item)
+                self._cond.notify_all()
+
+            count += 1
+            if now - last_fps_time >= 1.0:
+                self.capture_fps = count / (now - last_fps_time)
+                count, last_fps_time = 0, now
+        logger.info(f"Capture thread stopped for {self.name}")
+
+    # ------------------------------------------------------------------
+    # Consumers
+    # ------------------------------------------------------------------
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def latest(self) -> Optional[CapturedFrame]:
+        with self._cond:
+            return self._ring[-1] if self._ring else None
+
+    def frames_since(self, seq: int) -> List[CapturedFrame]:
+        """Frames still in the ring that are newer than seq (oldest first)"""
+        with self._cond:
+            return [item for item in self._ring if item.seq > seq]
+
+    def wait_newer(self, seq: int, timeout: float = READ_TIMEOUT) -> Optional[CapturedFrame]:
+        """Freshest frame with a sequence number above seq, waiting up to timeout for one"""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._running or (self._ring and self._ring[-1].seq > seq), timeout)
+            if self._ring and self._ring[-1].seq > seq:
+                return self._ring[-1]
+            return None
+
+    def wait_queued(self, pending: deque, timeout: float = READ_TIMEOUT) -> Optional[CapturedFrame]:
+        """Oldest frame of a 'queue' reader, waiting up to timeout for one"""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._running or pending, timeout)
+            return pending.popleft() if pending else None
+
+    def subscribe(self, name: str, policy: str = 'latest', maxsize: int = RING_SIZE) -> FrameReader:
+        """Named reader (e.g. 'detection'); the same name returns the same reader"""
+        with self._cond:
+            if name not in self._readers:
+                reader = FrameReader(self, name, policy, maxsize)
+                self._readers[name] = reader
+                if policy == 'queue':
+                    self._queued.append(reader)
+            return self._readers[name]
+
+    def unsubscribe(self, name: str) -> None:
+        with self._cond:
+            reader = self._readers.pop(name, None)
+            if reader is not None and reader in self._queued:
+                self._queued.remove(reader)
+
+    def reader(self, name: str) -> FrameReader:
+        """Named 'latest' reader"""
+        return self.subscribe(name)
+
+    def _thread_reader(self) -> FrameReader:
+        """Implicit reader for get_frame() callers, one per calling thread"""
+        key = ('thread', threading.get_ident())
+        with self._cond:
+            reader = self._readers.get(key)
+            if reader is None:
+                now = time.time()
+                for stale in [k for k, r in self._readers.items()
+                              if isinstance(k, tuple) and now - r.last_read > READER_IDLE]:
+                    del self._readers[stale]
+                reader = self._readers[key] = FrameReader(self, threading.current_thread().name)
+            return reader
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            readers = list(self._readers.values())
+        return {
+            'captured': self._seq,
+            'capture_fps': self.capture_fps,
+            'read_failures': self.read_failures,
+            'readers': {r.name: r.stats() for r in readers},
+            'pool': self.pool.stats() if self.pool is not None else None,
+        }
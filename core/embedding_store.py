@@ -0,0 +1,404 @@
+import os
+import re
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from core.file_lock import file_lock
+
+logger = logging.getLogger("EmbeddingStore")
+
+EMBEDDINGS_DIR = 'data/embeddings'
+MODEL_TYPES = ('arcface', 'dlib')
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = 'store.lock'
+MAX_TEMPLATES = 8  # per person and model; the enrollment template is always kept
+COMPACT_SEGMENTS = 32      # segments per model before the ones after the base are merged
+COMPACT_DEAD_RATIO = 0.5   # superseded fraction of all rows that triggers a full compaction
+MANIFEST_HEAD = re.compile(rb'\{"version": (\d+)')  # _commit writes the version first
+
+
+def _as_templates(value) -> Optional[np.ndarray]:
+    """One vector or a list of vectors -> (k, dim) float32 matrix, None if empty."""
+    if value is None or len(value) == 0:
+        return None
+    return np.atleast_2d(np.asarray(value, dtype=np.float32))
+
+
+class EmbeddingStore:
+    """
+    Binary sidecar for face embeddings, replacing float lists inside person JSON.
+
+    Layout (under root):
+        manifest.json          {"version": n, "dtype": "float32",
+                                "models": {"arcface": {"segments": [
+                                    {"version": v, "file": "arcface.<v>.npy", "ids_file": "arcface.<v>.ids.json",
+                                     "rows": k, "dropped": [...]}, ...]}, ...}}
+        arcface.<v>.npy        (k, 512) rows written by write v, row i belongs to ids[i]
+        arcface.<v>.ids.json   owner id of each row
+        store.lock             held across every read-modify-write of the manifest
+
+    A person may own several rows per model (templates from enrollment, merged
+    duplicates, officer captures, confirmed alert frames). A person's rows are
+    contiguous and the first one is the enrollment template.
+
+    Writes are append-only: a put/add_template/delete writes one small
+    segment with the changed persons' rows (persons it clears are listed in
+    "dropped") and appends it to the manifest, so an enrollment costs
+    O(changed rows), not O(gallery). A person's live rows are those of the
+    last segment that mentions them. Segments are merged (compacted) once
+    there are too many: the recent ones into one (cost O(recent rows)), or
+    everything once the recent rows outgrow the base segment or most rows are
+    superseded, which keeps the amortized cost per write small. Segments are immutable and
+    opened with mmap_mode='r': readers holding an old mapping are never
+    invalidated, and a reader only loads segments it has not seen yet. The
+    store lock makes concurrent writers (web workers, engine service) queue
+    instead of overwriting each other's manifest.
+    """
+
+    def __init__(self, root: str = EMBEDDINGS_DIR, dtype: str = 'float32', max_templates: int = MAX_TEMPLATES):
+        self.root = root
+        self.dtype = np.dtype(dtype)
+        self.max_templates = max(1, int(max_templates))
+        self._lock = threading.RLock()
+        # model -> (segment versions, id -> (segment no, row slice), segment matrices)
+        self._views: Dict[str, Tuple[tuple, Dict[str, Tuple[int, slice]], List[np.ndarray]]] = {}
+        self._segments: Dict[str, Tuple[List[str], np.ndarray]] = {}  # segment file -> (ids, mmapped rows)
+        self._manifest_version = None
+        self._manifest_data = None
+        os.makedirs(self.root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def _manifest(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Current manifest, re-parsed only when its version changed (other
+        processes may commit). The version is read from the head of the file:
+        every commit increments it under the store lock, so unlike mtime/size
+        it cannot repeat for a different manifest.
+        """
+        path = os.path.join(self.root, MANIFEST_FILE)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return {'version': 0, 'dtype': self.dtype.name, 'models': {}}
+        with f:
+            head = MANIFEST_HEAD.match(f.read(64))
+            version = int(head.group(1)) if head else None  # None: older layout, always re-parsed
+            if force or version is None or version != self._manifest_version:
+                f.seek(0)
+                self._manifest_data = json.loads(f.read())
+                self._manifest_version = version
+        return self._manifest_data
+
+    @staticmethod
+    def _entry_segments(entry: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not entry:
+            return []
+        if 'segments' in entry:
+            return entry['segments']
+        # Single-matrix manifest written before segments existed
+        return [{'version': 0, 'file': entry['file'], 'ids': entry['ids'], 'rows': len(entry['ids']), 'dropped': []}]
+
+    def _segment(self, segment: Dict[str, Any]) -> Tuple[List[str], np.ndarray]:
+        """(row owner ids, mmapped rows) of one immutable segment, loaded once"""
+        filename = segment.get('file')
+        if not filename:
+            return [], np.empty((0, 0), dtype=self.dtype)
+        cached = self._segments.get(filename)
+        if cached is None:
+            if 'ids' in segment:
+                ids = segment['ids']
+            else:
+                with open(os.path.join(self.root, segment['ids_file']), 'r') as f:
+                    ids = json.load(f)
+            cached = (ids, np.load(os.path.join(self.root, filename), mmap_mode='r'))
+            self._segments[filename] = cached
+        return cached
+
+    def _model(self, model_type: str) -> Tuple[Dict[str, Tuple[int, slice]], List[np.ndarray]]:
+        """(id -> (segment no, row slice), segment matrices) for the current manifest."""
+        with self._lock:
+            segments = self._entry_segments(self._manifest()['models'].get(model_type))
+            versions = tuple(seg.get('version', 0) for seg in segments)
+            cached = self._views.get(model_type)
+            if cached is not None and cached[0] == versions:
+                return cached[1], cached[2]
+            # Only segments appended since the cached view need replaying
+            if cached is not None and versions[:len(cached[0])] == cached[0]:
+                start, index, matrices = len(cached[0]), dict(cached[1]), list(cached[2])
+            else:
+                start, index, matrices = 0, {}, []
+            for seg_no in range(start, len(segments)):
+                ids, matrix = self._segment(segments[seg_no])
+                for pid in segments[seg_no].get('dropped', ()):
+                    index.pop(pid, None)
+                for pid, rows in self._row_slices(ids).items():
+                    index.pop(pid, None)  # re-insert: index order follows the latest write
+                    index[pid] = (seg_no, rows)
+                matrices.append(matrix)
+            live = {seg.get('file') for seg in segments}
+            for filename in [f for f in self._segments if f.startswith(model_type + '.') and f not in live]:
+                del self._segments[filename]
+            self._views[model_type] = (versions, index, matrices)
+            return index, matrices
+
+    @staticmethod
+    def _row_slices(ids: List[str]) -> Dict[str, slice]:
+        slices, start = {}, 0
+        for i in range(1, len(ids) + 1):
+            if i == len(ids) or ids[i] != ids[start]:
+                slices[ids[start]] = slice(start, i)
+                start = i
+        return slices
+
+    def load(self, model_type: str) -> Tuple[List[str], np.ndarray]:
+        """All ids (one per row) and their rows for a model."""
+        return self.rows_for(list(self._model(model_type)[0]), model_type)
+
+    def rows_for(self, ids: List[str], model_type: str) -> Tuple[List[str], np.ndarray]:
+        """
+        All template rows for the given ids (grouped, in that order), skipping ids
+        without an embedding. Keys repeat once per template.
+        """
+        index, matrices = self._model(model_type)
+        keys, runs = [], []  # runs: [segment no, start, stop], adjacent rows merged
+        for pid in ids:
+            found = index.get(pid)
+            if found is None:
+                continue
+            seg_no, rows = found
+            keys.extend([pid] * (rows.stop - rows.start))
+            if runs and runs[-1][0] == seg_no and runs[-1][2] == rows.start:
+                runs[-1][2] = rows.stop
+            else:
+                runs.append([seg_no, rows.start, rows.stop])
+        if not runs:
+            dim = next((m.shape[1] for m in matrices if m.ndim == 2 and len(m)), 0)
+            return [], np.empty((0, dim), dtype=np.float32)
+        return keys, np.concatenate([np.asarray(matrices[s][a:b], dtype=np.float32) for s, a, b in runs])
+
+    def get(self, person_id: str) -> Dict[str, Optional[np.ndarray]]:
+        """Enrollment embeddings of one person, {model_type: vector or None}."""
+        return {m: (t[0] if t is not None else None) for m, t in self.get_templates(person_id).items()}
+
+    def get_templates(self, person_id: str) -> Dict[str, Optional[np.ndarray]]:
+        """All templates of one person, {model_type: (k, dim) matrix or None}."""
+        result = {}
+        for model_type in MODEL_TYPES:
+            index, matrices = self._model(model_type)
+            found = index.get(person_id)
+            result[model_type] = np.asarray(matrices[found[0]][found[1]], dtype=np.float32) if found else None
+        return result
+
+    def template_count(self, person_id: str) -> Dict[str, int]:
+        counts = {}
+        for model_type in MODEL_TYPES:
+            found = self._model(model_type)[0].get(person_id)
+            counts[model_type] = found[1].stop - found[1].start if found is not None else 0
+        return counts
+
+    def get_lists(self, person_id: str) -> Dict[str, Optional[list]]:
+        """Same as get() but as plain lists, the shape person JSON used to carry."""
+        return {m: (v.tolist() if v is not None else None) for m, v in self.get(person_id).items()}
+
+    def __contains__(self, person_id: str) -> bool:
+        return any(person_id in self._model(m)[0] for m in MODEL_TYPES)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _writing(self):
+        """Thread and store lock held, manifest re-read: the base for a read-modify-write"""
+        with self._lock, file_lock(os.path.join(self.root, LOCK_FILE)):
+            self._manifest(force=True)
+            yield
+
+    def put(self, person_id: str, embeddings: Dict[str, Any]) -> None:
+        """Insert or replace one person's embeddings (a vector or a list of templates per model)."""
+        self.put_many({person_id: embeddings})
+
+    def put_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        with self._writing():
+            self._append({pid: {m: _as_templates((e or {}).get(m)) for m in MODEL_TYPES}
+                          for pid, e in items.items()})
+
+    def add_template(self, person_id: str, embeddings: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Append one template per model to a person's existing ones. Past
+        max_templates the oldest non-enrollment template is dropped.
+        Returns the resulting template count per model.
+        """
+        with self._writing():
+            current = self.get_templates(person_id)
+            updated = {}
+            for model_type in MODEL_TYPES:
+                new = _as_templates(embeddings.get(model_type))
+                old = current[model_type]
+                if new is None:
+                    updated[model_type] = old
+                    continue
+                merged = new if old is None else np.vstack([old, new])
+                if len(merged) > self.max_templates:
+                    merged = np.vstack([merged[:1], merged[len(merged) - self.max_templates + 1:]])
+                updated[model_type] = merged
+            self._append({person_id: updated})
+            return self.template_count(person_id)
+
+    def delete(self, person_id: str) -> bool:
+        with self._writing():
+            if person_id not in self:
+                return False
+            self._append({person_id: {m: None for m in MODEL_TYPES}})
+            return True
+
+    def compact(self) -> None:
+        """Merge every model's segments into one (also happens automatically on writes)."""
+        with self._writing():
+            manifest = self._manifest()
+            self._commit(manifest, {m: self._compacted(m, manifest['version'] + 1)
+                                    for m in manifest['models']})
+
+    def _append(self, items: Dict[str, Dict[str, Optional[np.ndarray]]]) -> None:
+        """Replace every template of the given persons (None drops a model) with one new segment per model."""
+        manifest = self._manifest()
+        version = manifest['version'] + 1
+        models = {}
+        for model_type in MODEL_TYPES:
+            segments = list(self._entry_segments(manifest['models'].get(model_type)))
+            ids, parts, dropped = [], [], []
+            for pid, templates in items.items():
+                block = templates.get(model_type)
+                if block is None:
+                    dropped.append(pid)
+                else:
+                    ids.extend([pid] * len(block))
+                    parts.append(np.asarray(block, dtype=self.dtype))
+            segment = {'version': version, 'rows': len(ids), 'dropped': dropped}
+            if ids:
+                segment['file'] = f"{model_type}.{version}.npy"
+                segment['ids_file'] = f"{model_type}.{version}.ids.json"
+                np.save(os.path.join(self.root, segment['file']), np.ascontiguousarray(np.vstack(parts)))
+                with open(os.path.join(self.root, segment['ids_file']), 'w') as f:
+                    json.dump(ids, f)
+            elif not segments:
+                continue
+            models[model_type] = segments + [segment]
+        self._commit(manifest, models)
+
+        for model_type in models:
+            self._maybe_compact(model_type)
+
+    def _maybe_compact(self, model_type: str) -> None:
+        segments = self._entry_segments(self._manifest()['models'].get(model_type))
+        if len(segments) < 2:
+            return
+        index, _ = self._model(model_type)
+        total = sum(seg.get('rows', 0) for seg in segments)
+        live = sum(rows.stop - rows.start for _, rows in index.values())
+        base = segments[0].get('rows', 0)
+        if total and (total - live) / total > COMPACT_DEAD_RATIO or \
+                (len(segments) > COMPACT_SEGMENTS and total - base > base):
+            full = True
+        elif len(segments) > COMPACT_SEGMENTS:
+            full = False
+        else:
+            return
+        manifest = self._manifest()
+        self._commit(manifest, {model_type: self._compacted(model_type, manifest['version'] + 1, full)})
+
+    def _compacted(self, model_type: str, version: int, full: bool = True) -> List[Dict[str, Any]]:
+        """
+        Live rows of a model rewritten as one segment (full), or the segments
+        after the base merged into one, which keeps the base's rows in place.
+        """
+        segments = self._entry_segments(self._manifest()['models'].get(model_type))
+        index, _ = self._model(model_type)
+        first = 0 if full else 1
+        kept = segments[:first]
+        # Persons whose live rows come from the merged segments, in index (latest write) order
+        ids = [pid for pid, (seg_no, _) in index.items() if seg_no >= first]
+        dropped = []
+        if not full:
+            base_ids = set(self._segment(segments[0])[0])
+            dropped = [pid for pid in base_ids if pid not in index]
+        keys, matrix = self.rows_for(ids, model_type)
+        if not keys and not dropped:
+            return kept
+        segment = {'version': version, 'rows': len(keys), 'dropped': dropped}
+        if keys:
+            segment['file'] = f"{model_type}.{version}.npy"
+            segment['ids_file'] = f"{model_type}.{version}.ids.json"
+            np.save(os.path.join(self.root, segment['file']), np.ascontiguousarray(matrix, dtype=self.dtype))
+            with open(os.path.join(self.root, segment['ids_file']), 'w') as f:
+                json.dump(keys, f)
+        return kept + [segment]
+
+    def _commit(self, old: Dict[str, Any], models: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Swap in a manifest with the given models' segment lists (others unchanged). Store lock held."""
+        manifest = {'version': old['version'] + 1, 'dtype': self.dtype.name,
+                    'models': {m: {'segments': self._entry_segments(e)} for m, e in old['models'].items()}}
+        for model_type, segments in models.items():
+            if segments:
+                manifest['models'][model_type] = {'segments': segments}
+            else:
+                manifest['models'].pop(model_type, None)
+
+        tmp_path = os.path.join(self.root, MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        manifest_path = os.path.join(self.root, MANIFEST_FILE)
+        os.replace(tmp_path, manifest_path)
+        self._manifest_data, self._manifest_version = manifest, manifest['version']
+
+        # Superseded segments are only garbage now; a reader may still have one mapped,
+        # in which case (Windows) the removal fails and is retried next commit.
+        live = set()
+        for entry in manifest['models'].values():
+            for seg in entry['segments']:
+                live.update(seg[k] for k in ('file', 'ids_file') if seg.get(k))
+        for filename in os.listdir(self.root):
+            if (filename.endswith('.npy') or filename.endswith('.ids.json')) and filename not in live:
+                try:
+                    os.remove(os.path.join(self.root, filename))
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------
+    # Migration
+    # ------------------------------------------------------------------
+    def migrate_folder(self, folder: str) -> int:
+        """
+        Move 'embeddings' out of every person JSON in folder into the store and
+        rewrite the JSON with metadata only. Returns the number of files migrated.
+        """
+        if not os.path.exists(folder):
+            return 0
+        pending = {}
+        for filename in os.listdir(folder):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(folder, filename)
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if 'embeddings' in data and data.get('id'):
+                    pending[path] = data
+            except Exception as e:
+                logger.error(f"Error reading {filename} for migration: {e}")
+
+        if not pending:
+            return 0
+        self.put_many({data['id']: data['embeddings'] for data in pending.values()})
+        for path, data in pending.items():
+            del data['embeddings']
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=2)
+        logger.info(f"Migrated embeddings of {len(pending)} records from {folder} to {self.root}")
+        return len(pending)
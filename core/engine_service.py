@@ -0,0 +1,662 @@
+import os
+import json
+import time
+import uuid
+import secrets
+import struct
+import logging
+import threading
+from multiprocessing import shared_memory, AuthenticationError
+from multiprocessing.connection import Listener, Client
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+from core.broadcast import MJPEGBroadcaster, DEFAULT_PROFILES, MAX_CLIENT_FPS, PRODUCER_IDLE
+
+logger = logging.getLogger("EngineService")
+
+DEFAULT_NAME = 'frt_engine'                 # shared-memory segment prefix
+DEFAULT_ADDRESS = ('127.0.0.1', 6001)       # control socket (localhost only)
+AUTHKEY_ENV = 'FRT_ENGINE_AUTHKEY'         # control-socket key; overrides the key file
+AUTHKEY_FILE = 'data/engine_service.key'    # generated (0600) by the service on first start
+LEGACY_AUTHKEY = 'frt-engine'               # the key once shipped in config.yaml; refused
+FRAME_SLOTS = 4                             # JPEGs kept per profile ring
+FRAME_SLOT_BYTES = 1024 * 1024              # max JPEG size; bigger frames are dropped (counted)
+EVENT_SLOTS = 256                           # detection events kept for web workers that poll late
+EVENT_SLOT_BYTES = 4096
+READER_IDLE = 3.0       # seconds since the last reader heartbeat before a profile stops being encoded
+POLL_INTERVAL = 0.01    # web-side wait between checks of a frame ring (one poller per watched profile)
+STATUS_TTL = 1.0        # web-side cache of the service status (one socket round trip per second at most)
+DEFAULT_FOLDERS = {'criminal': 'data/persons', 'missing': 'data/missing_persons'}
+GALLERY_THRESHOLDS = {'arcface': 0.6, 'dlib': 0.45}  # the web app's match cut-offs, for the precision check
+
+# Shared state the service owns and web workers reach through ServiceProxy ('call' command).
+# Only these methods are exposed; everything that writes the person gallery, the watchlist
+# (targets file, ANN indexes) or the embedding store runs in the service process.
+REMOTE_METHODS = {
+    'watchlist': ('activate', 'deactivate', 'refresh_templates', 'rebuild', 'counts', 'targets'),
+    'gallery': ('upsert', 'add_template', 'remove', 'find_best_match', 'search_top_k'),
+    'store': ('put', 'add_template', 'delete', 'migrate_folder'),
+}
+
+# Ring layout: header [write seq u64, slots u64, slot size u64, reader heartbeat f64] padded to 64 bytes,
+# then `slots` x [seq u64, timestamp f64, length u64, payload]
+HEADER = struct.Struct('<QQQd')
+HEADER_BYTES = 64
+HEARTBEAT_OFFSET = 24
+SLOT_HEADER = struct.Struct('<QdQ')
+SEQ = struct.Struct('<Q')
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open an existing segment without handing it to this process's resource tracker (it would unlink it on exit)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == 'posix':
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+    return shm
+
+
+class SharedRing:
+    """
+    Fixed-slot byte ring in shared memory: one writer process, any number of
+    reader processes.
+
+    Each entry carries a sequence number, a timestamp and a payload (a JPEG
+    or a JSON event). Readers never lock: a slot's sequence number is cleared
+    while it is rewritten and checked again after the copy, so a torn read is
+    detected and skipped (seqlock). Readers stamp a heartbeat into the header
+    so the writer can stop producing for a ring nobody watches.
+    """
+
+    def __init__(self, name: str, slots: int = FRAME_SLOTS, slot_size: int = FRAME_SLOT_BYTES, create: bool = False):
+        self.name = name
+        self.owner = create
+        self.oversized = 0
+        if create:
+            try:  # leftover of a crashed service
+                stale = _attach(name)
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+            self.slots, self.slot_size = max(1, int(slots)), int(slot_size)
+            size = HEADER_BYTES + self.slots * (SLOT_HEADER.size + self.slot_size)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            HEADER.pack_into(self.shm.buf, 0, 0, self.slots, self.slot_size, 0.0)
+        else:
+            self.shm = _attach(name)
+            _, self.slots, self.slot_size, _ = HEADER.unpack_from(self.shm.buf, 0)
+
+    def _offset(self, seq: int) -> int:
+        return HEADER_BYTES + (seq % self.slots) * (SLOT_HEADER.size + self.slot_size)
+
+    @property
+    def seq(self) -> int:
+        return SEQ.unpack_from(self.shm.buf, 0)[0]
+
+    # ------------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------------
+    def write(self, payload: bytes, timestamp: Optional[float] = None) -> int:
+        """Append one entry; returns its sequence number (0 if it does not fit a slot)"""
+        if len(payload) > self.slot_size:
+            self.oversized += 1
+            return 0
+        seq = self.seq + 1
+        offset = self._offset(seq)
+        start = offset + SLOT_HEADER.size
+        buf = self.shm.buf
+        SLOT_HEADER.pack_into(buf, offset, 0, 0.0, 0)  # readers see the slot as in-flight
+        buf[start:start + len(payload)] = payload
+        SLOT_HEADER.pack_into(buf, offset, seq, timestamp or time.time(), len(payload))
+        SEQ.pack_into(buf, 0, seq)
+        return seq
+
+    @property
+    def heartbeat(self) -> float:
+        return struct.unpack_from('<d', self.shm.buf, HEARTBEAT_OFFSET)[0]
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+    def touch(self) -> None:
+        """Reader heartbeat: tells the writer this ring is being watched"""
+        struct.pack_into('<d', self.shm.buf, HEARTBEAT_OFFSET, time.time())
+
+    def read(self, seq: int) -> Optional[Tuple[bytes, float]]:
+        """(payload, timestamp) of entry seq, or None if it was overwritten or is being written"""
+        offset = self._offset(seq)
+        slot_seq, timestamp, length = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        if slot_seq != seq or length > self.slot_size:
+            return None
+        start = offset + SLOT_HEADER.size
+        payload = bytes(self.shm.buf[start:start + length])
+        if SEQ.unpack_from(self.shm.buf, offset)[0] != seq:
+            return None
+        return payload, timestamp
+
+    def latest(self, after: int = 0) -> Optional[Tuple[int, bytes, float]]:
+        """Newest entry if its sequence number is above after"""
+        seq = self.seq
+        if seq <= after:
+            return None
+        item = self.read(seq)
+        return (seq,) + item if item is not None else None
+
+    def since(self, after: int) -> List[Tuple[int, bytes, float]]:
+        """Entries newer than after that are still in the ring (oldest first)"""
+        seq = self.seq
+        items = []
+        for s in range(max(after + 1, seq - self.slots + 1, 1), seq + 1):
+            item = self.read(s)
+            if item is not None:
+                items.append((s,) + item)
+        return items
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _authkey(config: Dict[str, Any], create: bool = False) -> bytes:
+    """
+    Control-socket key: $FRT_ENGINE_AUTHKEY, else the key file. The service
+    (create=True) writes a random key file readable only by its user if there
+    is none; web workers must run as that user or get the key from the env.
+    multiprocessing.connection unpickles what it receives, so there is no
+    default key: a missing, empty or legacy key raises PermissionError.
+    """
+    svc = config.get('engine_service', {}) or {}
+    if 'authkey' in svc:
+        logger.warning(f"engine_service.authkey in the config is ignored; use {AUTHKEY_ENV} or the key file")
+    key = os.environ.get(AUTHKEY_ENV, '').strip()
+    source = AUTHKEY_ENV
+    if not key:
+        source = svc.get('authkey_file', AUTHKEY_FILE)
+        if create and not os.path.exists(source):
+            os.makedirs(os.path.dirname(source) or '.', exist_ok=True)
+            try:
+                fd = os.open(source, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(fd, 'w') as f:
+                    f.write(secrets.token_hex(32))
+                logger.info(f"Generated engine service key {source}")
+            except FileExistsError:
+                pass  # another process created it first
+        try:
+            with open(source, 'r') as f:
+                key = f.read().strip()
+        except FileNotFoundError:
+            raise PermissionError(f"No engine service key: set {AUTHKEY_ENV} or start the service "
+                                  f"to create {source}") from None
+        if os.name == 'posix' and os.stat(source).st_mode & 0o077:
+            logger.warning(f"Engine service key {source} is readable by other users (chmod 600)")
+    if not key or key == LEGACY_AUTHKEY:
+        raise PermissionError(f"Refusing the engine service key from {source}: it is empty or the old "
+                              f"default; set a new one")
+    return key.encode()
+
+
+def _service_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    svc = config.get('engine_service', {}) or {}
+    return {
+        'name': svc.get('name', DEFAULT_NAME),
+        'address': (svc.get('host', DEFAULT_ADDRESS[0]), int(svc.get('port', DEFAULT_ADDRESS[1]))),
+        'profiles': list((config.get('streaming', {}).get('profiles') or DEFAULT_PROFILES).keys()),
+        'max_fps': config.get('streaming', {}).get('max_client_fps', MAX_CLIENT_FPS),
+    }
+
+
+class EngineService:
+    """
+    The surveillance engine as a standalone process (python -m core.engine_service).
+
+    Owns the camera, the face model and the SurveillanceEngine. Annotated
+    previews go into one shared-memory frame ring per stream profile, encoded
+    only while some web worker's reader heartbeat on that ring is fresh;
+    detection events go into an event ring as JSON. A small control socket
+    (multiprocessing.connection, localhost + authkey) takes start / stop /
+    status commands, so any number of web worker processes can serve the
+    feeds without opening the camera or loading models themselves.
+
+    The service is also the single writer of the shared person state: the
+    watchlist feed (targets file, ANN indexes), the person gallery and the
+    embedding store live here, and web workers call them over the same
+    socket ('call' command, see REMOTE_METHODS). Every worker therefore sees
+    every other worker's changes, and nothing is persisted twice.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        from core.plugin_manager import PluginManager
+        from core.surveillance_engine import TARGETS_FILE, ARCFACE_MATCH_THRESHOLD, DLIB_MATCH_THRESHOLD
+        from core.watchlist import WatchlistFeed
+        from core.embedding_store import EmbeddingStore, EMBEDDINGS_DIR, MAX_TEMPLATES
+        from core.gallery import PersonGallery
+
+        self.config = config
+        self.settings = _service_settings(config)
+        self.authkey = _authkey(config, create=True)
+        svc = config.get('engine_service', {}) or {}
+        name = self.settings['name']
+        self.instance = uuid.uuid4().hex  # lets web workers notice a restarted service
+        self.frame_rings = {
+            profile: SharedRing(f"{name}_{profile}", svc.get('frame_slots', FRAME_SLOTS),
+                                svc.get('frame_slot_bytes', FRAME_SLOT_BYTES), create=True)
+            for profile in self.settings['profiles']
+        }
+        self.events = SharedRing(f"{name}_events", EVENT_SLOTS, EVENT_SLOT_BYTES, create=True)
+
+        self.pm = PluginManager()
+        self.pm.initialize_model(config)
+        store_cfg = config.get('embedding_store', {})
+        folders = svc.get('folders', DEFAULT_FOLDERS)
+        self.store = EmbeddingStore(store_cfg.get('path', EMBEDDINGS_DIR), store_cfg.get('dtype', 'float32'),
+                                    store_cfg.get('max_templates', MAX_TEMPLATES))
+        for folder in folders.values():
+            self.store.migrate_folder(folder)
+        self.gallery = PersonGallery(
+            folders, store=self.store,
+            precision=config.get('surveillance', {}).get('gallery', {}).get('precision', 'float32'),
+            thresholds=GALLERY_THRESHOLDS)
+        self.watchlist = WatchlistFeed(
+            folders, TARGETS_FILE, store=self.store,
+            index_params=config.get('surveillance', {}).get('ann_index', {}),
+            thresholds={'arcface': ARCFACE_MATCH_THRESHOLD, 'dlib': DLIB_MATCH_THRESHOLD})
+
+        self.engine = None
+        self.running = True
+        self._lock = threading.Lock()
+        self._publishers = [
+            threading.Thread(target=self._publish, args=(profile, ring), daemon=True, name=f"Publish-{profile}")
+            for profile, ring in self.frame_rings.items()
+        ]
+
+    # ------------------------------------------------------------------
+    # Engine lifecycle
+    # ------------------------------------------------------------------
+    def start_engine(self) -> None:
+        from core.surveillance_engine import SurveillanceEngine
+
+        with self._lock:
+            if self.engine is not None:
+                return
+            if self.pm.active_camera is None:
+                self.pm.initialize_camera(self.config)
+            self.engine = SurveillanceEngine(self.pm, self.config, detection_callback=self.publish_event,
+                                             watchlist=self.watchlist)
+
+    def stop_engine(self) -> None:
+        with self._lock:
+            engine, self.engine = self.engine, None
+            if engine is not None:
+                engine.stop()
+            if self.pm.active_camera is not None:
+                self.pm.active_camera.shutdown()  # release the camera (light off)
+                self.pm.active_camera = None
+
+    def publish_event(self, name: str, confidence: float, is_wanted: bool, db_type: str) -> None:
+        """Engine detection_callback: one JSON entry in the event ring"""
+        event = {'name': name, 'confidence': float(confidence), 'is_wanted': bool(is_wanted), 'db_type': db_type}
+        self.events.write(json.dumps(event).encode('utf-8'))
+
+    def _watched(self, ring: SharedRing) -> bool:
+        return time.time() - ring.heartbeat < READER_IDLE
+
+    def _publish(self, profile: str, ring: SharedRing) -> None:
+        """Copy one profile's encoded previews into its ring while some web worker reads it"""
+        while self.running:
+            engine = self.engine
+            if engine is None or engine.stopped or not self._watched(ring):
+                time.sleep(0.1)
+                continue
+            for item in engine.streams.frames(profile, self.settings['max_fps'],
+                                              stop=lambda: engine.stopped or not self.running
+                                              or not self._watched(ring)):
+                if item is not None:
+                    ring.write(*item)
+
+    # ------------------------------------------------------------------
+    # Control socket
+    # ------------------------------------------------------------------
+    def status(self) -> Dict[str, Any]:
+        engine = self.engine
+        running = engine is not None and not engine.stopped
+        return {
+            'running': running,
+            'instance': self.instance,
+            'targets': len(engine.targets_by_id) if running else 0,
+            'metrics': engine.get_metrics() if running else {},
+            'frames': {p: {'seq': r.seq, 'oversized': r.oversized, 'watched': self._watched(r)}
+                       for p, r in self.frame_rings.items()},
+            'events': self.events.seq,
+        }
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        cmd = request.get('cmd')
+        if cmd == 'ping':
+            return {'ok': True, 'instance': self.instance}
+        if cmd == 'status':
+            return self.status()
+        if cmd == 'start':
+            self.start_engine()
+            return self.status()
+        if cmd == 'stop':
+            self.stop_engine()
+            return self.status()
+        if cmd == 'call':
+            return {'result': self.call(request.get('target'), request.get('method'),
+                                        request.get('args', ()), request.get('kwargs', {}))}
+        if cmd == 'shutdown':
+            self.running = False
+            return {'ok': True}
+        return {'error': f"Unknown command '{cmd}'"}
+
+    def call(self, target: Optional[str], method: Optional[str], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """Run a web worker's watchlist / gallery / store call on this process's objects"""
+        if method not in REMOTE_METHODS.get(target, ()):
+            raise ValueError(f"{target}.{method} is not a remote method")
+        obj = {'watchlist': self.watchlist, 'gallery': self.gallery, 'store': self.store}[target]
+        return getattr(obj, method)(*args, **kwargs)
+
+    def _serve(self, conn) -> None:
+        try:
+            while True:
+                request = conn.recv()
+                try:
+                    reply = self.handle(request)
+                except Exception as e:
+                    logger.error(f"Command {request!r} failed: {e}")
+                    reply = {'error': str(e)}
+                conn.send(reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _accept(self, listener: Listener) -> None:
+        while self.running:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                if self.running:
+                    logger.warning(f"Control connection rejected: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True, name="Control").start()
+
+    def run(self, autostart: bool = False) -> None:
+        listener = Listener(self.settings['address'], authkey=self.authkey)
+        threading.Thread(target=self._accept, args=(listener,), daemon=True, name="ControlAccept").start()
+        for thread in self._publishers:
+            thread.start()
+        logger.info(f"Engine service listening on {self.settings['address'][0]}:{self.settings['address'][1]}")
+        if autostart:
+            self.start_engine()
+        try:
+            while self.running:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            listener.close()
+            self.stop_engine()
+            if self.pm.active_model is not None:
+                self.pm.active_model.shutdown()
+            for ring in list(self.frame_rings.values()) + [self.events]:
+                ring.close()
+            self.watchlist.flush()
+            logger.info("Engine service stopped")
+
+
+class RingStreams:
+    """
+    Web-side stand-in for the engine's StreamSet: serves the service's frame rings.
+
+    One poller thread per profile (started by the first viewer, stopped
+    PRODUCER_IDLE after the last one leaves) watches the shared ring and
+    republishes each new JPEG to an MJPEGBroadcaster in this worker, so
+    viewers block on its condition variable like in-process ones instead of
+    each polling the ring.
+    """
+
+    def __init__(self, client: 'EngineClient'):
+        self.client = client
+        self.broadcasters = {profile: MJPEGBroadcaster(f"engine:{profile}", client.max_fps)
+                             for profile in client.settings['profiles']}
+        self.ring_skipped = {profile: 0 for profile in self.broadcasters}  # ring entries overwritten between polls
+        self._pollers: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def stream(self, profile: str = 'full', max_fps: Optional[float] = None, placeholder: Optional[bytes] = None,
+               stop: Optional[Callable[[], bool]] = None) -> Iterator[bytes]:
+        if profile not in self.broadcasters:
+            profile = next(iter(self.broadcasters))
+        chunks = self.broadcasters[profile].stream(max_fps, placeholder, stop)
+        with self._lock:
+            if profile not in self._pollers:
+                self._pollers[profile] = threading.Thread(target=self._poll, args=(profile,), daemon=True,
+                                                          name=f"RingPoll-{profile}")
+                self._pollers[profile].start()
+        return chunks
+
+    def _poll(self, profile: str) -> None:
+        """Copy new ring entries of one profile into its broadcaster while this worker has viewers"""
+        broadcaster = self.broadcasters[profile]
+        current, seq, idle_since = None, 0, None
+        while True:
+            with self._lock:
+                if broadcaster.client_count:
+                    idle_since = None
+                else:
+                    idle_since = idle_since or time.time()
+                    if time.time() - idle_since > PRODUCER_IDLE:
+                        del self._pollers[profile]  # under the lock: a new viewer starts a new poller
+                        break
+            ring = self.client.ring(profile) if idle_since is None else None
+            if ring is None:
+                time.sleep(POLL_INTERVAL * 10)
+                continue
+            if ring is not current:  # first attach, or the service restarted
+                current, seq = ring, 0
+            ring.touch()
+            item = ring.latest(seq)
+            if item is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            new_seq, jpeg, timestamp = item
+            if seq and new_seq > seq + 1:
+                self.ring_skipped[profile] += new_seq - seq - 1
+            seq = new_seq
+            broadcaster.publish(jpeg, timestamp)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'service': self.client.status().get('frames', {}),
+                'profiles': {p: dict(b.stats(), ring_skipped=self.ring_skipped[p])
+                             for p, b in self.broadcasters.items()}}
+
+
+class ServiceProxy:
+    """
+    Web-side stand-in for one of the service's shared objects ('watchlist',
+    'gallery', 'store'): the REMOTE_METHODS of that target run in the service.
+    Any other attribute is read from local, if given (e.g. an EmbeddingStore
+    for reads: the store's manifest is re-read when another process changed
+    it, so only writes need the round trip).
+    """
+
+    def __init__(self, client: 'EngineClient', target: str, local: Any = None):
+        self._client = client
+        self._target = target
+        self._methods = REMOTE_METHODS[target]
+        self._local = local
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._methods:
+            return lambda *args, **kwargs: self._client.remote(self._target, name, *args, **kwargs)
+        if self._local is not None:
+            return getattr(self._local, name)
+        raise AttributeError(f"{self._target}.{name} is not available from the engine service")
+
+
+class EngineClient:
+    """
+    A web worker's handle on the engine service. Stands in for an in-process
+    SurveillanceEngine where the web app needs one: streams (from the shared
+    frame rings), stopped, stop(); plus start(), poll_events() for the
+    detection log and proxy() for the watchlist, gallery and store the
+    service owns.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.settings = _service_settings(config)
+        self._authkey: Optional[bytes] = None
+        self.max_fps = self.settings['max_fps']
+        self.streams = RingStreams(self)
+        self._instance = None
+        self._rings: Dict[str, SharedRing] = {}
+        self._events: Optional[SharedRing] = None
+        self._event_seq = 0
+        self._status: Dict[str, Any] = {}
+        self._status_time = 0.0
+        self._lock = threading.Lock()
+
+    def call(self, cmd: str, **params) -> Dict[str, Any]:
+        """One control command; raises ConnectionError / OSError when the service is down (or has no key yet)"""
+        if self._authkey is None:
+            self._authkey = _authkey(self.config)  # read on first use: the service may create the file later
+        try:
+            conn = Client(self.settings['address'], authkey=self._authkey)
+        except AuthenticationError as e:
+            self._authkey = None  # re-read: the key may have been replaced
+            raise PermissionError(f"Engine service rejected the key: {e}") from None
+        with conn:
+            conn.send(dict(params, cmd=cmd))
+            return conn.recv()
+
+    def remote(self, target: str, method: str, *args, **kwargs) -> Any:
+        """Call target.method in the service; its errors are raised here as RuntimeError"""
+        reply = self.call('call', target=target, method=method, args=args, kwargs=kwargs)
+        if 'error' in reply:
+            raise RuntimeError(f"Engine service {target}.{method} failed: {reply['error']}")
+        return reply['result']
+
+    def proxy(self, target: str, local: Any = None) -> ServiceProxy:
+        return ServiceProxy(self, target, local)
+
+    def status(self, max_age: float = STATUS_TTL) -> Dict[str, Any]:
+        with self._lock:
+            if time.time() - self._status_time < max_age:
+                return self._status
+        try:
+            status = self.call('status')
+        except (OSError, EOFError) as e:
+            status = {'running': False, 'error': f"Engine service unreachable: {e}"}
+        self._remember(status)
+        return status
+
+    def _remember(self, status: Dict[str, Any]) -> None:
+        with self._lock:
+            self._status, self._status_time = status, time.time()
+            if status.get('instance') and status['instance'] != self._instance:
+                self._detach()  # service restarted: its rings are new segments
+                self._instance = status['instance']
+
+    @property
+    def stopped(self) -> bool:
+        return not self.status().get('running')
+
+    def start(self) -> Dict[str, Any]:
+        status = self.call('start')
+        self._remember(status)
+        return status
+
+    def stop(self) -> None:
+        try:
+            self._remember(self.call('stop'))
+        except (OSError, EOFError) as e:
+            logger.warning(f"Engine service unreachable: {e}")
+
+    # ------------------------------------------------------------------
+    # Shared memory
+    # ------------------------------------------------------------------
+    def ring(self, profile: str) -> Optional[SharedRing]:
+        """Attached frame ring of a profile (unknown names fall back to the first profile)"""
+        if profile not in self.settings['profiles']:
+            profile = self.settings['profiles'][0]
+        if self._instance is None:
+            self.status()
+        with self._lock:
+            if self._instance is None:
+                return None
+            if profile not in self._rings:
+                try:
+                    self._rings[profile] = SharedRing(f"{self.settings['name']}_{profile}")
+                except FileNotFoundError:
+                    return None
+            return self._rings[profile]
+
+    def _event_ring(self) -> Optional[SharedRing]:
+        if self._instance is None:
+            self.status()
+        with self._lock:
+            if self._events is None and self._instance is not None:
+                try:
+                    self._events = SharedRing(f"{self.settings['name']}_events")
+                except FileNotFoundError:
+                    return None
+            return self._events
+
+    def skip_events(self) -> None:
+        """Start the next poll_events() from now (new log session)"""
+        ring = self._event_ring()
+        self._event_seq = ring.seq if ring is not None else 0
+
+    def poll_events(self, callback: Callable[..., None]) -> int:
+        """Hand each new detection event to callback(name, confidence, is_wanted, db_type)"""
+        ring = self._event_ring()
+        if ring is None:
+            return 0
+        if ring.seq < self._event_seq:  # ring recreated
+            self._event_seq = 0
+        events = ring.since(self._event_seq)
+        for seq, payload, _ in events:
+            self._event_seq = seq
+            try:
+                callback(**json.loads(payload.decode('utf-8')))
+            except Exception as e:
+                logger.error(f"Detection event {seq} failed: {e}")
+        return len(events)
+
+    def _detach(self) -> None:
+        for ring in self._rings.values():
+            ring.close()
+        if self._events is not None:
+            self._events.close()
+        self._rings, self._events, self._event_seq = {}, None, 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._detach()
+
+
+if __name__ == '__main__':
+    import argparse
+    import yaml
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description="Standalone surveillance engine for multi-worker web deployments")
+    parser.add_argument('--config', default=os.path.join('config', 'config.yaml'))
+    parser.add_argument('--start', action='store_true', help="start surveillance immediately")
+    args = parser.parse_args()
+    with open(args.config, 'r') as f:
+        EngineService(yaml.safe_load(f)).run(autostart=args.start)
@@ -0,0 +1,134 @@
+import time
+import logging
+import itertools
+import threading
+from typing import Dict, Any, Optional
+
+from core.interfaces import IVideoSource
+from core.capture import ThreadedCapture, CapturedFrame, RING_SIZE, READ_TIMEOUT
+
+logger = logging.getLogger("FrameHub")
+
+DEFAULT_CAMERA = 'default'
+
+
+class FrameSubscription:
+    """
+    One consumer's feed from a hub camera. The underlying reader is resolved on
+    every read, so the subscription keeps working when the camera is stopped
+    and started again (a new capture object) or the default camera changes.
+    """
+
+    def __init__(self, hub: 'FrameHub', name: str, camera: Optional[str], policy: str, maxsize: int):
+        self.hub = hub
+        self.name = name
+        self.camera = camera
+        self.policy = policy
+        self.maxsize = maxsize
+        self._source = None
+        self._reader = None
+        self._seq = 0  # plain (unthreaded) sources only
+
+    def read(self, timeout: float = READ_TIMEOUT) -> Optional[CapturedFrame]:
+        """Next frame per this subscriber's drop policy; None if no camera or no frame in time"""
+        source = self.hub.camera(self.camera)
+        if source is not self._source:
+            self._detach()
+            self._source = source
+            if isinstance(source, ThreadedCapture):
+                self._reader = source.subscribe(self.name, self.policy, self.maxsize)
+        if source is None:
+            return None
+        if self._reader is not None:
+            return self._reader.read(timeout)
+
+        # Plain IVideoSource (capture.threaded: false): synchronous grab, nothing to share
+        ret, frame = source.get_frame()
+        if not ret or frame is None:
+            return None
+        self._seq += 1
+        frame.setflags(write=False)
+        return CapturedFrame(self._seq, time.time(), frame)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._reader.stats() if self._reader is not None else {'policy': self.policy}
+
+    def close(self) -> None:
+        self._detach()
+        self._source = None
+        self.hub._release(self)
+
+    def _detach(self) -> None:
+        if self._reader is not None:
+            self._reader.capture.unsubscribe(self.name)
+            self._reader = None
+
+    def __enter__(self) -> 'FrameSubscription':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class FrameHub:
+    """
+    Owns the camera sources and fans their frames out to any number of
+    subscribers (face pipeline, weapon detector, crowd counter, recorders).
+
+    Each camera is read and decoded once by its capture thread; every
+    subscriber gets the same read-only CapturedFrame (copy only if you draw on
+    it) under its own drop policy, so consumers no longer take frames away
+    from one another. Default policies per subscriber name come from the
+    capture.subscribers config section.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.policies = policies or {}
+        self._cameras: Dict[str, IVideoSource] = {}
+        self._subscriptions: Dict[str, FrameSubscription] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Cameras
+    # ------------------------------------------------------------------
+    def set_camera(self, source: Optional[IVideoSource], name: str = DEFAULT_CAMERA) -> None:
+        """Publish (or with None, withdraw) a camera; the owner still shuts it down"""
+        with self._lock:
+            if source is None:
+                self._cameras.pop(name, None)
+            else:
+                self._cameras[name] = source
+
+    def camera(self, name: Optional[str] = None) -> Optional[IVideoSource]:
+        return self._cameras.get(name or DEFAULT_CAMERA)
+
+    # ------------------------------------------------------------------
+    # Subscribers
+    # ------------------------------------------------------------------
+    def subscribe(self, name: str, camera: Optional[str] = None, policy: Optional[str] = None,
+                  maxsize: Optional[int] = None) -> FrameSubscription:
+        """
+        New feed for a consumer. policy/maxsize default to capture.subscribers[name]
+        ('latest' otherwise). Close the subscription when the consumer stops.
+        """
+        defaults = self.policies.get(name, {})
+        with self._lock:
+            key = f"{name}#{next(self._ids)}"  # unique per consumer (e.g. per browser tab)
+            sub = FrameSubscription(self, key, camera, policy or defaults.get('policy', 'latest'),
+                                    maxsize or defaults.get('maxsize', RING_SIZE))
+            self._subscriptions[key] = sub
+        return sub
+
+    def _release(self, sub: FrameSubscription) -> None:
+        with self._lock:
+            self._subscriptions.pop(sub.name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cameras = dict(self._cameras)
+            subscriptions = list(self._subscriptions.values())
+        return {
+            'cameras': {name: (src.stats() if hasattr(src, 'stats') else {}) for name, src in cameras.items()},
+            'subscribers': {sub.name: sub.stats() for sub in subscriptions},
+        }
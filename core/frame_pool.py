@@ -0,0 +1,112 @@
+import logging
+import threading
+import weakref
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("FramePool")
+
+POOL_SIZE = 8   # buffers kept per frame shape (ring + frames still referenced downstream)
+
+
+class _Lease:
+    """
+    Read-only array interface over one pooled buffer. Every frame array, view
+    and crop handed out for that buffer keeps this object alive (numpy keeps
+    the exporting object as the base), so it lives exactly as long as the
+    last of them.
+    """
+    __slots__ = ('__array_interface__', '_buffer', '__weakref__')
+
+    def __init__(self, buffer: np.ndarray):
+        self._buffer = buffer
+        interface = dict(buffer.__array_interface__)
+        interface['data'] = (interface['data'][0], True)
+        self.__array_interface__ = interface
+
+
+class FramePool:
+    """
+    Recycled capture buffers.
+
+    The capture thread acquire()s a writable buffer, reads a frame into it
+    and publish()es it: readers get a read-only array backed by a lease on
+    the buffer. Every view, face crop and queued reference holds the lease,
+    and a weakref.finalize on it returns the buffer to the free list once the
+    ring, the pipeline stages and any pending alert have all let go (there
+    is no release() call a consumer could forget). A buffer that is never
+    published (failed read) is release()d by the capture thread. When every
+    pooled buffer is in use, the frame is allocated outside the pool and
+    counted as overflow.
+
+    Ownership is a weak reference to each pooled buffer, so a buffer that is
+    dropped without coming back (error path, resolution change) leaves the
+    pool's bookkeeping when it is freed, and a later buffer can never be
+    mistaken for it. When the frame shape changes, free buffers of the old
+    shape are dropped and in-use ones are not taken back.
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = max(1, int(size))
+        self._free: Dict[Tuple, List[np.ndarray]] = {}
+        self._pooled = weakref.WeakValueDictionary()  # id(buffer) -> buffer, for live buffers the pool owns
+        self._counts: Dict[Tuple, int] = {}  # live pooled buffers per key
+        self._key = None  # shape/dtype of the current frames
+        self._lock = threading.RLock()  # finalizers (release, _forget) may run inside a locked section
+        self.stats_data = {'allocated': 0, 'reused': 0, 'overflow': 0, 'bytes_allocated': 0}
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Writable buffer nobody holds a frame of, or a new one"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            if key != self._key:
+                self._free = {key: self._free.get(key, [])}  # old-shape buffers go once nobody holds them
+                self._key = key
+            free = self._free[key]
+            if free:
+                self.stats_data['reused'] += 1
+                return free.pop()
+            buffer = np.empty(shape, dtype=dtype)
+            self.stats_data['allocated'] += 1
+            self.stats_data['bytes_allocated'] += buffer.nbytes
+            if self._counts.get(key, 0) < self.size:
+                self._pooled[id(buffer)] = buffer
+                self._counts[key] = self._counts.get(key, 0) + 1
+                weakref.finalize(buffer, self._forget, key)
+            else:
+                self.stats_data['overflow'] += 1
+            return buffer
+
+    def _forget(self, key: Tuple) -> None:
+        """A pooled buffer was freed"""
+        with self._lock:
+            self._counts[key] -= 1
+            if not self._counts[key]:
+                del self._counts[key]
+
+    def publish(self, buffer: np.ndarray) -> np.ndarray:
+        """Read-only frame over an acquired buffer; the buffer is recycled when the frame's last reference goes"""
+        lease = _Lease(buffer)
+        weakref.finalize(lease, self.release, buffer)
+        return np.asarray(lease)
+
+    def release(self, buffer: np.ndarray) -> None:
+        """Return an acquired buffer no frame refers to (overflow and old-shape buffers are just dropped)"""
+        with self._lock:
+            if self._pooled.get(id(buffer)) is not buffer:
+                return
+            key = (buffer.shape, buffer.dtype.str)
+            if key == self._key:
+                self._free[key].append(buffer)
+            else:
+                del self._pooled[id(buffer)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pooled = self._counts.get(self._key, 0)
+            free = len(self._free.get(self._key, ()))
+            stats = dict(self.stats_data, pooled=pooled, in_use=pooled - free)
+        total = stats['allocated'] + stats['reused']
+        stats['reuse_rate'] = stats['reused'] / total if total else 0.0
+        return stats
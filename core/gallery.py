@@ -0,0 +1,984 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("EmbeddingGallery")
+
+# Metric used per model type. ArcFace embeddings are compared with cosine
+# similarity, dlib descriptors with plain euclidean distance.
+MODEL_METRICS = {
+    'arcface': 'cosine',
+    'dlib': 'euclidean',
+}
+
+# Gallery storage precision. float16 halves and int8 (per-row scale) quarters
+# the matrix memory; scoring streams SCORE_CHUNK rows at a time through float32.
+PRECISIONS = ('float32', 'float16', 'int8')
+SCORE_CHUNK = 8192
+
+
+def _has_vector(vec) -> bool:
+    """True for a non-empty list/array (embeddings may be JSON lists or NumPy rows)."""
+    return vec is not None and len(vec) > 0
+
+
+def _templates(vec) -> Optional[np.ndarray]:
+    """One vector or a list/matrix of templates -> (k, dim) float32, None if empty."""
+    if not _has_vector(vec):
+        return None
+    return np.atleast_2d(np.asarray(vec, dtype=np.float32))
+
+
+class _GalleryRows:
+    """
+    Read-only view handed to searches: the first n rows of the gallery buffers,
+    plus the identity-offset index (live identities and the first row of each block).
+    """
+    __slots__ = ('keys', 'alive', 'matrices', 'present', 'sq_norms', 'scales', 'ident_keys', 'starts')
+
+    def __init__(self, keys, alive, matrices, present, sq_norms, scales, ident_keys, starts):
+        self.keys = keys
+        self.alive = alive
+        self.matrices = matrices
+        self.present = present
+        self.sq_norms = sq_norms
+        self.scales = scales
+        self.ident_keys = ident_keys
+        self.starts = starts
+
+
+class EmbeddingGallery:
+    """
+    Contiguous embedding matrices for vectorized matching.
+
+    Every identity (key) owns a block of consecutive rows, one per template
+    (enrollment photo, merged duplicates, officer captures, confirmed alert
+    frames). Rows are aligned across model types: row i of every matrix belongs
+    to keys[i], and present[model][i] says whether that template has an
+    embedding for the model. Blocks keep insertion order (priority order when
+    built from the targets file), so ties resolve like the old sequential scan.
+
+    - 'cosine' models store L2-normalized rows, scoring is one mat-vec product.
+    - 'euclidean' models store raw rows plus cached squared norms, so distances
+      come from ||q||^2 + ||x||^2 - 2 q.x without materializing differences.
+
+    Template scores are reduced per identity with a segment max (best template)
+    or mean over the block starts (np.*.reduceat), so matching stays one pass
+    over the flat matrix however the templates are spread across identities.
+
+    precision selects the stored representation: float32, float16, or int8
+    codes with a per-row scale. int8 queries are quantized the same way and
+    scored as integer dot products of the codes (exact in float32 accumulation
+    for these dimensions, so BLAS does the work), then rescaled.
+    precision_report() measures what a compressed mode costs in accuracy.
+
+    Rows live in over-allocated buffers. Searches take a published view of the
+    first n rows; add() writes past that view and then publishes a longer one,
+    remove() tombstones the block (clears its present/alive flags). Neither copies
+    the matrix, so watchlist deltas apply without pausing matching. Tombstones
+    are compacted away once they make up a quarter of the rows.
+    """
+
+    REDUCTIONS = ('max', 'mean')
+
+    def __init__(self, precision: str = 'float32'):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown gallery precision '{precision}' (expected one of {PRECISIONS})")
+        self.precision = precision
+        self._dtype = np.dtype(precision)
+        self._lock = threading.Lock()
+        self.indexes: Dict[str, Any] = {}  # model_type -> ANN index over the same rows
+        self._load([], {m: np.zeros((0, 0), dtype=np.float32) for m in MODEL_METRICS},
+                   {m: np.zeros(0, dtype=bool) for m in MODEL_METRICS})
+
+    @classmethod
+    def from_targets(cls, targets: List[Dict[str, Any]], key_field: str = 'id',
+                     precision: str = 'float32') -> 'EmbeddingGallery':
+        """Build a gallery from records carrying an 'embeddings' dict (a vector or templates per model)."""
+        items = {}
+        for t in targets:
+            if t.get(key_field) is None or not t.get('embeddings'):
+                continue
+            items[t[key_field]] = {m: _templates(t['embeddings'].get(m)) for m in MODEL_METRICS}
+
+        gallery = cls(precision)
+        gallery._load(*cls._blocks(items))
+        return gallery
+
+    @classmethod
+    def from_store(cls, keys: list, store, precision: str = 'float32') -> 'EmbeddingGallery':
+        """Build a gallery for keys (in order) from an EmbeddingStore's memory-mapped matrices."""
+        found = {m: store.rows_for(list(keys), m) for m in MODEL_METRICS}
+        counts = {m: {} for m in MODEL_METRICS}
+        for m, (row_keys, _) in found.items():
+            for k in row_keys:
+                counts[m][k] = counts[m].get(k, 0) + 1
+
+        # Block layout: each key gets as many rows as its largest template set
+        starts, row_keys, n = {}, [], 0
+        for k in keys:
+            size = max(counts[m].get(k, 0) for m in MODEL_METRICS)
+            if size and k not in starts:
+                starts[k] = n
+                row_keys.extend([k] * size)
+                n += size
+
+        matrices, present = {}, {}
+        for m, (model_row_keys, matrix) in found.items():
+            full = np.zeros((n, matrix.shape[1]), dtype=np.float32)
+            mask = np.zeros(n, dtype=bool)
+            if model_row_keys:
+                if MODEL_METRICS[m] == 'cosine':
+                    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-8)
+                idx = np.empty(len(model_row_keys), dtype=np.int64)
+                prev, j = None, 0
+                for i, k in enumerate(model_row_keys):
+                    j = j + 1 if k == prev else 0
+                    idx[i] = starts[k] + j
+                    prev = k
+                full[idx] = matrix
+                mask[idx] = True
+            matrices[m], present[m] = full, mask
+
+        gallery = cls(precision)
+        gallery._load(row_keys, matrices, present)
+        return gallery
+
+    @classmethod
+    def _blocks(cls, items: Dict[Any, Dict[str, Optional[np.ndarray]]]):
+        """{key: {model: (k, dim) or None}} -> (row keys, matrices, present) with one block per key."""
+        row_keys = []
+        sizes = []
+        for key, templates in items.items():
+            size = max((len(t) for t in templates.values() if t is not None), default=0)
+            if size:
+                row_keys.extend([key] * size)
+                sizes.append((key, size))
+
+        matrices, present = {}, {}
+        n = len(row_keys)
+        for m in MODEL_METRICS:
+            dim = next((t.shape[1] for t in (items[k].get(m) for k, _ in sizes) if t is not None), 0)
+            matrix = np.zeros((n, dim), dtype=np.float32)
+            mask = np.zeros(n, dtype=bool)
+            row = 0
+            for key, size in sizes:
+                t = items[key].get(m)
+                if t is not None:
+                    matrix[row:row + len(t)] = cls._prepare(m, t)
+                    mask[row:row + len(t)] = True
+                row += size
+            matrices[m], present[m] = matrix, mask
+        return row_keys, matrices, present
+
+    @staticmethod
+    def _prepare(model_type: str, vectors) -> np.ndarray:
+        mat = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if MODEL_METRICS[model_type] == 'cosine':
+            mat = mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-8)
+        return mat
+
+    def _encode(self, mat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Prepared float32 rows -> (stored rows, per-row scales) in this gallery's precision."""
+        mat = np.asarray(mat, dtype=np.float32)
+        if self.precision == 'int8':
+            scales = np.abs(mat).max(axis=1) / 127.0 if mat.size else np.ones(len(mat), dtype=np.float32)
+            scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+            codes = np.clip(np.rint(mat / scales[:, None]), -127, 127).astype(np.int8)
+            return codes, scales
+        return mat.astype(self._dtype), np.ones(len(mat), dtype=np.float32)
+
+    @staticmethod
+    def _decode(rows: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        if rows.dtype == np.int8:
+            return rows.astype(np.float32) * scales[:, None]
+        return rows.astype(np.float32)
+
+    @classmethod
+    def _sq_norms_of(cls, rows: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        """Squared norms of the stored (decoded) rows, consistent with what scoring sees."""
+        if not rows.shape[1]:
+            return np.zeros(len(rows), dtype=np.float32)
+        decoded = cls._decode(rows, scales)
+        return np.einsum('ij,ij->i', decoded, decoded).astype(np.float32)
+
+    def _load(self, keys: list, matrices: Dict[str, np.ndarray], present: Dict[str, np.ndarray],
+              scales: Optional[Dict[str, np.ndarray]] = None, sq_norms: Optional[Dict[str, np.ndarray]] = None) -> None:
+        """
+        Replace all buffers with exactly-sized ones and publish them (keys: one per row, grouped).
+        matrices are prepared float32 rows, or already-encoded rows when scales/sq_norms are given.
+        """
+        n = len(keys)
+        self._keys = np.empty(n, dtype=object)
+        self._keys[:] = keys
+        self._alive = np.ones(n, dtype=bool)
+        if scales is None:
+            encoded = {m: self._encode(mat) for m, mat in matrices.items()}
+            matrices = {m: e[0] for m, e in encoded.items()}
+            scales = {m: e[1] for m, e in encoded.items()}
+            sq_norms = {m: self._sq_norms_of(matrices[m], scales[m]) for m in matrices}
+        self._matrices = {m: np.ascontiguousarray(mat) for m, mat in matrices.items()}
+        self._scales = dict(scales)
+        self._present = dict(present)
+        self._sq_norms = dict(sq_norms)
+        self._index = {}  # key -> (start, count); insertion order == block order
+        start = 0
+        for i in range(1, n + 1):
+            if i == n or keys[i] != keys[start]:
+                self._index[keys[start]] = (start, i - start)
+                start = i
+        self._n = n
+        self._dead = 0
+        self._publish()
+
+    def _publish(self) -> None:
+        n = self._n
+        ident_keys = np.empty(len(self._index), dtype=object)
+        ident_keys[:] = list(self._index)
+        starts = np.fromiter((start for start, _ in self._index.values()), dtype=np.int64, count=len(self._index))
+        self._rows = _GalleryRows(
+            self._keys[:n], self._alive[:n],
+            {m: mat[:n] for m, mat in self._matrices.items()},
+            {m: mask[:n] for m, mask in self._present.items()},
+            {m: sq[:n] for m, sq in self._sq_norms.items()},
+            {m: sc[:n] for m, sc in self._scales.items()},
+            ident_keys, starts,
+        )
+
+    def _reserve(self, count: int, dims: Dict[str, int]) -> None:
+        """Make room for count more rows (doubling), widening a model that had no vectors yet."""
+        capacity = len(self._keys)
+        grow = self._n + count > capacity
+        new_cap = max(16, capacity * 2, self._n + count) if grow else capacity
+        if grow:
+            keys = np.empty(new_cap, dtype=object)
+            keys[:self._n] = self._keys[:self._n]
+            alive = np.zeros(new_cap, dtype=bool)
+            alive[:self._n] = self._alive[:self._n]
+            self._keys, self._alive = keys, alive
+        for m in MODEL_METRICS:
+            mat = self._matrices[m]
+            dim = mat.shape[1] or dims.get(m, 0)
+            if grow or dim != mat.shape[1]:
+                new_mat = np.zeros((new_cap, dim), dtype=self._dtype)
+                if mat.shape[1] == dim:
+                    new_mat[:self._n] = mat[:self._n]
+                present = np.zeros(new_cap, dtype=bool)
+                present[:self._n] = self._present[m][:self._n]
+                sq = np.zeros(new_cap, dtype=np.float32)
+                sq[:self._n] = self._sq_norms[m][:self._n]
+                scales = np.ones(new_cap, dtype=np.float32)
+                scales[:self._n] = self._scales[m][:self._n]
+                self._matrices[m], self._present[m], self._sq_norms[m] = new_mat, present, sq
+                self._scales[m] = scales
+
+    def _tombstone(self, start: int, count: int) -> None:
+        self._alive[start:start + count] = False
+        for m in MODEL_METRICS:
+            self._present[m][start:start + count] = False
+        self._dead += count
+
+    def _maybe_compact(self) -> None:
+        if self._dead < max(64, self._n // 4):
+            return
+        live = np.flatnonzero(self._alive[:self._n])
+        self._load(self._keys[live].tolist(),
+                   {m: mat[live] for m, mat in self._matrices.items()},
+                   {m: mask[live] for m, mask in self._present.items()},
+                   scales={m: sc[live] for m, sc in self._scales.items()},
+                   sq_norms={m: sq[live] for m, sq in self._sq_norms.items()})
+
+    def add(self, key, embeddings: Dict[str, Any]) -> None:
+        """
+        Insert or replace the block for key. Each model entry may be one vector or
+        a list of templates; a replaced block is tombstoned and re-appended.
+        """
+        blocks = {m: self._prepare(m, t) for m in MODEL_METRICS
+                  for t in [_templates(embeddings.get(m))] if t is not None}
+        size = max((len(t) for t in blocks.values()), default=0)
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._tombstone(*old)
+            if size:
+                self._reserve(size, {m: t.shape[1] for m, t in blocks.items()})
+                start = self._n
+                self._keys[start:start + size] = [key] * size
+                self._alive[start:start + size] = True
+                for m in MODEL_METRICS:
+                    t = blocks.get(m)
+                    self._present[m][start:start + size] = False
+                    if t is not None:
+                        codes, scales = self._encode(t)
+                        self._matrices[m][start:start + len(t)] = codes
+                        self._scales[m][start:start + len(t)] = scales
+                        self._sq_norms[m][start:start + len(t)] = self._sq_norms_of(codes, scales)
+                        self._present[m][start:start + len(t)] = True
+                self._index[key] = (start, size)
+                self._n += size
+            self._publish()
+            self.indexes = {}
+            self._maybe_compact()
+
+    def remove(self, key) -> bool:
+        """Drop the block for key. Returns False if it was not in the gallery."""
+        with self._lock:
+            block = self._index.pop(key, None)
+            if block is None:
+                return False
+            self._tombstone(*block)
+            self._publish()
+            self.indexes = {}
+            self._maybe_compact()
+            return True
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def keys(self) -> list:
+        """Live keys in block order."""
+        return self._rows.ident_keys.tolist()
+
+    def templates(self, key) -> Dict[str, Optional[np.ndarray]]:
+        """Stored (prepared) templates of one identity, {model_type: (k, dim) or None}."""
+        block = self._index.get(key)
+        result = {m: None for m in MODEL_METRICS}
+        if block is None:
+            return result
+        start, count = block
+        for m in MODEL_METRICS:
+            mask = self._present[m][start:start + count]
+            if mask.any():
+                rows = slice(start, start + count)
+                result[m] = self._decode(self._matrices[m][rows][mask], self._scales[m][rows][mask])
+        return result
+
+    def template_count(self, key) -> int:
+        block = self._index.get(key)
+        return block[1] if block is not None else 0
+
+    def size(self, model_type: str) -> int:
+        """Number of template rows with an embedding for model_type."""
+        return int(self._rows.present[model_type].sum())
+
+    def model_keys(self, model_type: str) -> list:
+        """Owner key of every row that has an embedding for model_type (repeats per template)."""
+        rows = self._rows
+        return rows.keys[rows.present[model_type]].tolist()
+
+    def attach_index(self, model_type: str, index) -> None:
+        """
+        Route max-reduced searches for model_type through an ANN index built over
+        the same template rows. Any add/remove drops attached indexes (back to
+        exact search until rebuilt).
+        """
+        self.indexes[model_type] = index
+
+    def quantized(self, precision: str) -> 'EmbeddingGallery':
+        """Copy of the live rows in another precision (same keys, blocks and order)."""
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._n])
+            matrices = {m: self._decode(mat[live], self._scales[m][live]) for m, mat in self._matrices.items()}
+            present = {m: mask[live] for m, mask in self._present.items()}
+            keys = self._keys[live].tolist()
+        gallery = EmbeddingGallery(precision)
+        gallery._load(keys, matrices, present)
+        return gallery
+
+    def nbytes(self) -> int:
+        """Memory held by the embedding matrices (and int8 scales) of the live rows."""
+        rows = self._rows
+        total = sum(mat.nbytes for mat in rows.matrices.values())
+        if self.precision == 'int8':
+            total += sum(sc.nbytes for sc in rows.scales.values())
+        return total
+
+    def scores(self, embedding, model_type: str, rows: Optional[_GalleryRows] = None) -> np.ndarray:
+        """
+        Score a query against every row of a model's matrix.
+        Returns cosine similarities or euclidean distances depending on the metric.
+        Rows without an embedding for this model are not masked here - see present.
+        """
+        rows = rows or self._rows
+        matrix = rows.matrices[model_type]
+        if not matrix.size:
+            return np.empty(0, dtype=np.float32)
+
+        query = np.asarray(embedding, dtype=np.float32).ravel()
+        if matrix.dtype == np.float32:
+            dots = matrix @ query
+        else:
+            dots = self._compressed_dots(matrix, rows.scales[model_type], query[:, None])[:, 0]
+        if MODEL_METRICS[model_type] == 'cosine':
+            return dots / (np.linalg.norm(query) + 1e-8)
+
+        sq_dist = rows.sq_norms[model_type] - 2.0 * dots + np.dot(query, query)
+        return np.sqrt(np.maximum(sq_dist, 0.0))
+
+    def scores_batch(self, embeddings, model_type: str, rows: Optional[_GalleryRows] = None) -> np.ndarray:
+        """scores() for a (B, dim) batch of queries as one matrix-matrix product; returns (rows, B)."""
+        rows = rows or self._rows
+        matrix = rows.matrices[model_type]
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if not matrix.size:
+            return np.empty((0, len(queries)), dtype=np.float32)
+
+        if matrix.dtype == np.float32:
+            dots = matrix @ queries.T
+        else:
+            dots = self._compressed_dots(matrix, rows.scales[model_type], queries.T)
+        if MODEL_METRICS[model_type] == 'cosine':
+            return dots / (np.linalg.norm(queries, axis=1) + 1e-8)
+
+        sq_q = np.einsum('ij,ij->i', queries, queries)
+        sq_dist = rows.sq_norms[model_type][:, None] - 2.0 * dots + sq_q
+        return np.sqrt(np.maximum(sq_dist, 0.0))
+
+    @staticmethod
+    def _compressed_dots(matrix: np.ndarray, scales: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Dot products of float16 / int8 rows with (dim, B) queries, SCORE_CHUNK rows at
+        a time so the float32 working copy stays cache-sized. For int8 each query is
+        quantized too and the code products are summed exactly (|sum| <= dim * 127^2 < 2^24).
+        """
+        out = np.empty((len(matrix), queries.shape[1]), dtype=np.float32)
+        if matrix.dtype == np.int8:
+            q_scale = np.maximum(np.abs(queries).max(axis=0), 1e-12) / 127.0
+            q_codes = np.rint(queries / q_scale).astype(np.float32)
+            for a in range(0, len(matrix), SCORE_CHUNK):
+                block = matrix[a:a + SCORE_CHUNK]
+                out[a:a + len(block)] = ((block.astype(np.float32) @ q_codes)
+                                         * scales[a:a + len(block), None] * q_scale)
+        else:
+            for a in range(0, len(matrix), SCORE_CHUNK):
+                block = matrix[a:a + SCORE_CHUNK]
+                out[a:a + len(block)] = block.astype(np.float32) @ queries
+        return out
+
+    @staticmethod
+    def reduce_scores(scores: np.ndarray, mask: np.ndarray, starts: np.ndarray, metric: str,
+                      reduce: str = 'max') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Segment-reduce per-row scores ((rows,) or (rows, B)) to one score per identity
+        block. 'max' keeps the best template (highest similarity / lowest distance),
+        'mean' averages the identity's templates. Returns (scores, has_template);
+        identities without a template for the model get -inf/inf.
+        """
+        worst = -np.inf if metric == 'cosine' else np.inf
+        if not len(starts) or not len(scores):
+            shape = (len(starts),) + scores.shape[1:]
+            return np.full(shape, worst, dtype=np.float32), np.zeros(len(starts), dtype=bool)
+        counts = np.add.reduceat(mask.astype(np.int32), starts)
+        has = counts > 0
+        if scores.ndim == 2:
+            mask, counts, has_b = mask[:, None], counts[:, None], has[:, None]
+        else:
+            has_b = has
+        if reduce == 'mean':
+            sums = np.add.reduceat(np.where(mask, scores, 0.0), starts, axis=0)
+            return np.where(has_b, sums / np.maximum(counts, 1), worst), has
+        best = np.maximum if metric == 'cosine' else np.minimum
+        return best.reduceat(np.where(mask, scores, worst), starts, axis=0), has
+
+    def identity_scores(self, embedding, model_type: str, reduce: str = 'max',
+                        rows: Optional[_GalleryRows] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """One score per live identity: (ident_keys, scores, has_template), in block order."""
+        rows = rows or self._rows
+        scores = self.scores(embedding, model_type, rows)
+        reduced, has = self.reduce_scores(scores, rows.present[model_type], rows.starts,
+                                          MODEL_METRICS[model_type], reduce)
+        return rows.ident_keys, reduced, has
+
+    def search_batch(self, embeddings, model_type: str, reduce: str = 'max') -> List[Optional[Tuple[Any, float]]]:
+        """
+        search() for a (B, dim) batch: one matrix-matrix product against the gallery
+        and one segment reduction, then the best identity per query.
+        """
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if model_type not in MODEL_METRICS:
+            return [None] * len(queries)
+        if self.indexes.get(model_type) is not None and reduce == 'max':
+            return [self.search(q, model_type, reduce) for q in queries]
+
+        rows = self._rows
+        scores = self.scores_batch(queries, model_type, rows)
+        reduced, has = self.reduce_scores(scores, rows.present[model_type], rows.starts,
+                                          MODEL_METRICS[model_type], reduce)
+        if not has.any():
+            return [None] * len(queries)
+        if MODEL_METRICS[model_type] == 'cosine':
+            best = np.argmax(reduced, axis=0)
+        else:
+            best = np.argmin(reduced, axis=0)
+        return [(rows.ident_keys[i], float(reduced[i, b])) for b, i in enumerate(best)]
+
+    def search(self, embedding, model_type: str, reduce: str = 'max') -> Optional[Tuple[Any, float]]:
+        """
+        Best identity for a query: highest similarity (cosine) or lowest distance
+        (euclidean) after reducing its templates. Returns (key, score) or None if
+        no identity has an embedding for this model.
+        """
+        if model_type not in MODEL_METRICS:
+            return None
+        index = self.indexes.get(model_type)
+        if index is not None and reduce == 'max':
+            keys, scores = index.search(embedding, 1)
+            return (str(keys[0]), float(scores[0])) if len(keys) else None
+
+        keys, scores, has = self.identity_scores(embedding, model_type, reduce)
+        if not has.any():
+            return None
+        if MODEL_METRICS[model_type] == 'cosine':
+            idx = int(np.argmax(scores))
+        else:
+            idx = int(np.argmin(scores))
+        return keys[idx], float(scores[idx])
+
+
+class TieredGallery:
+    """
+    Watchlist gallery split into one EmbeddingGallery shard per priority level,
+    searched tier by tier (default: priorities 1-2, then 3, then 4-5).
+
+    A query whose best hit so far is confident - past the match threshold by
+    margin - is resolved and skips the remaining (lower-priority) tiers, so
+    wanted/critical targets are found after scoring only their own rows. Other
+    queries go on to the next tier with the best hit carried along; on equal
+    scores the higher-priority identity wins.
+
+    Mirrors the EmbeddingGallery surface the engine uses (add/remove/search_batch/
+    search/keys/model_keys/attach_index/nbytes). An attached ANN index covers all
+    tiers and replaces the tiered scan for max-reduced searches.
+    """
+
+    DEFAULT_TIERS = [[1, 2], [3], [4, 5]]
+
+    def __init__(self, shards: Dict[int, EmbeddingGallery], tiers: Optional[List[List[int]]] = None,
+                 thresholds: Optional[Dict[str, float]] = None, margin: float = 0.1):
+        self.shards = dict(shards)  # priority -> EmbeddingGallery
+        self.tiers = [list(t) for t in (tiers or self.DEFAULT_TIERS)]
+        listed = {p for tier in self.tiers for p in tier}
+        extra = sorted(p for p in self.shards if p not in listed)
+        if extra:
+            self.tiers.append(extra)  # priorities outside the configured tiers go last
+        self.thresholds = thresholds or {}
+        self.margin = margin
+        self.indexes: Dict[str, Any] = {}
+        self.precision = next(iter(self.shards.values())).precision if self.shards else 'float32'
+        self._priority: Dict[Any, int] = {key: p for p, shard in self.shards.items() for key in shard.keys()}
+        self._lock = threading.Lock()
+        self.stats = {'queries': 0, 'early_exits': 0, 'rows_scored': 0, 'rows_total': 0}
+
+    def priority_of(self, key) -> Optional[int]:
+        return self._priority.get(key)
+
+    def add(self, key, embeddings: Dict[str, Any], priority: int = 3) -> None:
+        """Insert or replace key in its priority shard (moving it if the priority changed)."""
+        with self._lock:
+            old = self._priority.get(key)
+            if old is not None and old != priority:
+                self.shards[old].remove(key)
+            if priority not in self.shards:
+                self.shards[priority] = EmbeddingGallery(self.precision)
+                if not any(priority in tier for tier in self.tiers):
+                    self.tiers.append([priority])
+            self.shards[priority].add(key, embeddings)
+            self._priority[key] = priority
+            self.indexes = {}
+
+    def remove(self, key) -> bool:
+        with self._lock:
+            priority = self._priority.pop(key, None)
+            if priority is None:
+                return False
+            self.shards[priority].remove(key)
+            self.indexes = {}
+            return True
+
+    def __len__(self) -> int:
+        return len(self._priority)
+
+    def __contains__(self, key) -> bool:
+        return key in self._priority
+
+    def keys(self) -> list:
+        return [key for tier in self.tiers for p in tier if p in self.shards for key in self.shards[p].keys()]
+
+    def model_keys(self, model_type: str) -> list:
+        return [key for shard in self.shards.values() for key in shard.model_keys(model_type)]
+
+    def attach_index(self, model_type: str, index) -> None:
+        self.indexes[model_type] = index
+
+    def nbytes(self) -> int:
+        return sum(shard.nbytes() for shard in self.shards.values())
+
+    def _confident(self, model_type: str, score: float) -> bool:
+        threshold = self.thresholds.get(model_type)
+        if threshold is None:
+            return False
+        if MODEL_METRICS[model_type] == 'cosine':
+            return score >= threshold + self.margin
+        return score <= threshold - self.margin
+
+    def search(self, embedding, model_type: str, reduce: str = 'max') -> Optional[Tuple[Any, float]]:
+        return self.search_batch(np.asarray(embedding, dtype=np.float32).ravel()[None, :], model_type, reduce)[0]
+
+    def search_batch(self, embeddings, model_type: str, reduce: str = 'max') -> List[Optional[Tuple[Any, float]]]:
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        index = self.indexes.get(model_type)
+        if index is not None and reduce == 'max':
+            results = []
+            for q in queries:
+                keys, scores = index.search(q, 1)
+                results.append((str(keys[0]), float(scores[0])) if len(keys) else None)
+            return results
+
+        higher_is_better = MODEL_METRICS.get(model_type) == 'cosine'
+        best: List[Optional[Tuple[Any, float]]] = [None] * len(queries)
+        pending = np.arange(len(queries))
+        rows_scored, early_exits = 0, 0
+        for t, tier in enumerate(self.tiers):
+            for priority in tier:
+                shard = self.shards.get(priority)
+                if shard is None or not len(shard):
+                    continue
+                rows_scored += shard.size(model_type) * len(pending)
+                for j, hit in zip(pending, shard.search_batch(queries[pending], model_type, reduce)):
+                    current = best[j]
+                    if hit is not None and (current is None or
+                                            (hit[1] > current[1] if higher_is_better else hit[1] < current[1])):
+                        best[j] = hit
+            resolved = np.array([best[j] is not None and self._confident(model_type, best[j][1]) for j in pending],
+                                dtype=bool)
+            pending = pending[~resolved]
+            if t < len(self.tiers) - 1:
+                early_exits += int(resolved.sum())
+            if not len(pending):
+                break
+
+        self.stats['queries'] += len(queries)
+        self.stats['early_exits'] += early_exits
+        self.stats['rows_scored'] += rows_scored
+        self.stats['rows_total'] += sum(shard.size(model_type) for shard in self.shards.values()) * len(queries)
+        return best
+
+
+def precision_report(reference: EmbeddingGallery, candidate: EmbeddingGallery,
+                     thresholds: Dict[str, float], n_queries: int = 200,
+                     noise: float = 0.05, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare a compressed gallery against its float32 reference on probe faces
+    sampled from the gallery itself (perturbed template rows).
+
+    Per model type:
+    - top1_agreement: best identity is the same
+    - decision_agreement: match/no-match at thresholds[model] is the same
+    - max_score_drift / mean_score_drift: top-1 score difference
+    - memory_ratio: candidate matrix bytes / reference matrix bytes
+    """
+    rng = np.random.default_rng(seed)
+    report = {}
+    for model_type, metric in MODEL_METRICS.items():
+        rows = reference._rows
+        present = np.flatnonzero(rows.present[model_type])
+        if not len(present):
+            continue
+        picks = rng.choice(present, min(n_queries, len(present)), replace=False)
+        base = reference._decode(rows.matrices[model_type][picks], rows.scales[model_type][picks])
+        scale = np.linalg.norm(base, axis=1, keepdims=True) / np.sqrt(base.shape[1])
+        queries = base + rng.normal(0.0, noise, base.shape).astype(np.float32) * scale
+
+        threshold = thresholds.get(model_type)
+        top1, agree, drifts = 0, 0, []
+        for q in queries:
+            ref = reference.search(q, model_type)
+            cand = candidate.search(q, model_type)
+            if ref is None or cand is None:
+                continue
+            top1 += int(ref[0] == cand[0])
+            drifts.append(abs(ref[1] - cand[1]))
+            if threshold is not None:
+                if metric == 'cosine':
+                    agree += int((ref[1] > threshold) == (cand[1] > threshold))
+                else:
+                    agree += int((ref[1] < threshold) == (cand[1] < threshold))
+
+        n = max(1, len(drifts))
+        report[model_type] = {
+            'precision': candidate.precision,
+            'queries': len(drifts),
+            'top1_agreement': round(top1 / n, 4),
+            'max_score_drift': round(float(max(drifts, default=0.0)), 6),
+            'mean_score_drift': round(float(np.mean(drifts)) if drifts else 0.0, 6),
+            'memory_ratio': round(candidate.nbytes() / max(1, reference.nbytes()), 3),
+        }
+        if threshold is not None:
+            report[model_type]['threshold'] = threshold
+            report[model_type]['decision_agreement'] = round(agree / n, 4)
+    return report
+
+
+def compress_gallery(gallery: EmbeddingGallery, precision: str, thresholds: Dict[str, float],
+                     min_agreement: float = 0.99, n_queries: int = 200) -> Tuple[EmbeddingGallery, Dict[str, Any]]:
+    """
+    Switch a float32 gallery to a compressed precision, guarded by precision_report():
+    if any model's top-1 or threshold-decision agreement falls below min_agreement
+    the float32 gallery is kept. Returns (gallery to use, report).
+    """
+    if precision == gallery.precision:
+        return gallery, {}
+    candidate = gallery.quantized(precision)
+    report = precision_report(gallery, candidate, thresholds, n_queries)
+    worst = min((min(r['top1_agreement'], r.get('decision_agreement', 1.0)) for r in report.values()), default=1.0)
+    if worst < min_agreement:
+        logger.warning(f"{precision} gallery rejected (agreement {worst} < {min_agreement}), staying on "
+                       f"{gallery.precision}: {report}")
+        return gallery, report
+    logger.info(f"Using {precision} gallery ({candidate.nbytes()} bytes vs {gallery.nbytes()}): {report}")
+    return candidate, report
+
+
+class PersonGallery:
+    """
+    Process-wide in-memory gallery of enrolled persons, sharded by db_type.
+
+    Person JSON files are read once (lazily, on first search); after that the
+    add/update/delete routes keep it in sync through upsert()/remove(), so
+    searches never touch the filesystem. Records hold metadata only; vectors
+    come from the EmbeddingStore (or from legacy inline 'embeddings').
+    """
+
+    def __init__(self, folders: Dict[str, str], store=None, precision: str = 'float32',
+                 thresholds: Optional[Dict[str, float]] = None):
+        self.folders = folders  # {db_type: folder}
+        self.store = store
+        self.precision = precision
+        self.thresholds = thresholds or {}  # similarity/distance cut-offs for the precision check
+        self.precision_reports: Dict[str, Dict[str, Any]] = {}
+        self.shards: Dict[str, EmbeddingGallery] = {db_type: EmbeddingGallery() for db_type in folders}
+        self.records: Dict[str, Dict[str, Dict[str, Any]]] = {db_type: {} for db_type in folders}
+        self._priority_cache: Dict[str, Tuple[_GalleryRows, np.ndarray]] = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def load(self) -> None:
+        """(Re)build every shard from the person JSON files on disk."""
+        with self._lock:
+            for db_type, folder in self.folders.items():
+                records = {}
+                if os.path.exists(folder):
+                    for filename in os.listdir(folder):
+                        if not filename.endswith('.json'):
+                            continue
+                        try:
+                            with open(os.path.join(folder, filename), 'r') as f:
+                                person = json.load(f)
+                            person['db_type'] = db_type
+                            records[person['id']] = person
+                        except Exception as e:
+                            logger.error(f"Error loading {filename}: {e}")
+
+                if self.store is not None:
+                    shard = EmbeddingGallery.from_store(list(records), self.store)
+                    for person in records.values():
+                        if person.get('embeddings'):
+                            shard.add(person['id'], person['embeddings'])
+                else:
+                    shard = EmbeddingGallery.from_targets(list(records.values()))
+                shard, self.precision_reports[db_type] = compress_gallery(shard, self.precision, self.thresholds)
+                for person in records.values():
+                    person.pop('embeddings', None)
+                self.records[db_type] = records
+                self.shards[db_type] = shard
+            self._loaded = True
+            logger.info("Person gallery loaded: " + ", ".join(
+                f"{db_type}={len(self.records[db_type])}" for db_type in self.folders))
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def upsert(self, person: Dict[str, Any], db_type: str) -> None:
+        """Add a newly enrolled person or refresh an updated one."""
+        self.ensure_loaded()
+        with self._lock:
+            for other in self.folders:
+                if other != db_type:
+                    self._remove_from(other, person['id'])
+            record = {k: v for k, v in person.items() if k != 'embeddings'}
+            record['db_type'] = db_type
+            self.records[db_type][person['id']] = record
+            self._priority_cache.pop(db_type, None)
+
+            shard = self.shards[db_type]
+            if person.get('embeddings'):
+                shard.add(person['id'], person['embeddings'])
+            elif person['id'] not in shard and self.store is not None:
+                # Metadata-only update of a record this shard has not seen yet
+                shard.add(person['id'], self.store.get(person['id']))
+
+    def add_template(self, person_id: str, embeddings: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Add one more template (merged duplicate, officer capture, confirmed alert
+        frame) to an enrolled person. Returns template counts per model.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            if self.store is not None:
+                counts = self.store.add_template(person_id, embeddings)
+                templates = self.store.get_templates(person_id)
+            else:
+                counts, templates = {}, {}
+            for db_type, records in self.records.items():
+                if person_id not in records:
+                    continue
+                shard = self.shards[db_type]
+                if self.store is None:
+                    templates = shard.templates(person_id)
+                    for m in MODEL_METRICS:
+                        new = _templates(embeddings.get(m))
+                        if new is not None:
+                            templates[m] = new if templates[m] is None else np.vstack([templates[m], new])
+                    counts = {m: len(t) if t is not None else 0 for m, t in templates.items()}
+                shard.add(person_id, templates)
+            return counts
+
+    def remove(self, person_id: str) -> None:
+        self.ensure_loaded()
+        with self._lock:
+            for db_type in self.folders:
+                self._remove_from(db_type, person_id)
+
+    def _remove_from(self, db_type: str, person_id: str) -> None:
+        self.records[db_type].pop(person_id, None)
+        self.shards[db_type].remove(person_id)
+
+    def _shards_for(self, db_type: str) -> List[str]:
+        if db_type in self.shards:
+            return [db_type]
+        return list(self.shards)  # 'all' / 'both'
+
+    def find_best_match(self, new_embeddings: Dict[str, Any], db_type: str = 'all',
+                        dlib_threshold: float = 0.45, arcface_threshold: float = 0.4) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Vectorized equivalent of the per-file scan: a person is compared on dlib
+        when both sides have a dlib descriptor, otherwise on ArcFace cosine distance.
+        Returns (person, distance) or (None, inf).
+        """
+        self.ensure_loaded()
+        with self._lock:
+            return self._find_best_match(new_embeddings, db_type, dlib_threshold, arcface_threshold)
+
+    def _find_best_match(self, new_embeddings, db_type, dlib_threshold, arcface_threshold):
+        best_match, min_distance = None, float('inf')
+        query_dlib, query_arcface = self._queries(new_embeddings)
+
+        for shard_type in self._shards_for(db_type):
+            rows = self.shards[shard_type]._rows
+            if not len(rows.ident_keys):
+                continue
+            distances, is_match, _ = self._identity_distances(shard_type, rows, query_dlib, query_arcface,
+                                                              dlib_threshold, arcface_threshold)
+            distances = np.where(is_match, distances, np.inf)
+            idx = int(np.argmin(distances))
+            if distances[idx] < min_distance:
+                min_distance = float(distances[idx])
+                best_match = dict(self.records[shard_type][rows.ident_keys[idx]])
+
+        return best_match, min_distance
+
+    def search_top_k(self, new_embeddings: Dict[str, Any], k: int = 10, db_type: str = 'all',
+                     priorities: Optional[List[int]] = None, dlib_threshold: float = 0.45,
+                     arcface_threshold: float = 0.4) -> List[Dict[str, Any]]:
+        """
+        Ranked candidate list: the k closest identities (same dlib-first distance as
+        find_best_match), restricted to the db_type shard(s) and optionally to the
+        given priority levels. Each candidate is the person record plus 'distance',
+        'metric' and 'is_match' (within the find_best_match threshold).
+        """
+        self.ensure_loaded()
+        k = max(1, int(k))
+        query_dlib, query_arcface = self._queries(new_embeddings)
+        candidates = []
+        with self._lock:
+            for shard_type in self._shards_for(db_type):
+                rows = self.shards[shard_type]._rows
+                if not len(rows.ident_keys):
+                    continue
+                distances, is_match, by_dlib = self._identity_distances(shard_type, rows, query_dlib, query_arcface,
+                                                                        dlib_threshold, arcface_threshold)
+                if priorities:
+                    distances = np.where(np.isin(self._priorities(shard_type, rows), priorities), distances, np.inf)
+
+                # Partial sort: only the k best of this shard get ordered
+                valid = int(np.isfinite(distances).sum())
+                top = min(k, valid)
+                if not top:
+                    continue
+                idx = np.argpartition(distances, top - 1)[:top] if top < len(distances) else np.arange(len(distances))
+                idx = idx[np.isfinite(distances[idx])]
+                for i in idx:
+                    record = dict(self.records[shard_type][rows.ident_keys[i]])
+                    record['distance'] = float(distances[i])
+                    record['metric'] = 'dlib' if by_dlib[i] else 'arcface'
+                    record['is_match'] = bool(is_match[i])
+                    candidates.append(record)
+
+        candidates.sort(key=lambda c: c['distance'])
+        return candidates[:k]
+
+    @staticmethod
+    def _queries(new_embeddings: Dict[str, Any]):
+        query_dlib = new_embeddings.get('dlib') if _has_vector(new_embeddings.get('dlib')) else None
+        query_arcface = new_embeddings.get('arcface') if _has_vector(new_embeddings.get('arcface')) else None
+        return query_dlib, query_arcface
+
+    def _identity_distances(self, shard_type, rows, query_dlib, query_arcface, dlib_threshold, arcface_threshold):
+        """
+        Per identity (rows.ident_keys order): best template distance, dlib first when
+        both sides have one, else ArcFace cosine distance. Returns (distances,
+        is_match, compared_on_dlib); identities with nothing to compare get inf.
+        """
+        shard = self.shards[shard_type]
+        n = len(rows.ident_keys)
+        distances = np.full(n, np.inf, dtype=np.float32)
+        is_match = np.zeros(n, dtype=bool)
+        dlib_mask = np.zeros(n, dtype=bool)
+        if query_dlib is not None:
+            _, dist, dlib_mask = shard.identity_scores(query_dlib, 'dlib', rows=rows)
+            distances = np.where(dlib_mask, dist, distances)
+            is_match |= dlib_mask & (dist < dlib_threshold)
+        if query_arcface is not None:
+            _, sim, has_arcface = shard.identity_scores(query_arcface, 'arcface', rows=rows)
+            arc_mask = has_arcface & ~dlib_mask
+            if arc_mask.any():
+                dist = 1.0 - sim
+                distances = np.where(arc_mask, dist, distances)
+                is_match |= arc_mask & (dist < arcface_threshold)
+        return distances, is_match, dlib_mask
+
+    def _priorities(self, shard_type: str, rows: _GalleryRows) -> np.ndarray:
+        """Priority per identity of a shard view, cached until the rows or records change."""
+        cached = self._priority_cache.get(shard_type)
+        if cached is not None and cached[0] is rows:
+            return cached[1]
+        records = self.records[shard_type]
+        priorities = np.fromiter((self._priority_of(records.get(key, {})) for key in rows.ident_keys),
+                                 dtype=np.int64, count=len(rows.ident_keys))
+        self._priority_cache[shard_type] = (rows, priorities)
+        return priorities
+
+    @staticmethod
+    def _priority_of(record: Dict[str, Any]) -> int:
+        try:
+            return int(record.get('priority', 3))
+        except (TypeError, ValueError):
+            return 3
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 
 class IPlugin(ABC):
@@ -24,6 +24,13 @@ class IVideoSource(IPlugin):
         """
         pass
 
+    def get_frame_into(self, out: np.ndarray) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Read a frame into a caller-owned buffer (pooled capture) when the source can.
+        Returns: (success, frame) - frame is `out` itself when it was filled in place.
+        """
+        return self.get_frame()
+
 class IFaceModel(IPlugin):
     """Interface for face detection and recognition models."""
     @abstractmethod
@@ -40,3 +47,23 @@ class IFaceModel(IPlugin):
         Generate a vector embedding for a face crop.
         """
         pass
+
+    def align_face(self, frame: np.ndarray, face: Any, track_id: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Aligned face chip for one face returned by detect_faces (landmark-based),
+        or None if the model does not align (callers then embed the raw crop).
+        track_id lets a model reuse per-track work (e.g. landmarks) across frames.
+        """
+        return None
+
+    def embed_aligned(self, chip: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Recognition only: embedding of a chip produced by align_face.
+        """
+        return self.generate_embedding(chip)
+
+    def embed_aligned_batch(self, chips: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """
+        Recognition only, many chips in one call (one inference batch where the model supports it).
+        """
+        return [self.embed_aligned(chip) for chip in chips]
@@ -4,6 +4,9 @@ import os
 import sys
 from typing import Dict, Any, Type
 from .interfaces import IPlugin, IFaceModel, IVideoSource
+from .capture import ThreadedCapture, RING_SIZE
+from .frame_pool import POOL_SIZE
+from .frame_hub import FrameHub
 
 # Ensure the root directory is in path to load plugins
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -18,9 +21,18 @@ class PluginManager:
             cls._instance = super(PluginManager, cls).__new__(cls)
             cls._instance.plugins = {}
             cls._instance.active_model = None
-            cls._instance.active_camera = None
+            cls._instance.frame_hub = FrameHub()
         return cls._instance
 
+    @property
+    def active_camera(self) -> IVideoSource:
+        """The default camera of the frame hub (consumers should subscribe via frame_hub)"""
+        return self.frame_hub.camera()
+
+    @active_camera.setter
+    def active_camera(self, source: IVideoSource) -> None:
+        self.frame_hub.set_camera(source)
+
     def load_plugin(self, module_path: str, class_name: str) -> Type[IPlugin]:
         """Dynamically load a plugin class."""
         try:
@@ -60,6 +72,12 @@ class PluginManager:
 
         cls = self.load_plugin(plugin_def['module'], plugin_def['class'])
         instance = cls()
+        # Grab on a dedicated thread so consumers always get the freshest frame
+        capture_cfg = config.get('capture', {})
+        self.frame_hub.policies = capture_cfg.get('subscribers', {})
+        if capture_cfg.get('threaded', True):
+            instance = ThreadedCapture(instance, capture_cfg.get('ring_size', RING_SIZE), name=cam_cfg,
+                                       pool_size=capture_cfg.get('pool_size', POOL_SIZE))
         instance.initialize(plugin_def.get('params', {}))
         self.active_camera = instance
         logger.info(f"Initialized Camera: {cam_cfg}")
@@ -0,0 +1,182 @@
+import os
+import copy
+import time
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("SuperResolution")
+
+SR_MODEL_PATH = 'models/ESPCN_x2.pb'
+SR_SCALE = 2
+SR_MIN_FACE = 64        # faces whose shorter side is below this (px) are upscaled
+SR_PAD = 0.5            # context around the face upscaled with it (fraction of the box per side), for alignment
+SR_CACHE_TTL = 5.0      # seconds a settled track whose box has not moved keeps its result (no re-upscale)
+SR_CACHE_SIZE = 256     # tracks remembered
+SR_SAME_BOX_IOU = 0.9   # IoU with the last upscaled box at which a face counts as unchanged
+SR_COMPARE_EVERY = 10   # every Nth upscaled face is also matched without SR (0 = off)
+
+# opencv-contrib ships the dnn_superres wrapper; plain OpenCV runs the same graph through cv2.dnn
+dnn_superres = getattr(cv2, 'dnn_superres', None)
+
+
+def scale_face(face_obj: Any, x0: int, y0: int, scale: float) -> Any:
+    """
+    Detector face object moved into an upscaled region's coordinates
+    (region origin x0, y0 in the frame). Handles bbox/kps objects (ArcFace,
+    SCRFD, worker DetectedFace) and dlib-style rectangles; None otherwise.
+    """
+    if face_obj is None:
+        return None
+    if hasattr(face_obj, 'left') and callable(face_obj.left):
+        return type(face_obj)(int((face_obj.left() - x0) * scale), int((face_obj.top() - y0) * scale),
+                              int((face_obj.right() - x0) * scale), int((face_obj.bottom() - y0) * scale))
+    bbox = getattr(face_obj, 'bbox', None)
+    if bbox is None:
+        return None
+    scaled = copy.copy(face_obj)
+    scaled.bbox = (np.asarray(bbox, dtype=np.float32) - np.array([x0, y0, x0, y0], dtype=np.float32)) * scale
+    kps = getattr(face_obj, 'kps', None)
+    if kps is not None:
+        scaled.kps = (np.asarray(kps, dtype=np.float32) - np.array([x0, y0], dtype=np.float32)) * scale
+    return scaled
+
+
+class FaceUpscaler:
+    """
+    ESPCN x2 super-resolution for far-field faces, ahead of recognition.
+
+    Only faces whose shorter side is under min_face are touched: a padded
+    region around the face is upscaled (ESPCN on the luma channel, chroma
+    bicubic - what dnn_superres does) and the detector's face object is
+    mapped into it, so the model aligns/embeds the sharper pixels. Every
+    upscale works on the current frame, so each re-check is a new sample.
+    The last upscaled box of each track is remembered for cache_ttl
+    seconds: while it has not moved (unchanged()), the engine keeps a
+    settled track's result instead of upscaling and embedding the same
+    face again.
+
+    Every compare_every-th upscaled face is also embedded and matched
+    without SR; stats() reports the stage's latency next to the match rate
+    of those paired samples with and without it.
+    """
+
+    def __init__(self, model_path: str = SR_MODEL_PATH, scale: int = SR_SCALE, min_face: int = SR_MIN_FACE,
+                 pad: float = SR_PAD, cache_ttl: float = SR_CACHE_TTL, compare_every: int = SR_COMPARE_EVERY) -> None:
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Super-resolution model not found: {model_path}")
+        self.scale = int(scale)
+        self.min_face = min_face
+        self.pad = pad
+        self.cache_ttl = cache_ttl
+        self.compare_every = max(0, int(compare_every))
+        if dnn_superres is not None:
+            self.sr = dnn_superres.DnnSuperResImpl_create()
+            self.sr.readModel(model_path)
+            self.sr.setModel('espcn', self.scale)
+            self.net = None
+        else:
+            self.sr = None
+            self.net = cv2.dnn.readNetFromTensorflow(model_path)
+        self._cache: Dict[Any, Tuple[float, np.ndarray]] = {}  # track id -> (time, last upscaled box)
+        self.stats_data = {'upscaled': 0, 'unchanged_skips': 0, 'upscale_ms_total': 0.0,
+                           'compared': 0, 'sr_matches': 0, 'baseline_matches': 0}
+        logger.info(f"ESPCN x{self.scale} super-resolution for faces under {min_face}px "
+                    f"({'dnn_superres' if self.sr is not None else 'cv2.dnn'})")
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional['FaceUpscaler']:
+        """Upscaler from surveillance.super_resolution, or None when disabled / unavailable"""
+        sr_cfg = config.get('surveillance', {}).get('super_resolution', {})
+        if not sr_cfg.get('enabled', False):
+            return None
+        try:
+            return cls(model_path=sr_cfg.get('model_path', SR_MODEL_PATH),
+                       scale=sr_cfg.get('scale', SR_SCALE),
+                       min_face=sr_cfg.get('min_face', SR_MIN_FACE),
+                       pad=sr_cfg.get('pad', SR_PAD),
+                       cache_ttl=sr_cfg.get('cache_ttl', SR_CACHE_TTL),
+                       compare_every=sr_cfg.get('compare_every', SR_COMPARE_EVERY))
+        except Exception as e:
+            logger.warning(f"Super-resolution disabled: {e}")
+            return None
+
+    def _upsample(self, image: np.ndarray) -> np.ndarray:
+        if self.sr is not None:
+            return self.sr.upsample(image)
+        # Same pre/post-processing as dnn_superres for ESPCN: network on Y, CrCb bicubic
+        ycrcb = cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb)
+        self.net.setInput(cv2.dnn.blobFromImage(ycrcb[:, :, 0], 1.0 / 255))
+        luma = np.clip(self.net.forward()[0, 0] * 255.0, 0, 255).astype(np.uint8)
+        out = cv2.resize(ycrcb, (luma.shape[1], luma.shape[0]), interpolation=cv2.INTER_CUBIC)
+        out[:, :, 0] = luma
+        return cv2.cvtColor(out, cv2.COLOR_YCrCb2BGR)
+
+    def is_small(self, bbox: tuple) -> bool:
+        x1, y1, x2, y2 = bbox
+        return 0 < min(x2 - x1, y2 - y1) < self.min_face
+
+    def unchanged(self, track_id: Optional[int], bbox: tuple) -> bool:
+        """Whether the track's face was upscaled within cache_ttl at (nearly) this box"""
+        cached = self._cache.get(track_id) if track_id is not None else None
+        if cached is None or time.time() - cached[0] > self.cache_ttl:
+            return False
+        a, b = cached[1], np.asarray(bbox, dtype=np.float32)
+        inter = max(0.0, min(a[2], b[2]) - max(a[0], b[0])) * max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+        return union > 0 and inter / union >= SR_SAME_BOX_IOU
+
+    def record_skip(self) -> None:
+        self.stats_data['unchanged_skips'] += 1
+
+    def upscale(self, frame: np.ndarray, bbox: tuple, face_obj: Any,
+                track_id: Optional[int] = None) -> Optional[Tuple[np.ndarray, Any, np.ndarray]]:
+        """
+        (upscaled region, face object in its coordinates, upscaled face crop)
+        for a small face of this frame, or None when the face is large enough.
+        """
+        if not self.is_small(bbox):
+            return None
+        x1, y1, x2, y2 = bbox
+        h, w = frame.shape[:2]
+        pad_x, pad_y = int((x2 - x1) * self.pad), int((y2 - y1) * self.pad)
+        rx1, ry1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+        rx2, ry2 = min(w, x2 + pad_x), min(h, y2 + pad_y)
+        if rx2 <= rx1 or ry2 <= ry1:
+            return None
+        start = time.time()
+        region = self._upsample(np.ascontiguousarray(frame[ry1:ry2, rx1:rx2]))
+        self.stats_data['upscale_ms_total'] += (time.time() - start) * 1000
+        self.stats_data['upscaled'] += 1
+
+        s = self.scale
+        crop = region[max(0, (y1 - ry1) * s):(y2 - ry1) * s, max(0, (x1 - rx1) * s):(x2 - rx1) * s]
+        if track_id is not None:
+            now = time.time()
+            if track_id not in self._cache and len(self._cache) >= SR_CACHE_SIZE:
+                for key in [k for k, (when, _) in self._cache.items() if now - when > self.cache_ttl]:
+                    del self._cache[key]
+                if len(self._cache) >= SR_CACHE_SIZE:
+                    self._cache.pop(next(iter(self._cache)))
+            self._cache[track_id] = (now, np.asarray(bbox, dtype=np.float32))
+        return region, scale_face(face_obj, rx1, ry1, s), crop
+
+    def compare_due(self) -> bool:
+        """Whether the face just upscaled should also be matched without SR"""
+        return self.compare_every > 0 and self.stats_data['upscaled'] % self.compare_every == 0
+
+    def record_comparison(self, sr_matched: bool, baseline_matched: bool) -> None:
+        self.stats_data['compared'] += 1
+        self.stats_data['sr_matches'] += sr_matched
+        self.stats_data['baseline_matches'] += baseline_matched
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats_data, cached_tracks=len(self._cache))
+        stats['upscale_ms_avg'] = stats['upscale_ms_total'] / max(1, stats['upscaled'])
+        compared = max(1, stats['compared'])
+        stats['sr_match_rate'] = stats['sr_matches'] / compared
+        stats['baseline_match_rate'] = stats['baseline_matches'] / compared
+        stats['match_rate_gain'] = stats['sr_match_rate'] - stats['baseline_match_rate']
+        return stats
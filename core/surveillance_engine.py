@@ -7,35 +7,73 @@ import json
 import os
 import logging
 from datetime import datetime
+from collections import deque
+from concurrent.futures import Future
 from typing import Tuple, List, Optional, Dict, Any
 from dataclasses import dataclass
 
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None  # Hungarian assignment unavailable, tracker uses greedy
+
 # Import Plugin Manager
 from core.plugin_manager import PluginManager
+from core.gallery import EmbeddingGallery, TieredGallery, compress_gallery
+from core.ann_index import load_watchlist_indexes
+from core.embedding_store import EmbeddingStore, EMBEDDINGS_DIR, MAX_TEMPLATES
+from core.broadcast import StreamSet, MAX_CLIENT_FPS
+from core.workers import start_pool, MAX_FRAME_BYTES, WORKER_TIMEOUT
+from core.super_resolution import FaceUpscaler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 logger = logging.getLogger("SurveillanceEngine")
 
 # Constants (could be moved to config)
-RECOGNITION_BUFFER_TIME = 7.0
-BUFFER_IOU_THRESHOLD = 0.4
 CONFIDENCE_MATCH = 0.90
 
+# Face tracker - each track is embedded/matched once, then only re-checked
+TRACK_IOU_THRESHOLD = 0.3     # min IoU (against the predicted box) to continue a track
+TRACK_MAX_AGE = 1.0           # seconds a track survives without a detection
+TRACK_KNOWN_REFRESH = 7.0     # re-verify a recognized track this often
+TRACK_UNKNOWN_REFRESH = 2.0   # retry an unrecognized track this often (pose/lighting may improve)
+TRACK_PENDING_TIMEOUT = 1.0   # match request dropped (stale/queue full) - ask again
+TRACK_NEGATIVE_TTL = 5.0      # seconds a settled "Unknown" track survives a detection gap
+TRACK_MIN_SAMPLES = 3         # embeddings averaged before a track may settle as "Unknown"
+QUALITY_FULL_SIZE = 112       # face side (px) at which the size quality term saturates
+
+# Match thresholds - High confidence (~90%)
+ARCFACE_MATCH_THRESHOLD = 0.55  # Minimum cosine similarity
+DLIB_MATCH_THRESHOLD = 0.35     # Maximum euclidean distance (stricter)
+TARGETS_FILE = 'data/active_surveillance_targets.json'
+
 # Pipeline Queue Settings - Minimal for lowest lag
 FACE_QUEUE_MAX_SIZE = 2       # Minimal queue
 EMBEDDING_QUEUE_MAX_SIZE = 2  # Minimal queue
 QUEUE_TIMEOUT = 0.01          # Very fast timeout
 
+# Batched matching - the matching stage drains up to MATCH_BATCH_SIZE embeddings
+# (waiting at most MATCH_BATCH_WAIT after the first) and scores them in one pass.
+# Queues are sized to hold one batch so a crowded frame is not cut to 2 faces.
+MATCH_BATCH_SIZE = 16
+MATCH_BATCH_WAIT = 0.005      # seconds
+# Batched recognition - the embedding stage collects a frame's pending faces the same way and
+# runs their aligned chips through the recognition model as one batch
+EMBED_BATCH_SIZE = 16
+EMBED_BATCH_WAIT = 0.003      # seconds
+POOL_READ_WAIT = 0.05         # max wait for another frame while detection workers have spare capacity
+
 
 @dataclass
 class FaceData:
     """Data structure for passing face info between pipeline stages"""
     bbox: tuple           # (x1, y1, x2, y2)
-    face_crop: np.ndarray # Cropped face image for embedding
-    frame: np.ndarray     # Full frame for saving alerts
+    face_crop: np.ndarray # Face region for embedding (read-only view into frame, no copy)
+    frame: np.ndarray     # Full frame for saving alerts (shared read-only capture buffer)
     timestamp: float      # When the face was detected
     face_obj: Any = None  # Original face object (for ArcFace with embedded embedding)
+    track_id: Optional[int] = None
 
 
 @dataclass
@@ -43,55 +81,258 @@ class EmbeddingData:
     """Data structure for passing embedding info to matching stage"""
     bbox: tuple
     embedding: np.ndarray
-    frame: np.ndarray
+    frame: np.ndarray     # same shared buffer; outlives matching only when an alert is saved
     timestamp: float
+    track_id: Optional[int] = None
+    quality: float = 1.0  # weight of this sample in the track's mean embedding
+    baseline: Optional[np.ndarray] = None  # same face embedded without super-resolution (comparison sample)
+
+@dataclass
+class FaceTrack:
+    """One face followed across frames"""
+    track_id: int
+    bbox: np.ndarray                      # last observed (x1, y1, x2, y2)
+    first_seen: float
+    last_seen: float
+    velocity: Optional[np.ndarray] = None # box corners per second (constant-velocity model)
+    hits: int = 1
+    label: Optional[str] = None           # None = never matched, "Unknown" = matched without a hit
+    confidence: float = 0.0
+    label_time: float = 0.0
+    requested_at: Optional[float] = None  # embedding/match in flight since
+    emb_sum: Optional[np.ndarray] = None  # quality-weighted sum of the track's embeddings
+    weight_sum: float = 0.0
+    samples: int = 0
+    alerted_label: Optional[str] = None
+    alerted_conf: float = 0.0
+
+
+def face_quality(bbox: tuple, face_obj: Any = None) -> float:
+    """Sample weight for embedding aggregation: face size times detector score (when known)"""
+    x1, y1, x2, y2 = bbox
+    size_q = min(1.0, max(0, min(x2 - x1, y2 - y1)) / QUALITY_FULL_SIZE)
+    det_score = float(getattr(face_obj, 'det_score', 1.0) or 1.0)
+    return max(size_q * det_score, 1e-3)
+
+
+class FaceTracker:
+    """
+    IoU tracker for detected faces (replaces the old RecognitionBuffer cache).
 
-class RecognitionBuffer:
-    def __init__(self, cooldown: float, iou_threshold: float) -> None:
-        self.cooldown = cooldown
+    Every frame the detections are associated with live tracks on a vectorized
+    IoU matrix against each track's constant-velocity predicted box (greedy, or
+    Hungarian when scipy is available and assignment='hungarian'). Tracks get
+    stable ids whether or not the face is known, so the pipeline embeds and
+    matches a track once and then only at the refresh interval, instead of
+    every frame the face falls out of a cache.
+
+    Settled "Unknown" tracks are the negative cache: they are re-checked only
+    every unknown_refresh seconds and outlive detection gaps for negative_ttl
+    (vs max_age), so a passer-by who is briefly missed by the detector is not
+    embedded again as a brand-new face.
+
+    Each track also keeps a quality-weighted running mean of its embeddings;
+    the engine matches that aggregate rather than the single latest vector.
+    An unresolved track keeps sampling until min_samples embeddings are in,
+    so a borderline face converges over a few frames instead of being
+    written off (or alerted on) from one noisy one.
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD, max_age: float = TRACK_MAX_AGE,
+                 known_refresh: float = TRACK_KNOWN_REFRESH, unknown_refresh: float = TRACK_UNKNOWN_REFRESH,
+                 pending_timeout: float = TRACK_PENDING_TIMEOUT, predict: bool = True,
+                 assignment: str = 'greedy', aggregate: bool = True,
+                 min_samples: int = TRACK_MIN_SAMPLES, negative_cache: bool = True,
+                 negative_ttl: float = TRACK_NEGATIVE_TTL) -> None:
         self.iou_threshold = iou_threshold
-        self._entries: List[Tuple[tuple, str, float]] = [] # box, label, timestamp
+        self.max_age = max_age
+        self.known_refresh = known_refresh
+        self.unknown_refresh = unknown_refresh
+        self.pending_timeout = pending_timeout
+        self.predict = predict
+        self.aggregate_enabled = aggregate
+        self.negative_cache = negative_cache
+        self.negative_ttl = max(negative_ttl, max_age) if negative_cache else max_age
+        self.min_samples = max(1, int(min_samples)) if aggregate else 1
+        if assignment == 'hungarian' and linear_sum_assignment is None:
+            logger.warning("scipy not installed - tracker falls back to greedy assignment")
+            assignment = 'greedy'
+        self.assignment = assignment
+        self._tracks: Dict[int, FaceTrack] = {}
+        self._next_id = 1
         self._lock = threading.Lock()
+        self.stats = {'revived': 0}  # settled unknown tracks re-found after a gap > max_age
+
+    def __len__(self) -> int:
+        return len(self._tracks)
 
-    def clean(self, now: float) -> None:
+    @staticmethod
+    def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+        """Pairwise IoU of (A, 4) and (B, 4) boxes -> (A, B)"""
+        a = boxes_a[:, None, :]
+        b = boxes_b[None, :, :]
+        inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+        inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+        inter = inter_w * inter_h
+        area_a = np.clip(a[..., 2] - a[..., 0], 0, None) * np.clip(a[..., 3] - a[..., 1], 0, None)
+        area_b = np.clip(b[..., 2] - b[..., 0], 0, None) * np.clip(b[..., 3] - b[..., 1], 0, None)
+        union = area_a + area_b - inter
+        return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+    def _associate(self, iou: np.ndarray) -> List[Tuple[int, int]]:
+        """(track index, detection index) pairs with IoU >= threshold"""
+        if self.assignment == 'hungarian':
+            rows, cols = linear_sum_assignment(-iou)
+            return [(t, d) for t, d in zip(rows, cols) if iou[t, d] >= self.iou_threshold]
+
+        pairs = []
+        t_idx, d_idx = np.nonzero(iou >= self.iou_threshold)
+        order = np.argsort(-iou[t_idx, d_idx], kind='stable')
+        used_t, used_d = set(), set()
+        for t, d in zip(t_idx[order], d_idx[order]):
+            if t not in used_t and d not in used_d:
+                used_t.add(t)
+                used_d.add(d)
+                pairs.append((int(t), int(d)))
+        return pairs
+
+    def update(self, boxes: List[tuple], now: float) -> List[FaceTrack]:
+        """Associate this frame's boxes with tracks; returns the track of each box (same order)"""
         with self._lock:
-            self._entries = [entry for entry in self._entries if now - entry[2] < self.cooldown]
+            for track_id in [tid for tid, t in self._tracks.items() if now - t.last_seen > self._ttl(t)]:
+                del self._tracks[track_id]
+
+            detections = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+            tracks = list(self._tracks.values())
+            result: List[Optional[FaceTrack]] = [None] * len(detections)
+            if tracks and len(detections):
+                # Extrapolate at most max_age: cached unknowns may have been gone for longer
+                predicted = np.stack([
+                    t.bbox + t.velocity * min(now - t.last_seen, self.max_age)
+                    if self.predict and t.velocity is not None else t.bbox
+                    for t in tracks
+                ])
+                for t, d in self._associate(self.iou_matrix(predicted, detections)):
+                    track = tracks[t]
+                    dt = now - track.last_seen
+                    if dt > self.max_age:
+                        self.stats['revived'] += 1
+                        track.velocity = None
+                    elif self.predict and dt > 0:
+                        velocity = (detections[d] - track.bbox) / dt
+                        track.velocity = velocity if track.velocity is None else 0.5 * (track.velocity + velocity)
+                    track.bbox = detections[d]
+                    track.last_seen = now
+                    track.hits += 1
+                    result[d] = track
 
-    def check(self, box: tuple, now: float) -> Tuple[Optional[str], float]:
+            for d in range(len(detections)):
+                if result[d] is None:
+                    track = FaceTrack(self._next_id, detections[d], now, now)
+                    self._tracks[track.track_id] = track
+                    self._next_id += 1
+                    result[d] = track
+            return result
+
+    def _settled_unknown(self, track: FaceTrack) -> bool:
+        return track.label == "Unknown" and track.samples >= self.min_samples and track.requested_at is None
+
+    def _ttl(self, track: FaceTrack) -> float:
+        return self.negative_ttl if self._settled_unknown(track) else self.max_age
+
+    def is_negative(self, track: FaceTrack) -> bool:
+        """Track currently served from the negative cache (known not to be on the watchlist)"""
+        return self.negative_cache and self._settled_unknown(track)
+
+    def needs_match(self, track: FaceTrack, now: float) -> bool:
+        """New tracks, due refreshes and lost requests need an embedding + match"""
+        if track.requested_at is not None:
+            return now - track.requested_at > self.pending_timeout
+        if track.label is None:
+            return True
+        if track.label == "Unknown" and (track.samples < self.min_samples or not self.negative_cache):
+            return True  # still converging (or negative cache off: re-check every frame)
+        refresh = self.unknown_refresh if track.label == "Unknown" else self.known_refresh
+        return now - track.label_time >= refresh
+
+    def mark_requested(self, track_id: int, now: float) -> None:
         with self._lock:
-            for entry_box, label, ts in self._entries:
-                iou = self.calculate_iou(box, entry_box)
-                if iou >= self.iou_threshold:
-                    remaining = max(0.0, self.cooldown - (now - ts))
-                    if remaining > 0:
-                        return label, remaining
-        return None, 0.0
-
-    def add(self, box: tuple, label: str, now: float) -> None:
+            track = self._tracks.get(track_id)
+            if track is not None:
+                track.requested_at = now
+
+    def set_result(self, track_id: Optional[int], label: str, conf: float, now: float) -> None:
+        """Record a match result ("Unknown" included) on the track, if it is still alive"""
         with self._lock:
-            self._entries.append((box, label, now))
+            track = self._tracks.get(track_id)
+            if track is not None:
+                track.label = label
+                track.confidence = conf
+                track.label_time = now
+                track.requested_at = None
 
-    @staticmethod
-    def calculate_iou(box_a, box_b) -> float:
-        ax1, ay1, ax2, ay2 = box_a
-        bx1, by1, bx2, by2 = box_b
+    def aggregate(self, track_id: Optional[int], embedding: np.ndarray, quality: float,
+                  normalize: bool) -> Tuple[np.ndarray, int]:
+        """
+        Fold one embedding into the track's weighted mean. Returns (mean, samples);
+        without a live track (or with aggregation off) the embedding itself.
+        normalize=True for cosine models: samples and mean are unit length.
+        """
+        emb = np.asarray(embedding, dtype=np.float32).ravel()
+        if normalize:
+            emb = emb / max(float(np.linalg.norm(emb)), 1e-12)
+        if not self.aggregate_enabled:
+            return emb, 1
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is None:
+                return emb, 1
+            if track.emb_sum is None or track.emb_sum.shape != emb.shape:  # first sample, or model switched
+                track.emb_sum = np.zeros_like(emb)
+                track.weight_sum = 0.0
+                track.samples = 0
+            track.emb_sum += quality * emb
+            track.weight_sum += quality
+            track.samples += 1
+            mean = track.emb_sum / track.weight_sum
+            samples = track.samples
+        if normalize:
+            mean = mean / max(float(np.linalg.norm(mean)), 1e-12)
+        return mean, samples
 
-        inter_x1 = max(ax1, bx1)
-        inter_y1 = max(ay1, by1)
-        inter_x2 = min(ax2, bx2)
-        inter_y2 = min(ay2, by2)
+    def keep_result(self, track_id: Optional[int], now: float) -> bool:
+        """
+        Count a re-check as done with the track's current result (its face has
+        not changed since the last sample). False for unknown or still
+        converging tracks, which need a new sample.
+        """
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is None or track.label is None or (track.label == "Unknown"
+                                                         and track.samples < self.min_samples):
+                return False
+            track.label_time = now
+            track.requested_at = None
+            return True
 
-        if inter_x2 <= inter_x1 or inter_y2 <= inter_y1:
-            return 0.0
+    def alert_due(self, track_id: Optional[int], label: str, conf: float, min_conf_diff: float) -> bool:
+        """A track alerts once per label, again only if its confidence improved"""
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is None or track.alerted_label != label:
+                return True
+            return conf >= track.alerted_conf + min_conf_diff
 
-        inter_area = (inter_x2 - inter_x1) * (inter_y2 - inter_y1)
-        area_a = max(0, ax2 - ax1) * max(0, ay2 - ay1)
-        area_b = max(0, bx2 - bx1) * max(0, by2 - by1)
-        union_area = area_a + area_b - inter_area
+    def mark_alerted(self, track_id: Optional[int], label: str, conf: float) -> None:
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is not None:
+                track.alerted_label = label
+                track.alerted_conf = conf
 
-        if union_area <= 0:
-            return 0.0
-        return inter_area / union_area
+    def remaining(self, track: FaceTrack, now: float) -> float:
+        """Seconds until a recognized track is re-verified"""
+        return max(0.0, self.known_refresh - (now - track.label_time))
 
 class SurveillanceEngine:
     """
@@ -105,23 +346,66 @@ class SurveillanceEngine:
     This architecture prevents blocking - detection continues while matching happens.
     """
     
-    def __init__(self, plugin_manager: PluginManager, config: Dict[str, Any], detection_callback=None):
+    def __init__(self, plugin_manager: PluginManager, config: Dict[str, Any], detection_callback=None, watchlist=None):
         self.pm = plugin_manager
         self.config = config
         self.stopped = False
         self.lock = threading.Lock()
         self.current_frame = None
-        self.recognition_buffer = RecognitionBuffer(RECOGNITION_BUFFER_TIME, BUFFER_IOU_THRESHOLD)
+        # Annotated preview per resolution profile, encoded once and fanned out to every /video_feed client
+        streaming_cfg = config.get('streaming', {})
+        self.streams = StreamSet('surveillance', streaming_cfg.get('profiles'),
+                                 streaming_cfg.get('max_client_fps', MAX_CLIENT_FPS))
+        tracker_cfg = config.get('surveillance', {}).get('tracker', {})
+        self.tracker = FaceTracker(
+            iou_threshold=tracker_cfg.get('iou_threshold', TRACK_IOU_THRESHOLD),
+            max_age=tracker_cfg.get('max_age', TRACK_MAX_AGE),
+            known_refresh=tracker_cfg.get('known_refresh', TRACK_KNOWN_REFRESH),
+            unknown_refresh=tracker_cfg.get('unknown_refresh', TRACK_UNKNOWN_REFRESH),
+            predict=tracker_cfg.get('predict', True),
+            assignment=tracker_cfg.get('assignment', 'greedy'),
+            aggregate=tracker_cfg.get('aggregate', True),
+            min_samples=tracker_cfg.get('min_samples', TRACK_MIN_SAMPLES),
+            negative_cache=tracker_cfg.get('negative_cache', True),
+            negative_ttl=tracker_cfg.get('negative_ttl', TRACK_NEGATIVE_TTL)
+        )
         self.detection_callback = detection_callback
         
         # Database
         self.targets_db = {}
         self.targets_priority_order = []
+        self.targets_by_id = {}
+        self.gallery = EmbeddingGallery()
+        self.watchlist = watchlist  # WatchlistFeed; deltas are applied live when set
+        store_cfg = config.get('embedding_store', {})
+        self.embedding_store = EmbeddingStore(store_cfg.get('path', EMBEDDINGS_DIR), store_cfg.get('dtype', 'float32'),
+                                              store_cfg.get('max_templates', MAX_TEMPLATES))
+        # How an identity's templates combine into one score: 'max' (best template) or 'mean'
+        self.template_reduce = config.get('surveillance', {}).get('template_reduce', 'max')
+        if self.template_reduce not in EmbeddingGallery.REDUCTIONS:
+            logger.warning(f"Unknown template_reduce '{self.template_reduce}', using 'max'")
+            self.template_reduce = 'max'
+        # Compressed gallery (float16 / int8), only kept if it agrees with float32 at the match thresholds
+        gallery_cfg = config.get('surveillance', {}).get('gallery', {})
+        self.gallery_precision = gallery_cfg.get('precision', 'float32')
+        self.min_precision_agreement = gallery_cfg.get('min_agreement', 0.99)
+        self.precision_report = {}
+        # Tiered priority search: priority-1/2 shards first, confident hits skip lower tiers
+        tier_cfg = config.get('surveillance', {}).get('tiered_search', {})
+        self.tiered_search = tier_cfg.get('enabled', True)
+        self.search_tiers = tier_cfg.get('tiers', TieredGallery.DEFAULT_TIERS)
+        self.tier_margin = tier_cfg.get('margin', 0.1)
         self.load_targets()
         
         # Pipeline Queues (thread-safe)
-        self.face_queue = queue.Queue(maxsize=FACE_QUEUE_MAX_SIZE)
-        self.embedding_queue = queue.Queue(maxsize=EMBEDDING_QUEUE_MAX_SIZE)
+        matching_cfg = config.get('surveillance', {}).get('matching', {})
+        self.match_batch_size = max(1, int(matching_cfg.get('batch_size', MATCH_BATCH_SIZE)))
+        self.match_batch_wait = matching_cfg.get('batch_wait_ms', MATCH_BATCH_WAIT * 1000) / 1000.0
+        embedding_cfg = config.get('surveillance', {}).get('embedding', {})
+        self.embed_batch_size = max(1, int(embedding_cfg.get('batch_size', EMBED_BATCH_SIZE)))
+        self.embed_batch_wait = embedding_cfg.get('batch_wait_ms', EMBED_BATCH_WAIT * 1000) / 1000.0
+        self.face_queue = queue.Queue(maxsize=max(FACE_QUEUE_MAX_SIZE, self.match_batch_size, self.embed_batch_size))
+        self.embedding_queue = queue.Queue(maxsize=max(EMBEDDING_QUEUE_MAX_SIZE, self.match_batch_size))
         
         # Alert cooldown - prevent duplicate alerts for same person
         self.last_alert_time = {}  # {person_name: (timestamp, confidence)}
@@ -135,10 +419,39 @@ class SurveillanceEngine:
             'embedding_fps': 0.0,
             'matching_fps': 0.0,
             'faces_detected': 0,
-            'matches_found': 0
+            'matches_found': 0,
+            'match_batch_avg': 0.0,
+            'active_tracks': 0,
+            'match_requests': 0,
+            'track_samples_avg': 0.0,
+            'track_alerts_suppressed': 0,
+            'negative_cache_hits': 0,      # unknown faces not re-embedded/re-matched this frame
+            'known_cache_hits': 0,         # recognized faces not re-embedded/re-matched this frame
+            'embed_ms_avg': 0.0,
+            'recognition_batch_avg': 0.0,     # aligned chips per recognition call
+            'recognition_batch_ms_avg': 0.0,  # latency of one recognition call
+            'recognition_faces_per_sec': 0.0, # recognition throughput while running
+            'match_ms_avg': 0.0,
+            'frames_dropped': 0,           # captured frames detection never saw (it was busy)
+            'capture_latency_ms': 0.0,     # grab -> detection start, last frame
+            'preview_skipped': 0,          # frames not drawn/encoded because nobody was watching
+            'frame_copies': 0,             # full-frame copies made by the engine (annotated previews only)
+            'crops_shared': 0,             # face crops passed down as views instead of copies
+            'alert_frames_kept': 0         # frames held past matching (one per saved alert)
         }
         self.metrics_lock = threading.Lock()
         
+        # Frames come from the plugin manager's hub, shared with the weapon/crowd streams
+        self.frames = self.pm.frame_hub.subscribe('faces')
+        
+        # Optional worker processes for detection / embedding (0 = in-process)
+        workers_cfg = config.get('surveillance', {}).get('workers', {})
+        max_frame_bytes = workers_cfg.get('max_frame_bytes', MAX_FRAME_BYTES)
+        self.detection_pool = start_pool(config, 'detection', workers_cfg.get('detection', 0), max_frame_bytes)
+        self.embedding_pool = start_pool(config, 'embedding', workers_cfg.get('embedding', 0), max_frame_bytes)
+        # Optional ESPCN upscaling of small faces ahead of recognition
+        self.upscaler = FaceUpscaler.from_config(config)
+        
         # Start pipeline threads
         self.detection_thread = threading.Thread(target=self._detection_loop, daemon=True, name="DetectionThread")
         self.embedding_thread = threading.Thread(target=self._embedding_loop, daemon=True, name="EmbeddingThread")
@@ -151,30 +464,134 @@ class SurveillanceEngine:
         logger.info("🚀 Multi-threaded Surveillance Engine Started (3 pipeline threads)")
 
     def load_targets(self):
-        """Load targets from the JSON file generated by app.py (already sorted by priority)"""
-        json_path = 'data/active_surveillance_targets.json'
-        self.targets_db = {}
-        self.targets_priority_order = []
-        if os.path.exists(json_path):
+        """
+        Load the full target list (already sorted by priority): from the watchlist
+        feed when one is attached (subscribing to its deltas), else from the JSON
+        file generated by app.py.
+        """
+        json_path = TARGETS_FILE
+        targets = []
+        if self.watchlist is not None:
+            targets = self.watchlist.subscribe(self.apply_watchlist_delta)
+        elif os.path.exists(json_path):
             try:
                 with open(json_path, 'r') as f:
                     targets = json.load(f)
-                for t in targets:
-                    self.targets_db[t['name']] = t
-                    self.targets_priority_order.append(t['name'])
-                logger.info(f"Loaded {len(self.targets_db)} targets (priority-sorted).")
             except Exception as e:
                 logger.error(f"Error loading targets: {e}")
+                targets = []
+
+        targets = [t for t in targets if 'id' in t and 'name' in t]
+        targets_by_id = {t['id']: t for t in targets}
+        thresholds = {'arcface': ARCFACE_MATCH_THRESHOLD, 'dlib': DLIB_MATCH_THRESHOLD}
+        if self.tiered_search:
+            by_priority = {}
+            for t in targets:
+                by_priority.setdefault(self._priority_of(t), []).append(t)
+            shards, self.precision_report = {}, {}
+            for priority, group in sorted(by_priority.items()):
+                shards[priority], self.precision_report[priority] = self._build_gallery(group, thresholds)
+            gallery = TieredGallery(shards, self.search_tiers, thresholds, self.tier_margin)
+        else:
+            gallery, self.precision_report = self._build_gallery(targets, thresholds)
+        self._attach_indexes(gallery)
+
+        # Swap in one go so the matching thread never sees a half-built gallery
+        self.gallery = gallery
+        self._set_targets(targets_by_id)
+        logger.info(f"Loaded {len(targets_by_id)} targets (priority-sorted).")
+
+    def _build_gallery(self, targets, thresholds):
+        """Gallery (and precision report) for a list of targets, in the configured precision"""
+        if any('embeddings' in t for t in targets):
+            gallery = EmbeddingGallery.from_targets(targets)  # legacy export with inline vectors
+        else:
+            gallery = EmbeddingGallery.from_store([t['id'] for t in targets], self.embedding_store)
+        return compress_gallery(gallery, self.gallery_precision, thresholds,
+                                min_agreement=self.min_precision_agreement)
+
+    @staticmethod
+    def _priority_of(target) -> int:
+        try:
+            return int(target.get('priority', 3))
+        except (TypeError, ValueError):
+            return 3
+
+    def _gallery_add(self, target) -> None:
+        """(Re)load one target's templates from the store into the live gallery"""
+        templates = self.embedding_store.get_templates(target['id'])
+        if isinstance(self.gallery, TieredGallery):
+            self.gallery.add(target['id'], templates, priority=self._priority_of(target))
+        else:
+            self.gallery.add(target['id'], templates)
+
+    def _attach_indexes(self, gallery) -> None:
+        """
+        Large watchlists: use the ANN index persisted next to the targets file,
+        if it was built from the very rows the store holds for this gallery
+        """
+        rows_by_model = {}
+        for model_type in ('arcface', 'dlib'):
+            gallery_keys = gallery.model_keys(model_type)
+            keys, vectors = self.embedding_store.rows_for(list(dict.fromkeys(gallery_keys)), model_type)
+            if sorted(keys) == sorted(gallery_keys):  # gallery not ahead of / behind the store
+                rows_by_model[model_type] = (keys, vectors)
+        indexes = load_watchlist_indexes(TARGETS_FILE, rows_by_model)
+        for model_type, index in indexes.items():
+            gallery.attach_index(model_type, index)
+            logger.info(f"Using {index.kind} index for {model_type} ({len(index)} rows, recall: {index.report})")
+
+    def _set_targets(self, targets_by_id: Dict[str, Dict[str, Any]]) -> None:
+        """Publish target lookups (copy-on-write, replaced as a whole)"""
+        ordered = sorted(targets_by_id.values(), key=lambda t: t.get('priority', 3))
+        targets_db = {}
+        for t in ordered:
+            targets_db.setdefault(t['name'], t)
+        self.targets_by_id = targets_by_id
+        self.targets_db = targets_db
+        self.targets_priority_order = [t['name'] for t in ordered]
+
+    def apply_watchlist_delta(self, delta):
+        """
+        Apply one watchlist change to the running engine without a full reload.
+        Gallery updates are in place (no matrix copy), so matching never pauses.
+        """
+        if delta.op == 'reset':
+            self.load_targets()
+        elif delta.op == 'reindex':
+            self._attach_indexes(self.gallery)
+        elif delta.op == 'add':
+            target = delta.target
+            moved = (isinstance(self.gallery, TieredGallery) and target['id'] in self.gallery
+                     and self.gallery.priority_of(target['id']) != self._priority_of(target))
+            if target['id'] not in self.gallery or moved:
+                self._gallery_add(target)
+            self._set_targets(dict(self.targets_by_id, **{target['id']: target}))
+        elif delta.op == 'templates':
+            target = self.targets_by_id.get(delta.person_id)
+            if target is not None:
+                self._gallery_add(target)
+        elif delta.op == 'remove':
+            self.gallery.remove(delta.person_id)
+            targets_by_id = dict(self.targets_by_id)
+            targets_by_id.pop(delta.person_id, None)
+            self._set_targets(targets_by_id)
 
     def stop(self):
         """Stop all pipeline threads gracefully"""
         logger.info("Stopping Surveillance Engine...")
         self.stopped = True
+        if self.watchlist is not None:
+            self.watchlist.unsubscribe(self.apply_watchlist_delta)
         
         # Wait for threads to finish
         for thread in [self.detection_thread, self.embedding_thread, self.matching_thread]:
             if thread.is_alive():
                 thread.join(timeout=2.0)
+        self.frames.close()
+        for pool in (self.detection_pool, self.embedding_pool):
+            if pool is not None:
+                pool.close()
         
         # Clear queues
         self._clear_queue(self.face_queue)
@@ -197,7 +614,30 @@ class SurveillanceEngine:
     def get_metrics(self) -> Dict[str, Any]:
         """Get current performance metrics"""
         with self.metrics_lock:
-            return self.metrics.copy()
+            metrics = self.metrics.copy()
+        metrics['gallery_precision'] = self.gallery.precision
+        metrics['gallery_bytes'] = self.gallery.nbytes()
+        if isinstance(self.gallery, TieredGallery):
+            stats = self.gallery.stats
+            metrics['tier_early_exit_rate'] = stats['early_exits'] / max(1, stats['queries'])
+            metrics['tier_rows_scored_ratio'] = stats['rows_scored'] / max(1, stats['rows_total'])
+        for name, pool in (('detection_workers', self.detection_pool), ('embedding_workers', self.embedding_pool)):
+            if pool is not None:
+                metrics[name] = pool.stats()
+        camera = self.pm.active_camera
+        if getattr(camera, 'pool', None) is not None:
+            metrics['frame_pool'] = camera.pool.stats()
+        model_stats = getattr(self.pm.active_model, 'stats', None)
+        if callable(model_stats):
+            metrics['face_model'] = model_stats()
+        if self.upscaler is not None:
+            metrics['super_resolution'] = self.upscaler.stats()
+        # Work the negative cache saved: each hit is one embedding + one match not run
+        negative_hits = metrics['negative_cache_hits']
+        metrics['negative_cache_revived'] = self.tracker.stats['revived']
+        metrics['negative_cache_hit_rate'] = negative_hits / max(1, negative_hits + metrics['match_requests'])
+        metrics['negative_cache_saved_ms'] = negative_hits * (metrics['embed_ms_avg'] + metrics['match_ms_avg'])
+        return metrics
 
     def _detection_loop(self):
         """
@@ -206,35 +646,29 @@ class SurveillanceEngine:
         logger.info("Detection Thread Started")
         frame_count = 0
         last_fps_time = time.time()
-        frame_for_alert = None  # Reuse frame reference for alerts
+        in_flight = deque()  # (captured, future) handed to detection workers
         
         while not self.stopped:
-            if not self.pm.active_camera:
-                time.sleep(0.5)
-                continue
-
-            ret, frame = self.pm.active_camera.get_frame()
-            if not ret or frame is None:
-                time.sleep(0.02)
+            # Run face detection (in-process, or on the worker pool)
+            result = self._next_detection(in_flight)
+            if result is None:
                 continue
-
-            current_time = time.time()
+            captured, faces = result
             
-            # Clean old buffer entries periodically (not every frame)
-            if frame_count % 10 == 0:
-                self.recognition_buffer.clean(current_time)
-            
-            # Run face detection
-            try:
-                faces = self.pm.active_model.detect_faces(frame)
-            except Exception as e:
-                logger.error(f"Detection error: {e}")
-                continue
+            # Shared read-only frame (pooled capture buffer): detection reads it, crops and alerts keep
+            # views/references to it, only the preview draws on its own copy
+            frame = captured.frame
+            current_time = time.time()
+            with self.metrics_lock:
+                stats = self.frames.stats()
+                self.metrics['frames_dropped'] = stats.get('dropped', 0)
+                self.metrics['capture_latency_ms'] = (current_time - captured.timestamp) * 1000
             
             # Clear old active detections and prepare fresh list for this frame
             current_frame_detections = []
             
-            # Process each detected face
+            # Collect boxes for this frame
+            detections = []
             for face in faces:
                 bbox = None
                 face_obj = None
@@ -244,56 +678,83 @@ class SurveillanceEngine:
                     face_obj = face
                 elif hasattr(face, 'left'):  # Dlib
                     bbox = (face.left(), face.top(), face.right(), face.bottom())
+                    face_obj = face  # The rect the shape predictor aligns on
 
-                if bbox is None:
-                    continue
-                
+                if bbox is not None:
+                    detections.append((bbox, face_obj))
+            
+            # Follow faces across frames; only new/due tracks go down the pipeline
+            tracks = self.tracker.update([bbox for bbox, _ in detections], current_time)
+            match_requests = 0
+            negative_hits = 0
+            known_hits = 0
+            crops_shared = 0
+            
+            for (bbox, face_obj), track in zip(detections, tracks):
                 x1, y1, x2, y2 = bbox
                 
-                # Check recognition buffer
-                cached_label, remaining = self.recognition_buffer.check(bbox, current_time)
+                if self.tracker.needs_match(track, current_time) and not self.face_queue.full():
+                    # Create minimal face crop
+                    h, w = frame.shape[:2]
+                    cx1, cy1 = max(0, x1), max(0, y1)
+                    cx2, cy2 = min(w, x2), min(h, y2)
+                    
+                    if cy2 > cy1 and cx2 > cx1:
+                        face_data = FaceData(
+                            bbox=bbox,
+                            face_crop=frame[cy1:cy2, cx1:cx2],  # View; the buffer can't be reused while held
+                            frame=frame,  # Reference, not copy
+                            timestamp=current_time,
+                            face_obj=face_obj,
+                            track_id=track.track_id
+                        )
+                        try:
+                            self.face_queue.put_nowait(face_data)
+                            self.tracker.mark_requested(track.track_id, current_time)
+                            match_requests += 1
+                            crops_shared += 1
+                        except queue.Full:
+                            pass
+                elif self.tracker.is_negative(track):
+                    negative_hits += 1
+                elif track.label and track.requested_at is None:
+                    known_hits += 1
                 
-                if cached_label:
+                if track.label and track.label != "Unknown":
                     # Already recognized - just draw
-                    current_frame_detections.append((bbox, cached_label, remaining))
+                    current_frame_detections.append((bbox, track.label, self.tracker.remaining(track, current_time)))
                 else:
-                    # New face - queue for processing (only if queue not full)
-                    if not self.face_queue.full():
-                        # Create minimal face crop
-                        h, w = frame.shape[:2]
-                        cx1, cy1 = max(0, x1), max(0, y1)
-                        cx2, cy2 = min(w, x2), min(h, y2)
-                        
-                        if cy2 > cy1 and cx2 > cx1:
-                            face_data = FaceData(
-                                bbox=bbox,
-                                face_crop=frame[cy1:cy2, cx1:cx2].copy(),
-                                frame=frame,  # Reference, not copy
-                                timestamp=current_time,
-                                face_obj=face_obj
-                            )
-                            try:
-                                self.face_queue.put_nowait(face_data)
-                            except queue.Full:
-                                pass
-                    
                     # Draw as unrecognized for now
                     current_frame_detections.append((bbox, None, 0))
             
-            # Draw directly on frame (no copy needed for display)
-            for bbox, label, remaining in current_frame_detections:
-                x1, y1, x2, y2 = bbox
-                if label:
-                    color = (0, 255, 0)  # Green for recognized
-                    text = f"{label} ({remaining:.1f}s)"
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(frame, text, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
-            
-            # Encode with lower quality for speed
-            ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-            if ret:
-                with self.lock:
-                    self.current_frame = jpeg.tobytes()
+            with self.metrics_lock:
+                self.metrics['faces_detected'] += len(detections)
+                self.metrics['active_tracks'] = len(self.tracker)
+                self.metrics['match_requests'] += match_requests
+                self.metrics['negative_cache_hits'] += negative_hits
+                self.metrics['known_cache_hits'] += known_hits
+                self.metrics['crops_shared'] += crops_shared
+            
+            # Preview: annotate and encode only when someone is watching, once per watched profile
+            if self.streams.has_clients():
+                preview = frame.copy()
+                with self.metrics_lock:
+                    self.metrics['frame_copies'] += 1
+                for bbox, label, remaining in current_frame_detections:
+                    x1, y1, x2, y2 = bbox
+                    if label:
+                        color = (0, 255, 0)  # Green for recognized
+                        text = f"{label} ({remaining:.1f}s)"
+                        cv2.rectangle(preview, (x1, y1), (x2, y2), color, 2)
+                        cv2.putText(preview, text, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+                
+                encoded = self.streams.publish_frame(preview, captured.timestamp)
+                if 'full' in encoded:
+                    with self.lock:
+                        self.current_frame = encoded['full']
+            else:
+                with self.metrics_lock:
+                    self.metrics['preview_skipped'] += 1
             
             # Update FPS metrics less frequently
             frame_count += 1
@@ -303,95 +764,230 @@ class SurveillanceEngine:
                 frame_count = 0
                 last_fps_time = time.time()
 
+        for _, future in in_flight:
+            future.cancel()
         logger.info("Detection Thread Stopped")
 
+    def _next_detection(self, in_flight: deque) -> Optional[Tuple[Any, list]]:
+        """
+        Next (captured frame, faces), or None. In-process: read and detect.
+        With a detection pool: keep up to one frame in flight per worker and
+        hand results back in capture order (the tracker needs them in sequence).
+        """
+        pool = self.detection_pool
+        if pool is None:
+            captured = self.frames.read()
+            if captured is None:
+                time.sleep(0.5 if self.pm.active_camera is None else 0.02)
+                return None
+            try:
+                return captured, self.pm.active_model.detect_faces(captured.frame)
+            except Exception as e:
+                logger.error(f"Detection error: {e}")
+                return None
+
+        while len(in_flight) < pool.workers and not (in_flight and in_flight[0][1].done()):
+            captured = self.frames.read(timeout=POOL_READ_WAIT) if in_flight else self.frames.read()
+            if captured is None:
+                break
+            if pool.fits(captured.frame):
+                in_flight.append((captured, pool.detect(captured.frame)))
+            else:
+                done = Future()
+                done.set_result(self.pm.active_model.detect_faces(captured.frame))
+                in_flight.append((captured, done))
+        if not in_flight:
+            time.sleep(0.5 if self.pm.active_camera is None else 0.02)
+            return None
+
+        captured, future = in_flight.popleft()
+        try:
+            return captured, future.result(timeout=WORKER_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Detection error: {e}")
+            return None
+
     def _embedding_loop(self):
         """
         THREAD 3: Embedding Generation Loop
         - Reads faces from face_queue
-        - Generates embeddings (ArcFace uses pre-computed, Dlib generates)
+        - Generates embeddings only for faces the tracker wants matched (aligned chip or raw crop)
         - Passes embeddings to embedding_queue
         """
         logger.info("Embedding Thread Started")
         process_count = 0
+        embed_time = 0.0
+        rec_batches = 0
+        rec_faces = 0
+        rec_time = 0.0
         last_fps_time = time.time()
         
-        model_type = 'arcface'  # Will be updated based on active model
-        
         while not self.stopped:
-            try:
-                face_data = self.face_queue.get(timeout=QUEUE_TIMEOUT)
-            except queue.Empty:
+            # All faces a frame queued (or whatever arrives within the batch window)
+            batch = self._drain_queue(self.face_queue, self.embed_batch_size, self.embed_batch_wait)
+            if not batch:
                 continue
             
             current_time = time.time()
-            
+            embed_start = time.time()
             # Skip if face is too old (stale data)
-            if current_time - face_data.timestamp > 0.5:
-                continue
-            
-            # Determine model type
-            if self.pm.active_model:
-                model_type = 'dlib' if 'Dlib' in self.pm.active_model.__class__.__name__ else 'arcface'
-            
-            embedding = None
+            batch = [face_data for face_data in batch if current_time - face_data.timestamp <= 0.5]
+            embeddings, baselines, chips, chips_time = self._embed_batch(batch, self.embedding_pool)
+            if chips:
+                rec_batches += 1
+                rec_faces += chips
+                rec_time += chips_time
             
-            try:
-                if model_type == 'arcface' and face_data.face_obj is not None:
-                    # ArcFace already computed embedding during detection
-                    if hasattr(face_data.face_obj, 'embedding'):
-                        embedding = face_data.face_obj.embedding
-                elif face_data.face_crop is not None and face_data.face_crop.size > 0:
-                    # Generate embedding from crop (Dlib or fallback)
-                    embedding = self.pm.active_model.generate_embedding(face_data.face_crop)
-            except Exception as e:
-                logger.error(f"Embedding generation error: {e}")
-                continue
-            
-            if embedding is not None:
-                emb_data = EmbeddingData(
-                    bbox=face_data.bbox,
-                    embedding=embedding,
-                    frame=face_data.frame.copy(),  # Copy here for alert saving
-                    timestamp=face_data.timestamp
-                )
-                
+            processed = 0
+            for face_data, embedding, baseline in zip(batch, embeddings, baselines):
                 try:
-                    self.embedding_queue.put_nowait(emb_data)
-                except queue.Full:
-                    pass  # Skip if matching is overwhelmed
+                    if isinstance(embedding, Future):
+                        embedding = embedding.result(timeout=WORKER_TIMEOUT)
+                    if isinstance(baseline, Future):
+                        baseline = baseline.result(timeout=WORKER_TIMEOUT)
+                except Exception as e:
+                    logger.error(f"Embedding generation error: {e}")
+                    continue
+                
+                if embedding is not None:
+                    processed += 1
+                    emb_data = EmbeddingData(
+                        bbox=face_data.bbox,
+                        embedding=embedding,
+                        frame=face_data.frame,  # Read-only, so a reference is enough for alert saving
+                        timestamp=face_data.timestamp,
+                        track_id=face_data.track_id,
+                        quality=face_quality(face_data.bbox, face_data.face_obj),
+                        baseline=baseline
+                    )
+                    
+                    try:
+                        self.embedding_queue.put_nowait(emb_data)
+                    except queue.Full:
+                        pass  # Skip if matching is overwhelmed
+            embed_time += time.time() - embed_start
             
             # Update FPS metrics
-            process_count += 1
-            if current_time - last_fps_time >= 1.0:
+            process_count += processed
+            if current_time - last_fps_time >= 1.0 and process_count:
                 with self.metrics_lock:
                     self.metrics['embedding_fps'] = process_count / (current_time - last_fps_time)
+                    self.metrics['embed_ms_avg'] = embed_time * 1000 / process_count
+                    if rec_batches:
+                        self.metrics['recognition_batch_avg'] = rec_faces / rec_batches
+                        self.metrics['recognition_batch_ms_avg'] = rec_time * 1000 / rec_batches
+                        self.metrics['recognition_faces_per_sec'] = rec_faces / rec_time if rec_time else 0.0
                 process_count = 0
+                embed_time = 0.0
+                rec_batches = 0
+                rec_faces = 0
+                rec_time = 0.0
                 last_fps_time = current_time
 
         logger.info("Embedding Thread Stopped")
 
+    def _embed_batch(self, batch: List[FaceData], pool) -> Tuple[List[Any], List[Any], int, float]:
+        """
+        Embeddings for the faces the tracker wants (re)matched, in batch order
+        (None where there is none, a Future where a worker computes it).
+        Small faces are upscaled first when super-resolution is on (a settled
+        track whose small face has not moved since its last upscale keeps its
+        result and is skipped: no embedding).
+        Faces the model can align are recognized together: one
+        embed_aligned_batch call over all their chips (or one worker job each
+        with an embedding pool). Other faces embed their raw crop.
+        Returns (embeddings, baselines, chips in the batch call, seconds it took);
+        baselines holds the non-upscaled embedding of SR comparison samples.
+        """
+        model = self.pm.active_model
+        align = getattr(model, 'align_face', None)
+        # (batch index, is baseline, frame, face object, crop, track id) per embedding to compute
+        inputs = []
+        embeddings: List[Any] = [None] * len(batch)
+        baselines: List[Any] = [None] * len(batch)
+        for i, face_data in enumerate(batch):
+            # Detectors that recognize every face (ArcFace with split: false) already carry it
+            embedding = getattr(face_data.face_obj, 'embedding', None)
+            if embedding is not None:
+                embeddings[i] = embedding
+                continue
+            upscaled = None
+            if self.upscaler is not None:
+                if (self.upscaler.is_small(face_data.bbox)
+                        and self.upscaler.unchanged(face_data.track_id, face_data.bbox)
+                        and self.tracker.keep_result(face_data.track_id, time.time())):
+                    self.upscaler.record_skip()  # same small face as the last sample: its result stands
+                    continue
+                try:
+                    upscaled = self.upscaler.upscale(face_data.frame, face_data.bbox, face_data.face_obj,
+                                                     face_data.track_id)
+                except Exception as e:
+                    logger.error(f"Super-resolution error: {e}")
+            if upscaled is None:
+                inputs.append((i, False, face_data.frame, face_data.face_obj, face_data.face_crop, face_data.track_id))
+                continue
+            region, face_obj, crop = upscaled
+            inputs.append((i, False, region, face_obj, crop, face_data.track_id))
+            if self.upscaler.compare_due():
+                # No track id: per-track model state belongs to the upscaled coordinates
+                inputs.append((i, True, face_data.frame, face_data.face_obj, face_data.face_crop, None))
+
+        chips, chip_slots = [], []
+        for i, is_baseline, frame, face_obj, crop, track_id in inputs:
+            out = baselines if is_baseline else embeddings
+            try:
+                chip = align(frame, face_obj, track_id=track_id) if align and face_obj is not None else None
+                if chip is not None:
+                    if pool is not None and pool.fits(chip):
+                        out[i] = pool.embed(chip, aligned=True)
+                    else:
+                        chips.append(chip)
+                        chip_slots.append((out, i))
+                elif crop is not None and crop.size > 0:
+                    if pool is not None and pool.fits(crop):
+                        out[i] = pool.embed(crop)
+                    else:
+                        out[i] = model.generate_embedding(crop)
+            except Exception as e:
+                logger.error(f"Embedding generation error: {e}")
+        
+        if not chips:
+            return embeddings, baselines, 0, 0.0
+        start = time.time()
+        try:
+            batch_embed = getattr(model, 'embed_aligned_batch', None)
+            results = batch_embed(chips) if batch_embed else [model.embed_aligned(chip) for chip in chips]
+        except Exception as e:
+            logger.error(f"Embedding generation error: {e}")
+            results = [None] * len(chips)
+        for (out, i), embedding in zip(chip_slots, results):
+            out[i] = embedding
+        return embeddings, baselines, len(chips), time.time() - start
+
     def _matching_loop(self):
         """
         THREAD 4: Database Matching Loop
-        - Reads embeddings from embedding_queue
-        - Compares against target database
-        - Generates alerts for matches
+        - Drains embeddings from embedding_queue (up to a batch limit or deadline)
+        - Compares the whole batch against the target database in one pass
+        - Generates alerts for matches, face by face
         """
         logger.info("Matching Thread Started")
         match_count = 0
+        batch_count = 0
+        samples_total = 0
+        match_time = 0.0
         last_fps_time = time.time()
         
         while not self.stopped:
-            try:
-                emb_data = self.embedding_queue.get(timeout=QUEUE_TIMEOUT)
-            except queue.Empty:
+            batch = self._drain_queue(self.embedding_queue, self.match_batch_size, self.match_batch_wait)
+            if not batch:
                 continue
             
             current_time = time.time()
             
             # Skip stale embeddings
-            if current_time - emb_data.timestamp > 1.0:
+            batch = [e for e in batch if current_time - e.timestamp <= 1.0]
+            if not batch:
                 continue
             
             # Determine model type
@@ -399,64 +995,136 @@ class SurveillanceEngine:
             if self.pm.active_model:
                 model_type = 'dlib' if 'Dlib' in self.pm.active_model.__class__.__name__ else 'arcface'
             
+            # Match each track's running mean embedding, not the single noisy frame
+            queries = []
+            sample_count = 0
+            for e in batch:
+                embedding, samples = self.tracker.aggregate(e.track_id, e.embedding, e.quality,
+                                                            normalize=(model_type == 'arcface'))
+                queries.append(embedding)
+                sample_count += samples
+            
             # Compare against database
+            match_start = time.time()
             try:
-                label, conf = self.compare_embedding(emb_data.embedding, model_type)
+                results = self.compare_embeddings(queries, model_type)
             except Exception as e:
                 logger.error(f"Matching error: {e}")
                 continue
+            match_time += time.time() - match_start
             
-            if label != "Unknown":
-                # Add to recognition buffer (this is what detection loop checks)
-                self.recognition_buffer.add(emb_data.bbox, label, current_time)
-                
-                # Check alert cooldown - avoid duplicate alerts for same person with similar confidence
-                should_alert = False
-                with self.alert_lock:
-                    last_data = self.last_alert_time.get(label)
-                    if last_data is None:
-                        # First detection of this person
-                        should_alert = True
-                    else:
-                        last_time, last_conf = last_data
-                        time_diff = current_time - last_time
-                        conf_diff = abs(conf - last_conf)
-                        
-                        # Alert only if: enough time passed AND confidence is significantly different
-                        if time_diff >= self.alert_cooldown and conf_diff >= self.min_conf_diff:
-                            should_alert = True
-                    
-                    if should_alert:
-                        self.last_alert_time[label] = (current_time, conf)
-                
-                if should_alert:
-                    # Save alert (in separate thread to not block matching)
-                    threading.Thread(
-                        target=self.save_alert,
-                        args=(label, conf, emb_data.frame, emb_data.bbox),
-                        daemon=True
-                    ).start()
-                    
-                    # Notify UI via callback
-                    if self.detection_callback:
-                        target = self.targets_db.get(label, {})
-                        is_wanted = target.get('is_wanted', False)
-                        db_type = target.get('db_type', 'criminal')
-                        self.detection_callback(label, conf, is_wanted, db_type)
-                    
-                    with self.metrics_lock:
-                        self.metrics['matches_found'] += 1
+            for emb_data, (label, conf) in zip(batch, results):
+                self.tracker.set_result(emb_data.track_id, label, conf, current_time)
+                if label != "Unknown":
+                    self._handle_match(emb_data, label, conf, current_time)
+            self._compare_super_resolution(batch, model_type)
             
             # Update FPS metrics
-            match_count += 1
+            match_count += len(batch)
+            batch_count += 1
+            samples_total += sample_count
             if current_time - last_fps_time >= 1.0:
                 with self.metrics_lock:
                     self.metrics['matching_fps'] = match_count / (current_time - last_fps_time)
+                    self.metrics['match_batch_avg'] = match_count / batch_count
+                    self.metrics['track_samples_avg'] = samples_total / match_count
+                    self.metrics['match_ms_avg'] = match_time * 1000 / match_count
                 match_count = 0
+                batch_count = 0
+                samples_total = 0
+                match_time = 0.0
                 last_fps_time = current_time
 
         logger.info("Matching Thread Stopped")
 
+    def _compare_super_resolution(self, batch: List[EmbeddingData], model_type: str) -> None:
+        """Match SR comparison samples frame-by-frame with and without upscaling (stats only)"""
+        samples = [e for e in batch if e.baseline is not None]
+        if not samples or self.upscaler is None:
+            return
+        queries = []
+        for e in samples:
+            for embedding in (e.embedding, e.baseline):
+                query = np.asarray(embedding, dtype=np.float32).ravel()
+                if model_type == 'arcface':
+                    query = query / max(float(np.linalg.norm(query)), 1e-12)
+                queries.append(query)
+        try:
+            results = self.compare_embeddings(queries, model_type)
+        except Exception as e:
+            logger.error(f"Matching error: {e}")
+            return
+        for j in range(0, len(results), 2):
+            self.upscaler.record_comparison(results[j][0] != "Unknown", results[j + 1][0] != "Unknown")
+
+    def _drain_queue(self, q: queue.Queue, max_items: int, wait: float) -> list:
+        """Block briefly for one item, then take whatever else arrives before the batch deadline"""
+        try:
+            batch = [q.get(timeout=QUEUE_TIMEOUT)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + wait
+        while len(batch) < max_items:
+            try:
+                batch.append(q.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _handle_match(self, emb_data: EmbeddingData, label: str, conf: float, current_time: float) -> None:
+        """De-duplicate and alert for one matched face"""
+        # A track that already alerted for this person only alerts again with a better match
+        if not self.tracker.alert_due(emb_data.track_id, label, conf, self.min_conf_diff):
+            with self.metrics_lock:
+                self.metrics['track_alerts_suppressed'] += 1
+            return
+        
+        # Check alert cooldown - avoid duplicate alerts for same person with similar confidence
+        should_alert = False
+        with self.alert_lock:
+            last_data = self.last_alert_time.get(label)
+            if last_data is None:
+                # First detection of this person
+                should_alert = True
+            else:
+                last_time, last_conf = last_data
+                time_diff = current_time - last_time
+                conf_diff = abs(conf - last_conf)
+                
+                # Alert only if: enough time passed AND confidence is significantly different
+                if time_diff >= self.alert_cooldown and conf_diff >= self.min_conf_diff:
+                    should_alert = True
+            
+            if should_alert:
+                self.last_alert_time[label] = (current_time, conf)
+        
+        if should_alert:
+            self.tracker.mark_alerted(emb_data.track_id, label, conf)
+            with self.metrics_lock:
+                self.metrics['alert_frames_kept'] += 1
+            # Save alert (in separate thread to not block matching)
+            threading.Thread(
+                target=self.save_alert,
+                args=(label, conf, emb_data.frame, emb_data.bbox),
+                daemon=True
+            ).start()
+            
+            # Notify UI via callback
+            if self.detection_callback:
+                target = self.targets_db.get(label, {})
+                is_wanted = target.get('is_wanted', False)
+                db_type = target.get('db_type', 'criminal')
+                self.detection_callback(label, conf, is_wanted, db_type)
+            
+            with self.metrics_lock:
+                self.metrics['matches_found'] += 1
+
     def save_alert(self, label, conf, frame, box):
         """Save alert with face detection - Thread-safe"""
         try:
@@ -557,40 +1225,35 @@ class SurveillanceEngine:
             logger.error(f"Error creating system notification: {e}")
 
     def compare_embedding(self, embedding, model_type='dlib'):
-        """Compare embedding against DB (iterates in priority order) - Thread-safe"""
-        best_label = "Unknown"
-        best_conf = 0.0
-        
-        # Thresholds - High confidence (~90%)
-        threshold = 0.6  # Default
+        """Compare one embedding against the vectorized gallery - Thread-safe"""
+        return self.compare_embeddings([embedding], model_type)[0]
+
+    def compare_embeddings(self, embeddings, model_type='dlib'):
+        """
+        Compare a batch of embeddings against the vectorized gallery - Thread-safe.
+        One matrix-matrix product per priority shard scores every face against its
+        templates, reduced per identity (template_reduce); faces with a confident
+        high-priority hit skip the lower tiers. Returns [(label, conf)] in input order.
+        """
         if model_type == 'dlib':
-            threshold = 0.35  # Stricter distance threshold
+            threshold = DLIB_MATCH_THRESHOLD
         else:
-            threshold = 0.55  # Higher similarity threshold for ArcFace
-        
-        # Iterate in priority order
-        for name in self.targets_priority_order:
-            data = self.targets_db.get(name)
-            if not data:
+            threshold = ARCFACE_MATCH_THRESHOLD
+
+        queries = np.vstack([np.asarray(e, dtype=np.float32).ravel() for e in embeddings])
+        results = []
+        for result in self.gallery.search_batch(queries, model_type, reduce=self.template_reduce):
+            if result is None:
+                results.append(("Unknown", 0.0))
                 continue
-                
-            db_emb = None
-            if model_type == 'dlib' and data['embeddings'].get('dlib'):
-                db_emb = np.array(data['embeddings']['dlib'])
-                dist = np.linalg.norm(embedding - db_emb)
-                if dist < threshold:
-                    conf = 1.0 - (dist / 1.0)
-                    if conf > best_conf:
-                        best_conf = conf
-                        best_label = name
-            
-            elif model_type == 'arcface' and data['embeddings'].get('arcface'):
-                db_emb = np.array(data['embeddings']['arcface'])
-                # Cosine Similarity
-                sim = np.dot(embedding, db_emb) / (np.linalg.norm(embedding) * np.linalg.norm(db_emb) + 1e-8)
-                if sim > 0.55:
-                    if sim > best_conf:
-                        best_conf = sim
-                        best_label = name
-
-        return best_label, best_conf
+            target_id, score = result
+            label = self.targets_by_id.get(target_id, {}).get('name', "Unknown")
+            if model_type == 'dlib':
+                if score < threshold:
+                    results.append((label, 1.0 - score))
+                    continue
+            elif score > threshold:
+                results.append((label, score))
+                continue
+            results.append(("Unknown", 0.0))
+        return results
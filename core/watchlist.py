@@ -0,0 +1,267 @@
+import os
+import json
+import atexit
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Callable
+
+from core.ann_index import build_watchlist_indexes
+
+logger = logging.getLogger("Watchlist")
+
+# Person fields copied into each surveillance target (embeddings live in the EmbeddingStore)
+TARGET_FIELDS = ('phone', 'aadhaar', 'guardian_phone', 'missing_aadhaar',
+                 'submitted_gender', 'predicted_gender', 'predicted_age')
+DELTA_HISTORY = 1000        # deltas kept for pollers (changes_since)
+INDEX_REBUILD_DELAY = 5.0   # seconds of quiet before rebuilding ANN indexes after deltas
+PERSIST_DELAY = 0.5         # seconds of quiet before rewriting the targets file after deltas
+
+
+@dataclass
+class WatchlistDelta:
+    """One change to the active watchlist"""
+    seq: int
+    op: str                                  # 'add' | 'remove' | 'templates' | 'reset' | 'reindex'
+    person_id: Optional[str] = None
+    target: Optional[Dict[str, Any]] = None  # 'add': the target record
+
+
+def make_target(data: Dict[str, Any], db_type: str) -> Dict[str, Any]:
+    """Surveillance target record for a person JSON"""
+    try:
+        priority = int(data.get('priority', 3))  # Default priority 3 (Medium)
+    except (TypeError, ValueError):
+        priority = 3
+    target = {
+        'id': data['id'],
+        'name': data['name'],
+        'db_type': db_type,
+        'priority': priority,
+        'image_filename': data.get('image_filename'),
+    }
+    if data.get('is_wanted'):
+        target['is_wanted'] = True
+    for field in TARGET_FIELDS:
+        target[field] = data.get(field)
+    return target
+
+
+class WatchlistFeed:
+    """
+    Active surveillance targets with an incremental change feed.
+
+    A full scan of the person folders happens once (or on an explicit
+    rebuild()); after that the surveillance/enrollment routes call activate()
+    and deactivate(), which update the in-memory list and push a
+    WatchlistDelta to subscribers (a running SurveillanceEngine applies it to
+    its gallery in place). The feed lock only covers the in-memory change:
+    subscribers are called after it is released (in delta order), and the
+    consolidated targets file is rewritten from a snapshot once deltas pause
+    for PERSIST_DELAY, like the background ANN rebuild.
+    """
+
+    def __init__(self, folders: Dict[str, str], targets_path: str, store=None,
+                 index_params: Optional[Dict[str, Any]] = None,
+                 thresholds: Optional[Dict[str, float]] = None):
+        self.folders = folders  # {db_type: folder}
+        self.targets_path = targets_path
+        self.store = store
+        self.index_params = index_params or {}
+        self.thresholds = thresholds or {}
+        self._targets: Dict[str, Dict[str, Any]] = {}
+        # callback -> seq of the snapshot it subscribed with (it is sent only later deltas)
+        self._subscribers: Dict[Callable[[WatchlistDelta], None], int] = {}
+        self._history = deque(maxlen=DELTA_HISTORY)
+        self._seq = 0
+        self._delivered = 0  # last seq handed to subscribers
+        self._lock = threading.RLock()
+        self._dispatch_lock = threading.Lock()  # one notifier at a time, so deltas arrive in order
+        self._loaded = False
+        self._index_timer = None
+        self._persist_timer = None
+        atexit.register(self.flush)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.rebuild()
+
+    def targets(self) -> List[Dict[str, Any]]:
+        """Active targets sorted by priority (1=Critical first, 5=Minimal last)"""
+        self.ensure_loaded()
+        with self._lock:
+            return sorted(self._targets.values(), key=lambda t: t.get('priority', 3))
+
+    def counts(self) -> Dict[str, int]:
+        self.ensure_loaded()
+        with self._lock:
+            counts = {db_type: 0 for db_type in self.folders}
+            for t in self._targets.values():
+                counts[t['db_type']] = counts.get(t['db_type'], 0) + 1
+            return counts
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def changes_since(self, seq: int) -> Optional[List[WatchlistDelta]]:
+        """Deltas after seq, or None if they fell out of the history (caller must resync)"""
+        with self._lock:
+            if seq == self._seq:
+                return []
+            if not self._history or self._history[0].seq > seq + 1:
+                return None
+            return [d for d in self._history if d.seq > seq]
+
+    def subscribe(self, callback: Callable[[WatchlistDelta], None]) -> List[Dict[str, Any]]:
+        """
+        Register for deltas. Returns the current targets, taken atomically with
+        the registration so no delta can fall between snapshot and feed.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            self._subscribers.setdefault(callback, self._seq)
+            return sorted(self._targets.values(), key=lambda t: t.get('priority', 3))
+
+    def unsubscribe(self, callback: Callable[[WatchlistDelta], None]) -> None:
+        with self._lock:
+            self._subscribers.pop(callback, None)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def rebuild(self) -> None:
+        """Full resync from the person folders (the old update_surveillance_list)"""
+        targets = {}
+        for db_type, folder in self.folders.items():
+            if not os.path.exists(folder):
+                continue
+            for filename in os.listdir(folder):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(folder, filename), 'r') as f:
+                        data = json.load(f)
+                    if data.get('surveillance'):
+                        targets[data['id']] = make_target(data, db_type)
+                except Exception as e:
+                    logger.error(f"Error reading {filename}: {e}")
+
+        with self._lock:
+            self._targets = targets
+            self._loaded = True
+            self._emit(WatchlistDelta(0, 'reset'))
+        self._schedule_persist(delay=0.0)
+        self._notify()
+        logger.info(f"Watchlist rebuilt with {len(targets)} targets")
+        self._schedule_index_build(delay=0.0)
+
+    def activate(self, data: Dict[str, Any], db_type: str) -> None:
+        """Add a person to the watchlist, or refresh their target record (name/priority changes)"""
+        self.ensure_loaded()
+        target = make_target(data, db_type)
+        with self._lock:
+            self._targets[target['id']] = target
+            self._emit(WatchlistDelta(0, 'add', target['id'], target))
+        self._schedule_persist()
+        self._notify()
+        self._schedule_index_build()
+
+    def deactivate(self, person_id: str) -> None:
+        self.ensure_loaded()
+        with self._lock:
+            if self._targets.pop(person_id, None) is None:
+                return
+            self._emit(WatchlistDelta(0, 'remove', person_id))
+        self._schedule_persist()
+        self._notify()
+        self._schedule_index_build()
+
+    def refresh_templates(self, person_id: str) -> None:
+        """A watched person gained templates in the store; subscribers reload that identity"""
+        self.ensure_loaded()
+        with self._lock:
+            if person_id not in self._targets:
+                return
+            self._emit(WatchlistDelta(0, 'templates', person_id))
+        self._notify()
+        self._schedule_index_build()
+
+    def _emit(self, delta: WatchlistDelta) -> None:
+        """Number and record a delta (feed lock held); _notify() delivers it"""
+        self._seq += 1
+        delta.seq = self._seq
+        self._history.append(delta)
+
+    def _notify(self) -> None:
+        """Deliver recorded deltas to subscribers, in order, without holding the feed lock"""
+        with self._dispatch_lock:
+            with self._lock:
+                pending = [d for d in self._history if d.seq > self._delivered]
+                self._delivered = self._seq
+                subscribers = list(self._subscribers.items())
+            for delta in pending:
+                for callback, since in subscribers:
+                    if delta.seq <= since:
+                        continue  # already part of the snapshot this subscriber started from
+                    try:
+                        callback(delta)
+                    except Exception as e:
+                        logger.error(f"Watchlist subscriber failed on {delta.op}: {e}")
+
+    def _schedule_persist(self, delay: float = PERSIST_DELAY) -> None:
+        """Debounced rewrite of the targets file"""
+        with self._lock:
+            if self._persist_timer is not None:
+                self._persist_timer.cancel()
+            self._persist_timer = threading.Timer(delay, self._persist)
+            self._persist_timer.daemon = True
+            self._persist_timer.start()
+
+    def flush(self) -> None:
+        """Write a pending targets-file update now (shutdown, or before another process reads it)"""
+        with self._lock:
+            timer, self._persist_timer = self._persist_timer, None
+        if timer is not None:
+            timer.cancel()
+            self._persist()
+
+    def _persist(self) -> None:
+        """Rewrite the consolidated targets file (metadata only, priority-sorted) from a snapshot"""
+        with self._lock:
+            targets = sorted(self._targets.values(), key=lambda t: t.get('priority', 3))
+        tmp_path = f"{self.targets_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(targets, f, indent=2)
+        os.replace(tmp_path, self.targets_path)
+
+    def _schedule_index_build(self, delay: float = INDEX_REBUILD_DELAY) -> None:
+        """Debounced background ANN rebuild; subscribers get a 'reindex' delta when it lands"""
+        if self.store is None:
+            return
+        with self._lock:
+            if self._index_timer is not None:
+                self._index_timer.cancel()
+            self._index_timer = threading.Timer(delay, self._build_indexes)
+            self._index_timer.daemon = True
+            self._index_timer.start()
+
+    def _build_indexes(self) -> None:
+        try:
+            ids = [t['id'] for t in self.targets()]
+            reports = build_watchlist_indexes(
+                {m: self.store.rows_for(ids, m) for m in ('arcface', 'dlib')},
+                self.targets_path, params=self.index_params, thresholds=self.thresholds
+            )
+            for model_type, report in reports.items():
+                logger.info(f"ANN index ({model_type}): {report}")
+            if reports:
+                with self._lock:
+                    self._emit(WatchlistDelta(0, 'reindex'))
+                self._notify()
+        except Exception as e:
+            logger.error(f"ANN index build failed: {e}")
@@ -0,0 +1,295 @@
+import time
+import queue
+import logging
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("Workers")
+
+SLOTS_PER_WORKER = 2                 # shared-memory frame slots per worker (one in flight, one being filled)
+MAX_FRAME_BYTES = 1920 * 1080 * 3    # slot size; larger images are processed in-process instead
+WORKER_TIMEOUT = 5.0                 # seconds to wait for one result before giving up on it
+SLOT_WAIT = 0.5                      # seconds between worker health checks while waiting for a free slot
+MONITOR_INTERVAL = 0.5               # seconds between worker health checks while no results arrive
+MAX_RESPAWNS = 3                     # restarts of a crashed worker before its share falls back in-process
+
+
+@dataclass
+class DetectedFace:
+    """
+    Picklable detection result from a worker process. Mirrors the insightface
+    Face attributes the engine reads (bbox, kps, det_score, embedding); dlib
+    rectangles come back as a bbox only.
+    """
+    bbox: np.ndarray
+    kps: Optional[np.ndarray] = None
+    det_score: float = 1.0
+    embedding: Optional[np.ndarray] = None
+
+
+def _to_detected(face: Any) -> DetectedFace:
+    if hasattr(face, 'bbox'):
+        embedding = getattr(face, 'embedding', None)
+        return DetectedFace(
+            bbox=np.asarray(face.bbox, dtype=np.float32),
+            kps=getattr(face, 'kps', None),
+            det_score=float(getattr(face, 'det_score', 1.0) or 1.0),
+            embedding=np.asarray(embedding, dtype=np.float32) if embedding is not None else None,
+        )
+    return DetectedFace(np.array([face.left(), face.top(), face.right(), face.bottom()], dtype=np.float32))
+
+
+def _worker_main(plugin_def: Dict[str, Any], shm_name: str, slot_bytes: int, tasks, results) -> None:
+    """Worker process: own copy of the face model, images read straight out of shared memory"""
+    from core.plugin_manager import PluginManager
+
+    model = PluginManager().load_plugin(plugin_def['module'], plugin_def['class'])()
+    model.initialize(plugin_def.get('params', {}))
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            job_id, kind, slot, shape = task
+            image = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            try:
+                if kind == 'detect':
+                    out = [_to_detected(face) for face in model.detect_faces(image)]
+                else:
+                    # 'recognize': an aligned chip (recognition only); 'embed': a raw face crop
+                    embedding = model.embed_aligned(image) if kind == 'recognize' else model.generate_embedding(image)
+                    out = np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+                results.send((job_id, out, None))
+            except Exception as e:
+                results.send((job_id, None, repr(e)))
+            del image  # release the buffer export before the segment can be closed
+    finally:
+        model.shutdown()
+        shm.close()
+        results.close()
+
+
+class WorkerPool:
+    """
+    Face detection / embedding on worker processes, outside the engine's GIL.
+
+    Each worker loads its own instance of the face model plugin. Images are
+    written into a shared-memory slot and only (slot, shape) crosses the
+    process boundary, so frames are never pickled; results (boxes, kps,
+    embeddings) are small. Calls return concurrent.futures.Future objects.
+    When every slot is in flight, submit() blocks (backpressure).
+
+    Each worker has its own task queue and result pipe, so the pool knows
+    which jobs a worker holds. A worker that dies (OOM, native crash) is
+    noticed by the result collector (its pipe closes) or by a submit() that
+    has waited SLOT_WAIT for a slot: its jobs fail, their slots return to the
+    free list and the worker is restarted, up to MAX_RESPAWNS times. Once no
+    worker is left, fits() is False and callers use the in-process model.
+    """
+
+    def __init__(self, plugin_def: Dict[str, Any], workers: int, name: str = 'faces',
+                 max_frame_bytes: int = MAX_FRAME_BYTES):
+        self.name = name
+        self.plugin_def = plugin_def
+        self.workers = max(1, int(workers))
+        self.slot_bytes = int(max_frame_bytes)
+        slots = self.workers * SLOTS_PER_WORKER
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_bytes)
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+        self._ctx = mp.get_context('spawn')  # no fork of a process full of threads / ONNX sessions
+        self._futures: Dict[int, tuple] = {}  # job id -> (future, slot, start, worker)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats_data = {'submitted': 0, 'completed': 0, 'failed': 0, 'busy_time': 0.0,
+                           'crashed': 0, 'respawned': 0, 'lost_jobs': 0}
+
+        self._procs: List[Optional[mp.Process]] = [None] * self.workers
+        self._tasks: List[Any] = [None] * self.workers
+        self._results: List[Any] = [None] * self.workers
+        self._respawns = [0] * self.workers
+        for i in range(self.workers):
+            self._spawn(i)
+        self._collector = threading.Thread(target=self._collect, daemon=True, name=f"{name}-results")
+        self._collector.start()
+        logger.info(f"{name} pool: {self.workers} worker processes, {slots} x {self.slot_bytes} byte frame slots")
+
+    def _spawn(self, i: int) -> None:
+        """Start worker i with a fresh task queue and result pipe"""
+        tasks = self._ctx.Queue()
+        reader, writer = self._ctx.Pipe(duplex=False)
+        proc = self._ctx.Process(target=_worker_main, daemon=True, name=f"{self.name}-worker-{i}",
+                                 args=(self.plugin_def, self._shm.name, self.slot_bytes, tasks, writer))
+        proc.start()
+        writer.close()  # the worker holds the only write end: its exit closes the pipe
+        self._procs[i], self._tasks[i], self._results[i] = proc, tasks, reader
+
+    def _alive(self) -> List[int]:
+        return [i for i, proc in enumerate(self._procs) if proc is not None and proc.is_alive()]
+
+    def _check_workers(self) -> None:
+        """Fail the jobs of workers that died, reclaim their slots and restart them"""
+        with self._lock:
+            if self._closed:
+                return
+            dead = [i for i, proc in enumerate(self._procs) if proc is not None and not proc.is_alive()]
+            lost = []
+            for i in dead:
+                proc = self._procs[i]
+                logger.error(f"{proc.name} died (exit code {proc.exitcode})")
+                self.stats_data['crashed'] += 1
+                for job_id in [j for j, entry in self._futures.items() if entry[3] == i]:
+                    lost.append(self._futures.pop(job_id))
+                self._tasks[i].cancel_join_thread()
+                self._tasks[i].close()  # the result pipe is left to the collector (it may be waiting on it)
+                self._procs[i] = self._tasks[i] = self._results[i] = None
+                if self._respawns[i] < MAX_RESPAWNS:
+                    self._respawns[i] += 1
+                    self.stats_data['respawned'] += 1
+                    self._spawn(i)
+                elif not self._alive():
+                    logger.error(f"{self.name} pool has no workers left, falling back to the in-process model")
+            self.stats_data['lost_jobs'] += len(lost)
+        for future, slot, _, _ in lost:
+            self._free.put(slot)
+            if not future.cancelled():
+                future.set_exception(RuntimeError(f"{self.name} worker died"))
+
+    # ------------------------------------------------------------------
+    # Submitting
+    # ------------------------------------------------------------------
+    def fits(self, image: np.ndarray) -> bool:
+        """Whether the pool can take this image (False once every worker is gone for good)"""
+        return image.dtype == np.uint8 and image.nbytes <= self.slot_bytes and bool(self._alive())
+
+    def detect(self, frame: np.ndarray) -> Future:
+        """Future of List[DetectedFace]"""
+        return self._submit('detect', frame)
+
+    def embed(self, crop: np.ndarray, aligned: bool = False) -> Future:
+        """Future of the embedding (float32 vector) or None; aligned=True for align_face chips"""
+        return self._submit('recognize' if aligned else 'embed', crop)
+
+    def _submit(self, kind: str, image: np.ndarray) -> Future:
+        if not self.fits(image):
+            raise ValueError(f"{image.nbytes} byte image does not fit a {self.slot_bytes} byte slot")
+        future = Future()
+        deadline = time.time() + WORKER_TIMEOUT
+        while True:
+            try:
+                slot = self._free.get(timeout=SLOT_WAIT)
+                break
+            except queue.Empty:
+                self._check_workers()  # a dead worker's slots come back here
+                if time.time() >= deadline or not self._alive():
+                    future.set_exception(TimeoutError(f"{self.name} pool: no free slot"))
+                    return future
+        view = np.ndarray(image.shape, dtype=np.uint8, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+        view[...] = image
+        del view
+        job_id = next(self._ids)
+        with self._lock:
+            alive = self._alive()
+            if not alive:
+                worker = None
+            else:
+                load = {i: 0 for i in alive}
+                for entry in self._futures.values():
+                    if entry[3] in load:
+                        load[entry[3]] += 1
+                worker = min(alive, key=load.get)
+                self._futures[job_id] = (future, slot, time.time(), worker)
+                self.stats_data['submitted'] += 1
+                self._tasks[worker].put((job_id, kind, slot, image.shape))
+        if worker is None:
+            self._free.put(slot)
+            future.set_exception(RuntimeError(f"{self.name} pool has no live workers"))
+        return future
+
+    def _collect(self) -> None:
+        while not self._closed:
+            with self._lock:
+                readers = [r for r in self._results if r is not None]
+            if not readers:
+                time.sleep(MONITOR_INTERVAL)
+            for reader in wait(readers, timeout=MONITOR_INTERVAL) if readers else ():
+                try:
+                    self._finish(*reader.recv())
+                except (EOFError, OSError):
+                    pass  # the worker exited; _check_workers() cleans up after it
+            self._check_workers()
+
+    def _finish(self, job_id: int, out: Any, error: Optional[str]) -> None:
+        with self._lock:
+            entry = self._futures.pop(job_id, None)
+            if entry is None:  # pool closed or job given up meanwhile
+                return
+            future, slot, start, _ = entry
+            self.stats_data['busy_time'] += time.time() - start
+            self.stats_data['failed' if error else 'completed'] += 1
+        self._free.put(slot)
+        if future.cancelled():
+            return
+        if error:
+            future.set_exception(RuntimeError(f"{self.name} worker: {error}"))
+        else:
+            future.set_result(out)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats_data, in_flight=len(self._futures))
+        done = stats['completed'] + stats['failed']
+        stats['avg_ms'] = stats.pop('busy_time') * 1000 / done if done else 0.0
+        stats['workers'] = self.workers
+        stats['alive'] = len(self._alive())
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            procs = [(p, t) for p, t in zip(self._procs, self._tasks) if p is not None]
+        for _, tasks in procs:
+            tasks.put(None)
+        for proc, _ in procs:
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+        self._collector.join(timeout=2.0)
+        with self._lock:
+            for future, _, _, _ in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+            for reader in self._results:
+                if reader is not None:
+                    reader.close()
+        self._shm.close()
+        self._shm.unlink()
+        logger.info(f"{self.name} pool stopped")
+
+
+def start_pool(config: Dict[str, Any], name: str, workers: int,
+               max_frame_bytes: int = MAX_FRAME_BYTES) -> Optional[WorkerPool]:
+    """Pool for the configured face model, or None when workers is 0 / the model is not defined"""
+    if not workers or workers <= 0:
+        return None
+    model_name = config.get('active_components', {}).get('face_model')
+    plugin_def = config.get('models', {}).get(model_name)
+    if not plugin_def:
+        logger.warning(f"No model definition for '{model_name}', {name} runs in-process")
+        return None
+    return WorkerPool(plugin_def, workers, name, max_frame_bytes)
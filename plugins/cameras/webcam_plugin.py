@@ -28,6 +28,12 @@ class WebcamSource(IVideoSource):
             return ret, frame
         return False, None
 
+    def get_frame_into(self, out: np.ndarray) -> Tuple[bool, Optional[np.ndarray]]:
+        if self.cap and self.cap.isOpened():
+            # Decodes into out when size/type match; OpenCV reallocates otherwise
+            return self.cap.read(out)
+        return False, None
+
     def shutdown(self) -> None:
         if self.cap and self.cap.isOpened():
             self.cap.release()
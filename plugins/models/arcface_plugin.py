@@ -2,25 +2,43 @@ import numpy as np
 import os
 from typing import Dict, Any, List, Optional
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
 from core.interfaces import IFaceModel
+from plugins.models.onnx_batch import NCHWBatch
+
+# insightface model tasks the live pipeline uses: boxes + 5-point kps and the embedding.
+# The 68/106-point landmark and genderage models are never read outside enrollment (face_utils).
+LIVE_MODULES = ['detection', 'recognition']
 
 class ArcFaceModel(IFaceModel):
     def __init__(self):
         self.app = None
+        self.rec_model = None
+        self.rec_batch = None
         self.det_size = (640, 640)
+        self.split = True  # detect_faces = detection only; recognition runs per face on demand
 
     def initialize(self, config: Dict[str, Any]) -> None:
         self.det_size = tuple(config.get('det_size', [640, 640]))
         # 'providers' can be configured, e.g., ['CUDAExecutionProvider'] if GPU available
         providers = config.get('providers', ['CPUExecutionProvider'])
+        self.split = config.get('split', True)
+        # Split mode only ever calls the detector and the recognizer; skip_genderage drops the
+        # other models in non-split mode too (FaceAnalysis.get would run every loaded one per face)
+        modules = LIVE_MODULES if self.split or config.get('skip_genderage', False) else None
         
-        self.app = FaceAnalysis(providers=providers)
+        self.app = FaceAnalysis(providers=providers, allowed_modules=modules)
         # ctx_id=0 usually means GPU 0, -1 means CPU. 
         # If using CPU provider, ctx_id is ignored or should be -1.
         ctx_id = 0 if 'CUDAExecutionProvider' in providers else -1
         
         self.app.prepare(ctx_id=ctx_id, det_size=self.det_size)
-        print(f"ArcFace Plugin Initialized (Providers: {providers})")
+        self.rec_model = self.app.models.get('recognition')
+        if self.rec_model is not None:
+            # Preallocated NCHW input for batched recognition, normalized like the model expects
+            self.rec_batch = NCHWBatch(self.rec_model.input_size, self.rec_model.input_mean, self.rec_model.input_std)
+        print(f"ArcFace Plugin Initialized (Providers: {providers}, modules: {sorted(self.app.models)})")
 
     def detect_faces(self, frame: np.ndarray) -> List[Any]:
         if self.app is None:
@@ -29,7 +47,34 @@ class ArcFaceModel(IFaceModel):
         # We might want to standardize the return type for the interface, 
         # but for now we return the raw objects or a standardized dict.
         # The interface says "list of bounding boxes or face objects".
-        return self.app.get(frame)
+        if not self.split:
+            return self.app.get(frame)
+        # Detection only: boxes + 5-point kps. Embeddings come later from align_face/embed_aligned,
+        # only for the faces the engine actually needs to (re)recognize.
+        bboxes, kpss = self.app.det_model.detect(frame, max_num=0, metric='default')
+        return [Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+                for i in range(bboxes.shape[0])]
+
+    def align_face(self, frame: np.ndarray, face: Any, track_id: Optional[int] = None) -> Optional[np.ndarray]:
+        kps = getattr(face, 'kps', None)
+        if self.rec_model is None or kps is None:
+            return None
+        # Same similarity transform FaceAnalysis applies before recognition
+        return face_align.norm_crop(frame, landmark=np.asarray(kps, dtype=np.float32),
+                                    image_size=self.rec_model.input_size[0])
+
+    def embed_aligned(self, chip: np.ndarray) -> Optional[np.ndarray]:
+        if self.rec_model is None:
+            return None
+        return self.rec_model.get_feat(chip).flatten()
+
+    def embed_aligned_batch(self, chips: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        if self.rec_model is None or not chips:
+            return [None] * len(chips)
+        with self.rec_batch.lock:
+            blob = self.rec_batch.fill(chips)
+            feats = self.rec_model.session.run(self.rec_model.output_names, {self.rec_model.input_name: blob})[0]
+        return list(feats)
 
     def generate_embedding(self, face_image: np.ndarray) -> Optional[np.ndarray]:
         # ArcFace 'get' runs detection + recognition.
@@ -41,6 +86,11 @@ class ArcFaceModel(IFaceModel):
         # The high-level FaceAnalysis app doesn't expose "recognize only" easily without detection.
         # But we can try passing the crop.
         
+        if self.split:
+            faces = self.detect_faces(face_image)
+            chip = self.align_face(face_image, faces[0]) if faces else None
+            return self.embed_aligned(chip) if chip is not None else None
+
         results = self.app.get(face_image)
         if results:
             # Return the embedding of the most prominent face
@@ -51,3 +101,5 @@ class ArcFaceModel(IFaceModel):
 
     def shutdown(self) -> None:
         self.app = None
+        self.rec_model = None
+        self.rec_batch = None
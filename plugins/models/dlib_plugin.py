@@ -1,21 +1,49 @@
 import cv2
 import dlib
+import time
+import threading
 import numpy as np
 import os
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from core.interfaces import IFaceModel
 
+CHIP_SIZE = 150          # aligned chip size used at enrollment (face_utils.get_embeddings)
+ROI_PAD = 0.5            # landmarks/chip are computed on the face box grown by this fraction per side
+SHAPE_CACHE_IOU = 0.85   # a track's cached landmarks are reused while its box stays this close
+SHAPE_CACHE_TTL = 2.0    # seconds a track's landmarks stay valid
+SHAPE_CACHE_SIZE = 256   # tracks remembered
+
+
+def _box_iou(a: Tuple[float, ...], b: Tuple[float, ...]) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
 class DlibFaceModel(IFaceModel):
     def __init__(self):
         self.detector = None
         self.shape_predictor = None
         self.face_rec_model = None
         self.threshold = 0.6
+        self.upsample = 1
+        self.detect_scale = 1.0
+        # track_id -> (box, landmarks relative to the box, time); see align_face
+        self._shapes: Dict[Any, Tuple[Tuple[float, ...], np.ndarray, float]] = {}
+        self._shapes_lock = threading.Lock()  # also guards stats_data (detection + embedding threads)
+        self.stats_data = {'shape_cache_hits': 0, 'shape_predictions': 0}
 
     def initialize(self, config: Dict[str, Any]) -> None:
         shape_path = config.get('shape_predictor_path')
         rec_path = config.get('recognition_model_path')
         self.threshold = config.get('threshold', 0.6)
+        # HOG upsampling quadruples the pixels scanned per step; detect_scale < 1 scans a
+        # downscaled frame instead, which raises the smallest detectable face to ~40px / detect_scale
+        # at upsample 1 (~80px at 0.5): a CPU saving for near-field cameras only
+        self.upsample = int(config.get('upsample', 1))
+        self.detect_scale = float(config.get('detect_scale', 1.0))
 
         if not os.path.exists(shape_path) or not os.path.exists(rec_path):
             raise FileNotFoundError("Dlib model files not found. Check config paths.")
@@ -23,53 +51,130 @@ class DlibFaceModel(IFaceModel):
         self.detector = dlib.get_frontal_face_detector()
         self.shape_predictor = dlib.shape_predictor(shape_path)
         self.face_rec_model = dlib.face_recognition_model_v1(rec_path)
-        print("Dlib Plugin Initialized")
+        print(f"Dlib Plugin Initialized (upsample: {self.upsample}, detect_scale: {self.detect_scale})")
 
     def detect_faces(self, frame: np.ndarray) -> List[Any]:
         if self.detector is None:
             return []
-        
+
         # Convert to grayscale if needed, Dlib works on gray or RGB
         if len(frame.shape) == 3:
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         else:
             gray = frame
-            
-        rects = self.detector(gray, 1)
-        return list(rects)
+
+        scale = self.detect_scale
+        if scale == 1.0:
+            return list(self.detector(gray, self.upsample))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return [dlib.rectangle(int(r.left() / scale), int(r.top() / scale),
+                               int(r.right() / scale), int(r.bottom() / scale))
+                for r in self.detector(small, self.upsample)]
+
+    # ------------------------------------------------------------------
+    # Alignment (shape -> chip, as at enrollment)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _face_box(face: Any) -> Optional[Tuple[float, float, float, float]]:
+        if hasattr(face, 'left') and callable(face.left):
+            return (face.left(), face.top(), face.right(), face.bottom())
+        bbox = getattr(face, 'bbox', None)  # DetectedFace from a detection worker
+        return tuple(float(v) for v in bbox[:4]) if bbox is not None else None
+
+    def _cached_shape(self, track_id: Any, box: Tuple[float, ...], now: float) -> Optional[np.ndarray]:
+        """Landmarks of this track's last prediction, moved onto the new box, if it barely moved"""
+        if track_id is None:
+            return None
+        with self._shapes_lock:
+            entry = self._shapes.get(track_id)
+        if entry is None:
+            return None
+        cached_box, relative, when = entry
+        if now - when > SHAPE_CACHE_TTL or _box_iou(cached_box, box) < SHAPE_CACHE_IOU:
+            return None
+        origin = np.array(box[:2], dtype=np.float64)
+        size = np.array([box[2] - box[0], box[3] - box[1]], dtype=np.float64)
+        return origin + relative * size
+
+    def _remember_shape(self, track_id: Any, box: Tuple[float, ...], points: np.ndarray, now: float) -> None:
+        if track_id is None:
+            return
+        size = np.array([max(1.0, box[2] - box[0]), max(1.0, box[3] - box[1])])
+        with self._shapes_lock:
+            if len(self._shapes) >= SHAPE_CACHE_SIZE:
+                for key in [k for k, (_, _, when) in self._shapes.items() if now - when > SHAPE_CACHE_TTL]:
+                    del self._shapes[key]
+                if len(self._shapes) >= SHAPE_CACHE_SIZE:
+                    self._shapes.pop(next(iter(self._shapes)))
+            self._shapes[track_id] = (box, (points - np.array(box[:2])) / size, now)
+
+    def align_face(self, frame: np.ndarray, face: Any, track_id: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        150x150 RGB chip aligned on the 68 landmarks, computed on a padded region
+        around the face only (no full-frame color conversion). Landmarks are
+        cached per track and reused while the box barely moves.
+        """
+        if self.shape_predictor is None:
+            return None
+        box = self._face_box(face)
+        if box is None:
+            return None
+        h, w = frame.shape[:2]
+        pad_x, pad_y = (box[2] - box[0]) * ROI_PAD, (box[3] - box[1]) * ROI_PAD
+        x1, y1 = max(0, int(box[0] - pad_x)), max(0, int(box[1] - pad_y))
+        x2, y2 = min(w, int(box[2] + pad_x)), min(h, int(box[3] + pad_y))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        roi = frame[y1:y2, x1:x2]
+        rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB) if roi.ndim == 3 else cv2.cvtColor(roi, cv2.COLOR_GRAY2RGB)
+        rect = dlib.rectangle(int(box[0]) - x1, int(box[1]) - y1, int(box[2]) - x1, int(box[3]) - y1)
+
+        now = time.time()
+        points = self._cached_shape(track_id, box, now)
+        with self._shapes_lock:
+            self.stats_data['shape_cache_hits' if points is not None else 'shape_predictions'] += 1
+        if points is not None:
+            shape = dlib.full_object_detection(
+                rect, dlib.points([dlib.point(int(round(x)) - x1, int(round(y)) - y1) for x, y in points]))
+        else:
+            gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)  # enrollment predicts on grayscale
+            shape = self.shape_predictor(gray, rect)
+            parts = np.array([(p.x + x1, p.y + y1) for p in shape.parts()], dtype=np.float64)
+            self._remember_shape(track_id, box, parts, now)
+        return np.ascontiguousarray(dlib.get_face_chip(rgb, shape, size=CHIP_SIZE))
+
+    def embed_aligned(self, chip: np.ndarray) -> Optional[np.ndarray]:
+        if self.face_rec_model is None:
+            return None
+        return np.array(self.face_rec_model.compute_face_descriptor(np.ascontiguousarray(chip)))
+
+    def embed_aligned_batch(self, chips: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        if self.face_rec_model is None or not chips:
+            return [None] * len(chips)
+        vecs = self.face_rec_model.compute_face_descriptor([np.ascontiguousarray(c) for c in chips])
+        return [np.array(v) for v in vecs]
 
     def generate_embedding(self, face_image: np.ndarray) -> Optional[np.ndarray]:
-        # Dlib expects a full image and a shape, but if we already have a crop,
-        # we might need to handle it differently. 
-        # However, the standard pipeline is: Image -> Detect -> Shape -> Chip -> Descriptor
-        # If face_image is already a chip (150x150), we might skip shape prediction?
-        # Actually, dlib's compute_face_descriptor takes an image and a shape object OR a face chip.
-        # If we pass a raw numpy array (chip), we need to be careful.
-        
-        # For this implementation, let's assume face_image is a standard RGB image crop.
-        # But dlib usually needs landmarks to align.
-        # To keep it simple and compatible with the interface:
-        # We will assume the input is a pre-aligned face chip or we try to detect landmarks on the crop.
-        
-        # Let's try to treat the input as a face chip directly if it's small/aligned
-        # Or we can just return None if we can't process it.
-        
-        # In the original code:
-        # shape = dlib_shape_predictor(img_gray, face_rect)
-        # face_chip = dlib.get_face_chip(img_rgb, shape, size=150)
-        # dlib_embedding = np.array(dlib_face_rec_model.compute_face_descriptor(face_chip))
-        
+        # A bare BGR face crop: treat the whole crop as the face box and align it
+        # the same way as at enrollment (shape -> 150x150 chip -> descriptor).
         try:
-            # If the input is already a chip (uint8), we can pass it directly?
-            # compute_face_descriptor(face_image) -> returns vector
-            # It supports "an image" directly if it's aligned.
-            vec = self.face_rec_model.compute_face_descriptor(face_image)
-            return np.array(vec)
+            h, w = face_image.shape[:2]
+            chip = self.align_face(face_image, dlib.rectangle(0, 0, w - 1, h - 1))
+            return self.embed_aligned(chip) if chip is not None else None
         except Exception as e:
             # Fallback or error logging
             return None
 
+    def stats(self) -> Dict[str, Any]:
+        with self._shapes_lock:
+            hits, predictions = self.stats_data['shape_cache_hits'], self.stats_data['shape_predictions']
+            tracks = len(self._shapes)
+        return {'shape_cache_hits': hits, 'shape_predictions': predictions, 'shape_cache_tracks': tracks,
+                'shape_cache_hit_rate': hits / (hits + predictions) if hits + predictions else 0.0}
+
     def shutdown(self) -> None:
         self.detector = None
         self.shape_predictor = None
         self.face_rec_model = None
+        with self._shapes_lock:
+            self._shapes.clear()
@@ -0,0 +1,31 @@
+import threading
+import numpy as np
+from typing import List, Tuple
+
+
+class NCHWBatch:
+    """
+    Reusable float32 NCHW input for a recognition model. Aligned BGR chips
+    are normalized straight into a preallocated buffer (grown to the largest
+    batch seen), so a batch costs no blob allocation per call.
+    """
+
+    def __init__(self, size: Tuple[int, int], mean: float = 127.5, std: float = 127.5, swap_rb: bool = True):
+        self.width, self.height = size
+        self.mean = float(mean)
+        self.std = float(std)
+        self.swap_rb = swap_rb
+        self.buffer = np.empty((0, 3, self.height, self.width), dtype=np.float32)
+        self.lock = threading.Lock()  # hold while filling and running the batch
+
+    def fill(self, chips: List[np.ndarray]) -> np.ndarray:
+        """Contiguous (n, 3, h, w) view of the buffer holding the normalized chips"""
+        n = len(chips)
+        if self.buffer.shape[0] < n:
+            self.buffer = np.empty((n, 3, self.height, self.width), dtype=np.float32)
+        out = self.buffer[:n]
+        for i, chip in enumerate(chips):
+            img = chip[:, :, ::-1] if self.swap_rb else chip
+            np.subtract(img.transpose(2, 0, 1), self.mean, out=out[i], casting='unsafe')
+        out /= self.std
+        return out
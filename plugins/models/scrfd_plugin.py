@@ -0,0 +1,200 @@
+import cv2
+import numpy as np
+import os
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+import onnxruntime as ort
+from core.interfaces import IFaceModel
+from core.workers import DetectedFace
+from plugins.models.onnx_batch import NCHWBatch
+
+logger = logging.getLogger("SCRFDPlugin")
+
+# ArcFace 112x112 reference landmarks (eyes, nose, mouth corners) - same template insightface aligns to
+ARCFACE_DST = np.array([[38.2946, 51.6963], [73.5318, 51.5014], [56.0252, 71.7366],
+                        [41.5493, 92.3655], [70.7299, 92.2041]], dtype=np.float32)
+
+
+def similarity_transform(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """2x3 least-squares similarity transform src -> dst (Umeyama, as skimage's SimilarityTransform)"""
+    src_mean, dst_mean = src.mean(axis=0), dst.mean(axis=0)
+    src_c, dst_c = src - src_mean, dst - dst_mean
+    cov = dst_c.T @ src_c / len(src)
+    U, S, Vt = np.linalg.svd(cov)
+    d = np.ones(2)
+    if np.linalg.det(cov) < 0:
+        d[1] = -1
+    R = U @ np.diag(d) @ Vt
+    scale = (S * d).sum() / src_c.var(axis=0).sum()
+    M = np.empty((2, 3), dtype=np.float32)
+    M[:, :2] = scale * R
+    M[:, 2] = dst_mean - scale * R @ src_mean
+    return M
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, thresh: float) -> np.ndarray:
+    """Greedy NMS, vectorized IoU per kept box; returns kept indices (best first)"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= thresh]
+    return np.array(keep, dtype=np.int64)
+
+
+class SCRFDModel(IFaceModel):
+    """
+    SCRFD face detector run directly on onnxruntime (no insightface), by default
+    the bundled scrfd_2.5g_bnkps 320x320 model: the CPU-only fast path.
+
+    detect_faces returns DetectedFace objects (bbox, 5-point kps, det_score).
+    Recognition is optional: with recognition_model_path pointing at an ArcFace
+    ONNX model (e.g. insightface's buffalo_l w600k_r50.onnx, the model the
+    gallery was enrolled with), align_face/embed_aligned produce compatible
+    embeddings; without it the plugin is detection-only.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.rec_session = None
+        self.rec_batch = None
+        self.input_size = (320, 320)
+        self.det_thresh = 0.5
+        self.nms_thresh = 0.4
+        self.max_faces = 0
+        self._anchor_cache: Dict[Tuple[int, int, int], np.ndarray] = {}
+
+    def initialize(self, config: Dict[str, Any]) -> None:
+        model_path = config.get('model_path', 'models/scrfd_2.5g_bnkps_shape320x320.onnx')
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"SCRFD model not found: {model_path}")
+        self.input_size = tuple(config.get('input_size', [320, 320]))
+        self.det_thresh = config.get('det_thresh', 0.5)
+        self.nms_thresh = config.get('nms_thresh', 0.4)
+        self.max_faces = config.get('max_faces', 0)
+
+        options = ort.SessionOptions()
+        if config.get('threads'):
+            options.intra_op_num_threads = int(config['threads'])
+        providers = config.get('providers', ['CPUExecutionProvider'])
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [o.name for o in self.session.get_outputs()]
+
+        # bnkps models: 3 strides x (scores, boxes, kps); 5-stride models have 15 outputs
+        outputs = len(self.output_names)
+        self.fmc = 5 if outputs in (10, 15) else 3
+        self.strides = [8, 16, 32, 64, 128] if self.fmc == 5 else [8, 16, 32]
+        self.use_kps = outputs in (9, 15)
+        self.num_anchors = 1 if self.fmc == 5 else 2
+
+        rec_path = config.get('recognition_model_path')
+        if rec_path:
+            rec_path = os.path.expanduser(rec_path)
+            if os.path.exists(rec_path):
+                self.rec_session = ort.InferenceSession(rec_path, sess_options=options, providers=providers)
+                self.rec_input = self.rec_session.get_inputs()[0].name
+                self.rec_size = tuple(self.rec_session.get_inputs()[0].shape[2:4])
+                self.rec_batch = NCHWBatch(self.rec_size)
+            else:
+                logger.warning(f"Recognition model not found ({rec_path}), SCRFD runs detection-only")
+        print(f"SCRFD Plugin Initialized ({model_path}, {self.input_size[0]}x{self.input_size[1]}, "
+              f"recognition: {'on' if self.rec_session else 'off'})")
+
+    # ------------------------------------------------------------------
+    # Detection
+    # ------------------------------------------------------------------
+    def _anchor_centers(self, height: int, width: int, stride: int) -> np.ndarray:
+        key = (height, width, stride)
+        centers = self._anchor_cache.get(key)
+        if centers is None:
+            centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+            centers = (centers * stride).reshape(-1, 2)
+            if self.num_anchors > 1:
+                centers = np.repeat(centers, self.num_anchors, axis=0)
+            self._anchor_cache[key] = centers
+        return centers
+
+    def detect_faces(self, frame: np.ndarray) -> List[Any]:
+        if self.session is None:
+            return []
+        in_w, in_h = self.input_size
+        # Letterbox into the fixed input (top-left, aspect preserved)
+        h, w = frame.shape[:2]
+        if h / w > in_h / in_w:
+            new_h, new_w = in_h, max(1, int(in_h * w / h))
+        else:
+            new_w, new_h = in_w, max(1, int(in_w * h / w))
+        scale = new_h / h
+        det_img = np.zeros((in_h, in_w, 3), dtype=np.uint8)
+        det_img[:new_h, :new_w] = cv2.resize(frame, (new_w, new_h))
+        blob = cv2.dnn.blobFromImage(det_img, 1.0 / 128, (in_w, in_h), (127.5, 127.5, 127.5), swapRB=True)
+        outs = self.session.run(self.output_names, {self.input_name: blob})
+
+        scores_list, boxes_list, kps_list = [], [], []
+        for idx, stride in enumerate(self.strides):
+            scores = outs[idx].reshape(-1)
+            keep = scores >= self.det_thresh
+            if not keep.any():
+                continue
+            centers = self._anchor_centers(in_h // stride, in_w // stride, stride)[keep]
+            dist = outs[idx + self.fmc].reshape(-1, 4)[keep] * stride
+            boxes_list.append(np.hstack([centers - dist[:, :2], centers + dist[:, 2:]]))
+            scores_list.append(scores[keep])
+            if self.use_kps:
+                kps = outs[idx + self.fmc * 2].reshape(-1, 10)[keep] * stride
+                kps_list.append((kps.reshape(-1, 5, 2) + centers[:, None, :]))
+        if not scores_list:
+            return []
+
+        scores = np.concatenate(scores_list)
+        boxes = np.concatenate(boxes_list) / scale
+        kpss = np.concatenate(kps_list) / scale if self.use_kps else None
+        keep = nms(boxes, scores, self.nms_thresh)
+        if self.max_faces:
+            keep = keep[:self.max_faces]
+        return [DetectedFace(bbox=boxes[i].astype(np.float32), kps=kpss[i].astype(np.float32) if kpss is not None else None,
+                             det_score=float(scores[i]))
+                for i in keep]
+
+    # ------------------------------------------------------------------
+    # Recognition (optional ArcFace ONNX)
+    # ------------------------------------------------------------------
+    def align_face(self, frame: np.ndarray, face: Any, track_id: Optional[int] = None) -> Optional[np.ndarray]:
+        kps = getattr(face, 'kps', None)
+        if self.rec_session is None or kps is None:
+            return None
+        size = self.rec_size[0]
+        M = similarity_transform(np.asarray(kps, dtype=np.float32), ARCFACE_DST * (size / 112.0))
+        return cv2.warpAffine(frame, M, (size, size), borderValue=0.0)
+
+    def embed_aligned(self, chip: np.ndarray) -> Optional[np.ndarray]:
+        if self.rec_session is None:
+            return None
+        blob = cv2.dnn.blobFromImage(chip, 1.0 / 127.5, self.rec_size, (127.5, 127.5, 127.5), swapRB=True)
+        return self.rec_session.run(None, {self.rec_input: blob})[0].flatten()
+
+    def embed_aligned_batch(self, chips: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        if self.rec_session is None or not chips:
+            return [None] * len(chips)
+        with self.rec_batch.lock:
+            feats = self.rec_session.run(None, {self.rec_input: self.rec_batch.fill(chips)})[0]
+        return list(feats)
+
+    def generate_embedding(self, face_image: np.ndarray) -> Optional[np.ndarray]:
+        faces = self.detect_faces(face_image)
+        chip = self.align_face(face_image, faces[0]) if faces else None
+        return self.embed_aligned(chip) if chip is not None else None
+
+    def shutdown(self) -> None:
+        self.session = None
+        self.rec_session = None
+        self.rec_batch = None